@@ -1,15 +1,177 @@
+import argparse
 import asyncio
+import json
+import struct
+import time
 import websockets
 
-USERS = set()
 port = 8765
+# Clients connecting to this path publish; every other path subscribes
+PRODUCER_PATH = '/producer'
+# Seconds between two printed consumer reports
+STATS_INTERVAL = 10.0
+
+PRODUCERS = set()
+CONSUMERS = set()
+
+# Last binary landmark schema of every producer and stream, replayed to clients that connect after it
+SCHEMA_MAGIC = b"MPLM"
+SCHEMA_KIND = 0
+SCHEMAS = {}
+# Binary landmark headers from version 2 on end with the stream number (see landmark_codec.py)
+STREAM_FIELD = struct.Struct("<H")
+STREAM_OFFSET = 20
+
+def is_schema_message(message):
+    """
+    Tells whether a message is a binary landmark SCHEMA message (see landmark_codec.py).
+    """
+    return isinstance(message, bytes) and message[:4] == SCHEMA_MAGIC and len(message) > 5 and message[5] == SCHEMA_KIND
+
+def stream_key(message):
+    """
+    Returns what tells the streams of one producer apart: the 'stream_id' of a JSON message or
+    the stream number of a binary landmark frame or schema. None for messages without one.
+    """
+    if isinstance(message, bytes):
+        if message[:4] == SCHEMA_MAGIC and message[4] >= 2 and len(message) >= STREAM_OFFSET + STREAM_FIELD.size:
+            return STREAM_FIELD.unpack_from(message, STREAM_OFFSET)[0]
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    return data.get('stream_id') if isinstance(data, dict) else None
+
+def request_path(websocket):
+    """
+    Returns the path a client connected to, without the query string.
+    """
+    request = getattr(websocket, 'request', None)
+    path = request.path if request is not None else websocket.path
+    return path.split('?', 1)[0]
+
+class Consumer:
+    """
+    Outbound slots of one consumer, with latest-value conflation.
+
+    The consumer holds at most one pending frame per producer and stream (see `stream_key`):
+    a new frame replaces a pending frame of the same stream that was not sent yet, which counts
+    as dropped, while frames of other streams wait side by side. Its own sender task writes
+    the slots to the socket, oldest first, and waits for each write to drain before taking the
+    next one, so a slow client gets the newest frame of every stream instead of a growing
+    backlog. Schema messages have a slot per producer and stream and are never conflated with frames.
+
+    Args:
+        websocket: The consumer's WebSocket connection.
+
+    Attributes:
+        sent (int): Frames written to the socket.
+        dropped (int): Frames replaced before they could be sent.
+        max_lag_ms (float): Largest lag (see `lag_ms`) seen since the last report.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.name = "{}:{}".format(*websocket.remote_address[:2]) if websocket.remote_address else str(id(websocket))
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag_ms = 0.0
+        # Arrival time of the frame being written, None while the sender is idle
+        self._sending_since = None
+        # (producer, stream) -> (message, arrival time); dicts keep the first-come order on replace
+        self._pending = {}
+        # (producer, stream) -> schema message
+        self._schemas = {}
+        self._ready = asyncio.Event()
+
+    def offer(self, producer, message, stream=None):
+        """
+        Puts a producer's message into its slot without waiting, replacing a pending frame of the same stream.
+        """
+        key = (producer, stream)
+        if is_schema_message(message):
+            # A pending frame of this stream was encoded with its previous schema
+            if self._pending.pop(key, None) is not None:
+                self.dropped += 1
+            self._schemas[key] = message
+        else:
+            if key in self._pending:
+                self.dropped += 1
+            self._pending[key] = (message, time.perf_counter())
+        self._ready.set()
+
+    async def run(self):
+        """
+        Sends the slot contents until the connection closes.
+        """
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._schemas or self._pending:
+                    if self._schemas:
+                        message = self._schemas.pop(next(iter(self._schemas)))
+                        await self.websocket.send(message)
+                        continue
+                    message, self._sending_since = self._pending.pop(next(iter(self._pending)))
+                    try:
+                        await self.websocket.send(message)
+                    finally:
+                        lag_ms = self.lag_ms()
+                        self._sending_since = None
+                    self.sent += 1
+                    self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def lag_ms(self):
+        """
+        Returns the age of the oldest undelivered frame: the one being written, else the oldest
+        waiting in a slot. 0 when everything was delivered. A client that stopped reading keeps
+        its frame in flight, so its lag grows for as long as it stalls.
+        """
+        arrivals = [received for _, received in self._pending.values()]
+        if self._sending_since is not None:
+            arrivals.append(self._sending_since)
+        return (time.perf_counter() - min(arrivals)) * 1000 if arrivals else 0.0
+
+    def report(self):
+        """
+        Returns a one-line summary and starts a new window for the maximum lag.
+        """
+        lag_ms = self.lag_ms()
+        line = f"{self.name}: sent {self.sent}, dropped {self.dropped}, lag {lag_ms:.1f} ms, {max(self.max_lag_ms, lag_ms):.1f} ms max"
+        self.max_lag_ms = 0.0
+        return line
+
+def publish(producer, message):
+    """
+    Hands a producer message to every consumer slot. Never waits on a consumer.
+    """
+    stream = stream_key(message)
+    if is_schema_message(message):
+        SCHEMAS[(producer, stream)] = message
+    for consumer in CONSUMERS:
+        consumer.offer(producer, message, stream)
+
+def forget_schemas(producer):
+    """
+    Drops the stored schemas of a producer that disconnected.
+    """
+    for key in [key for key in SCHEMAS if key[0] is producer]:
+        del SCHEMAS[key]
 
 async def msg_handler(websocket):
     """
     WebSocket message handler function.
 
-    Registers the user, broadcasts incoming messages from the registered user to all connected users,
-    and unregisters the user when the connection is closed.
+    Clients connecting to PRODUCER_PATH are producers: their messages go to every consumer and
+    are not echoed back. All other clients are consumers and receive the newest message through
+    their own conflating slots, one per producer and stream (see Consumer); the latest binary
+    landmark schema of every producer and stream is sent to them as soon as they connect, so late
+    consumers can decode the frames. A consumer that sends a message is promoted to a producer, so
+    clients written for the old broadcast server keep working.
 
     Args:
         websocket: The WebSocket connection object.
@@ -17,33 +179,70 @@ async def msg_handler(websocket):
     Returns:
         None
     """
-    global USERS
+    if request_path(websocket) == PRODUCER_PATH:
+        PRODUCERS.add(websocket)
+        try:
+            async for message in websocket:
+                publish(websocket, message)
+        finally:
+            PRODUCERS.discard(websocket)
+            forget_schemas(websocket)
+        return
+
+    consumer = Consumer(websocket)
+    CONSUMERS.add(consumer)
+    for (producer, stream), schema in list(SCHEMAS.items()):
+        consumer.offer(producer, schema, stream)
+    sender = asyncio.ensure_future(consumer.run())
     try:
-        # Register user
-        USERS.add(websocket)
-        # Broadcast incoming messages from the registered user
         async for message in websocket:
-            # print(message)
-            websockets.broadcast(USERS, message)
-       
+            if consumer in CONSUMERS:
+                print(f"Client {consumer.name} sent a message, treating it as a producer")
+                CONSUMERS.discard(consumer)
+                PRODUCERS.add(websocket)
+            publish(websocket, message)
     finally:
-        # Unregister user
-        USERS.remove(websocket)
-        
+        CONSUMERS.discard(consumer)
+        PRODUCERS.discard(websocket)
+        forget_schemas(websocket)
+        sender.cancel()
 
-async def main():
+async def print_stats(interval):
+    """
+    Prints the sent and dropped frames and the lag of every consumer every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if CONSUMERS:
+            print(f"{len(PRODUCERS)} producers, {len(CONSUMERS)} consumers")
+            for consumer in list(CONSUMERS):
+                print("  " + consumer.report())
+
+async def main(stats_interval=STATS_INTERVAL):
     """
     Main asynchronous function to start the WebSocket server.
 
-    Starts the WebSocket server and waits for connections. The port number is always 8765.
+    Starts the WebSocket server on `port` (8765 unless changed) and waits for connections.
+
+    Args:
+        stats_interval (float, optional): Seconds between consumer reports; 0 turns them off.
+            Default is STATS_INTERVAL.
 
     Returns:
         None
     """
     print("Starting websocket server")
-    # The port number is always 8765
     server1 = await websockets.serve(msg_handler, '', port)
-    await asyncio.gather(server1.wait_closed())
-
+    tasks = [server1.wait_closed()]
+    if stats_interval:
+        tasks.append(print_stats(stats_interval))
+    await asyncio.gather(*tasks)
 
-asyncio.run(main())
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relays landmark messages from producers to consumers.")
+    parser.add_argument('--port', type=int, default=port, help=f"Port to listen on (default: {port})")
+    parser.add_argument('--stats-interval', type=float, default=STATS_INTERVAL,
+                        help=f"Seconds between consumer lag and drop reports, 0 for none (default: {STATS_INTERVAL})")
+    args = parser.parse_args()
+    port = args.port
+    asyncio.run(main(args.stats_interval))
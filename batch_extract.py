@@ -0,0 +1,311 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import cv2
+from hls_source import is_playlist, open_capture
+from util import get_video_name
+from landmark_dataset import VIDEOS_DIR, LandmarkDataset, VideoLandmarksWriter
+from result_cache import ResultCache
+
+VIDEO_EXTENSIONS = ('.mp4', '.ts', '.avi', '.mov', '.mkv', '.webm', '.m3u8')
+
+def _playlist_segments(playlist_path):
+    # Local segment files listed by a playlist; they are read through the playlist, not one by one
+    folder = os.path.dirname(playlist_path)
+    with open(playlist_path, encoding='utf-8', errors='replace') as f:
+        lines = [line.strip() for line in f]
+    return {os.path.normpath(os.path.join(folder, line)) for line in lines if line and not line.startswith('#') and '://' not in line}
+
+def find_videos(inputs):
+    """
+    Expands directories and glob patterns into a sorted list of video files.
+
+    HLS playlists (.m3u8) count as one video each and hide the segment files they list, which
+    are then decoded through the playlist in memory. Playlist URLs are passed through as they are.
+
+    Args:
+        inputs (list of str):
+            Directories (searched recursively for VIDEO_EXTENSIONS), glob patterns, file paths or .m3u8 URLs.
+
+    Returns:
+        list of str: Unique video paths in a stable order.
+
+    Example:
+        >>> find_videos(['videos', 'ts/*.ts'])
+        ['ts/SIYAH2_0.ts', 'ts/SIYAH2_1.ts', 'videos/Anne.mp4', ...]
+    """
+    videos = set()
+    for item in inputs:
+        if is_playlist(item) and '://' in item:
+            videos.add(item)
+        elif os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for filename in files:
+                    if filename.lower().endswith(VIDEO_EXTENSIONS):
+                        videos.add(os.path.join(root, filename))
+        else:
+            videos.update(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+    segments = set()
+    for path in videos:
+        if is_playlist(path) and os.path.isfile(path):
+            segments.update(_playlist_segments(path))
+    return sorted(path for path in videos if os.path.normpath(path) not in segments)
+
+def output_names(videos):
+    """
+    Gives every video a unique output name based on its file name.
+
+    Videos with the same base name in different folders get a numeric suffix.
+    """
+    names = {}
+    used = set()
+    for video_path in videos:
+        name = get_video_name(video_path)
+        candidate = name
+        suffix = 1
+        while candidate in used:
+            candidate = f"{name}_{suffix}"
+            suffix += 1
+        used.add(candidate)
+        names[video_path] = candidate
+    return names
+
+# The worker process's StreamSession, created on its first video and reset for every next one
+_session = None
+
+def _worker_session(name):
+    global _session
+    if _session is None:
+        from mediapipe_util import StreamSession
+
+        _session = StreamSession(stream_id=name, overlay='none')
+    else:
+        _session.reset(name)
+    return _session
+
+def extract_video(video_path, dataset_root, name, parallel_models=False):
+    """
+    Runs the models once over every frame of a video, headless and at full speed.
+
+    Runs inside a worker process. The worker builds its MediaPipe graphs once, on its first
+    video, and resets them and all other session state before every next one, so no tracking
+    state carries over from the previous video. The landmarks are written to the dataset
+    folder, but the manifest is left to the parent process.
+
+    Args:
+        video_path (str): The video to process.
+        dataset_root (str): Root folder of the LandmarkDataset.
+        name (str): Name of the video inside the dataset.
+        parallel_models (bool, optional): Run the three solutions concurrently per frame. Default is False.
+
+    Returns:
+        dict: 'video', 'name', 'meta', 'frames', 'seconds', and 'error' (None on success).
+    """
+    start_time = time.perf_counter()
+    summary = {'video': video_path, 'name': name, 'meta': None, 'frames': 0, 'seconds': 0.0, 'error': None}
+    cap = None
+    try:
+        cap = open_capture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open {video_path}")
+
+        session = _worker_session(name)
+        writer = VideoLandmarksWriter(dataset_root, name, source=video_path, fps=cap.get(cv2.CAP_PROP_FPS))
+        frame_size = None
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Face metrics are computed for the whole video at once below
+            session.extract_landmarks(frame_rgb, parallel_models, analyze_face=False)
+            writer.append(session.frame_landmarks, None, timestamp_ms)
+            frame_size = frame.shape[1], frame.shape[0]
+
+        if frame_size is not None:
+            writer.compute_metrics(*frame_size)
+        summary['meta'] = writer.close()
+        summary['frames'] = writer.frames
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        if cap is not None:
+            cap.release()
+        summary['seconds'] = time.perf_counter() - start_time
+    return summary
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+def _extract_job(video_path, dataset_root, name, parallel_models):
+    # Tell the parent which video this worker is on before starting, so a crash can be pinned to it
+    _started.put(video_path)
+    return extract_video(video_path, dataset_root, name, parallel_models)
+
+def _run_pool(jobs, workers, context, dataset_root, parallel_models, record):
+    """
+    Runs jobs on a fresh process pool, passing every summary to `record`.
+
+    A worker dying outside Python (e.g. a crash in native code) breaks the whole pool, and every
+    unfinished job fails with BrokenProcessPool, crashed or not. Workers report each video they
+    start, so those can be told apart from the ones that were only waiting.
+
+    Returns:
+        tuple: (jobs that were running when a worker crashed, jobs that never started). Both are
+        empty when the pool did not break. If no running job is known, all unfinished jobs
+        count as running.
+    """
+    started = context.SimpleQueue()
+    finished = set()
+    broken = False
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(started,)) as executor:
+        futures = {executor.submit(_extract_job, video_path, dataset_root, name, parallel_models): video_path for video_path, name in jobs}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except BrokenProcessPool:
+                broken = True
+                continue
+            finished.add(futures[future])
+            record(summary)
+    if not broken:
+        return [], []
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    unfinished = [job for job in jobs if job[0] not in finished]
+    crashed = [job for job in unfinished if job[0] in running]
+    if not crashed:
+        return unfinished, []
+    return crashed, [job for job in unfinished if job[0] not in running]
+
+def run_batch(inputs, output_dir, workers=None, parallel_models=False, overwrite=False, cache_dir=None, cache_max_bytes=10 * 2**30, invalidate_cache=False):
+    """
+    Extracts landmarks from many videos across a pool of worker processes.
+
+    Every video is processed once, with no display and no real-time pacing. A failing video is
+    reported and skipped without stopping the others.
+
+    Args:
+        inputs (list of str): Directories, glob patterns or files (see `find_videos`).
+        output_dir (str): Root folder of the LandmarkDataset the videos are written to.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        parallel_models (bool, optional): Also run the three models concurrently inside each worker. Default is False.
+        overwrite (bool, optional): Re-extract videos that are already in the dataset. Default is False.
+        cache_dir (str, optional): Folder of a ResultCache. Videos whose content and model settings
+            are already cached are restored from it without decoding. Default is None (no cache).
+        cache_max_bytes (int, optional): Size cap of the cache. Default is 10 GiB.
+        invalidate_cache (bool, optional): Drop cache entries made with other model settings first. Default is False.
+
+    Returns:
+        list of dict: One summary per processed video (see `extract_video`).
+
+    Example:
+        >>> run_batch(['videos'], 'landmarks', workers=8)
+        [1/1352] Anne: 87 frames in 4.1s (21.2 fps)
+        ...
+    """
+    videos = find_videos(inputs)
+    names = output_names(videos)
+    dataset = LandmarkDataset(output_dir)
+    jobs = []
+    for video_path in videos:
+        if not overwrite and names[video_path] in dataset:
+            continue
+        jobs.append((video_path, names[video_path]))
+
+    skipped = len(videos) - len(jobs)
+
+    cache = None
+    keys = {}
+    if cache_dir is not None:
+        cache = ResultCache(cache_dir, cache_max_bytes)
+        if invalidate_cache:
+            print(f"Invalidated {cache.invalidate()} cache entries")
+        remaining = []
+        for video_path, name in jobs:
+            if is_playlist(video_path):
+                # The cache keys on file content, and a playlist's content lives in its segments
+                remaining.append((video_path, name))
+                continue
+            keys[video_path] = cache.key(video_path)
+            meta = cache.restore(keys[video_path], output_dir, name, source=video_path)
+            if meta is None:
+                remaining.append((video_path, name))
+            else:
+                dataset.add(meta, save=False)
+        dataset.save()
+        cache.save()
+        print(f"Restored {cache.hits} videos from the cache")
+        jobs = remaining
+
+    print(f"Found {len(videos)} videos, {len(jobs)} to extract, {skipped} already done")
+    if not jobs:
+        return []
+
+    results = []
+    start_time = time.perf_counter()
+
+    def record(summary):
+        results.append(summary)
+        video_path = summary['video']
+        if summary['meta'] is not None:
+            # Only this process writes the manifest and the cache index
+            dataset.add(summary['meta'])
+            if cache is not None and video_path in keys:
+                cache.put(keys[video_path], os.path.join(output_dir, VIDEOS_DIR, summary['name']))
+                cache.save()
+        name = get_video_name(video_path)
+        if summary['error'] is None:
+            fps = summary['frames'] / summary['seconds'] if summary['seconds'] else 0.0
+            print(f"[{len(results)}/{len(jobs)}] {name}: {summary['frames']} frames in {summary['seconds']:.1f}s ({fps:.1f} fps)")
+        else:
+            print(f"[{len(results)}/{len(jobs)}] {name}: FAILED {summary['error']}")
+
+    # spawn keeps the workers free of any MediaPipe state or threads of the parent
+    context = multiprocessing.get_context('spawn')
+    pending = jobs
+    suspects = []
+    while pending or suspects:
+        if pending:
+            crashed, pending = _run_pool(pending, workers, context, output_dir, parallel_models, record)
+            if crashed:
+                print(f"A worker crashed; retrying the {len(crashed)} video(s) that were running one at a time, and the rest in a new pool")
+            suspects.extend(crashed)
+        else:
+            # Alone in a pool of its own, a crash can only be this video's
+            video_path, name = suspects.pop(0)
+            crashed, _ = _run_pool([(video_path, name)], 1, context, output_dir, parallel_models, record)
+            if crashed:
+                record({'video': video_path, 'name': name, 'meta': None, 'frames': 0, 'seconds': 0.0, 'error': "Worker crashed"})
+
+    failed = sum(1 for summary in results if summary['error'] is not None)
+    total_frames = sum(summary['frames'] for summary in results)
+    elapsed = time.perf_counter() - start_time
+    print(f"Extracted {total_frames} frames from {len(results) - failed} videos in {elapsed:.1f}s, {failed} failed")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless landmark extraction over video directories.")
+    parser.add_argument('inputs', nargs='+', help="Video directories, glob patterns or files")
+    parser.add_argument('-o', '--output', default='landmarks', help="Dataset folder (default: landmarks)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--parallel-models', action='store_true', help="Run face mesh, pose and hands concurrently in each worker")
+    parser.add_argument('--overwrite', action='store_true', help="Re-extract videos that already have an output")
+    parser.add_argument('--cache-dir', default=None, help="Result cache folder; cached videos skip decoding and inference")
+    parser.add_argument('--cache-max-gb', type=float, default=10.0, help="Size cap of the result cache in GiB (default: 10)")
+    parser.add_argument('--invalidate-cache', action='store_true', help="Drop cache entries made with other model settings")
+    args = parser.parse_args()
+    results = run_batch(args.inputs, args.output, args.workers, args.parallel_models, args.overwrite,
+                        args.cache_dir, int(args.cache_max_gb * 2**30), args.invalidate_cache)
+    if any(summary['error'] is not None for summary in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import platform
+import threading
+import time
+import cv2
+import numpy as np
+import websockets
+from calculations import FaceState, HeadPoseSolver, analyze_face_landmarks, analyze_face_landmarks_batch
+from landmark_arrays import FrameLandmarks, LEFT, NUM_FACE_LANDMARKS, NUM_HAND_LANDMARKS, hands_to_payload
+from landmark_codec import LandmarkEncoder
+from renderer import OverlayRenderer
+from util import draw_circle_on_coord, resize_to_fullscreen, resize_to_inference
+from websocket_util import WebSocketPublisher
+
+SOURCE_IMAGE = 'test_media/image.jpg'
+
+# Synthetic clips: name -> (width, height, frames)
+CLIPS = {
+    '360p': (640, 360, 60),
+    '720p': (1280, 720, 60),
+    '1080p': (1920, 1080, 30),
+}
+CLIP_FPS = 30
+
+SUITES = ('util', 'face', 'websocket', 'detect', 'end_to_end')
+
+# Allowed growth of a benchmark's median time over the baseline before it counts as a regression
+DEFAULT_THRESHOLD = 0.25
+# Growth in milliseconds a median must also exceed; microsecond timings jitter by far more than any threshold
+DEFAULT_MIN_CHANGE_MS = 0.1
+
+def make_clip(path, width, height, frames, image_path=SOURCE_IMAGE, fps=CLIP_FPS):
+    """
+    Writes a deterministic synthetic clip made from a still image.
+
+    The image is scaled to cover the frame with a margin and panned along a fixed Lissajous
+    path, so consecutive frames differ the same way on every run and every machine. The clip
+    is written as MJPG, which OpenCV can encode and decode without external codecs.
+
+    Args:
+        path (str): Output .avi file.
+        width (int): Frame width.
+        height (int): Frame height.
+        frames (int): Number of frames.
+        image_path (str, optional): Source image. Default is SOURCE_IMAGE.
+        fps (int, optional): Frame rate stored in the file. Default is CLIP_FPS.
+
+    Returns:
+        str: `path`.
+
+    Example:
+        >>> make_clip('.benchmark_clips/720p.avi', 1280, 720, 60)
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(image_path)
+    # Cover the frame with a 10 % margin to pan within
+    scale = 1.1 * max(width / image.shape[1], height / image.shape[0])
+    image = cv2.resize(image, (int(np.ceil(image.shape[1] * scale)), int(np.ceil(image.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    margin_x, margin_y = image.shape[1] - width, image.shape[0] - height
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write {path}")
+    try:
+        for i in range(frames):
+            phase = 2 * np.pi * i / max(frames, 1)
+            x = int(round(margin_x * (0.5 + 0.5 * np.sin(phase))))
+            y = int(round(margin_y * (0.5 + 0.5 * np.sin(2 * phase))))
+            writer.write(image[y:y + height, x:x + width])
+    finally:
+        writer.release()
+    return path
+
+def prepare_clips(clip_dir, clips=CLIPS, image_path=SOURCE_IMAGE):
+    """
+    Returns the synthetic clips, building the ones that are missing or have the wrong length.
+
+    Returns:
+        dict: Clip name mapped to its file path.
+    """
+    paths = {}
+    for name, (width, height, frames) in clips.items():
+        path = os.path.join(clip_dir, f"{name}.avi")
+        cap = cv2.VideoCapture(path)
+        ready = cap.isOpened() and int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == frames and int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) == width
+        cap.release()
+        if not ready:
+            make_clip(path, width, height, frames, image_path)
+        paths[name] = path
+    return paths
+
+def read_clip(path):
+    """
+    Decodes a whole clip into a list of BGR frames.
+    """
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def summarize(durations, items=1):
+    """
+    Reduces a list of durations in seconds to the stored statistics.
+
+    Args:
+        durations (list of float): One duration per iteration.
+        items (int, optional): Items handled per iteration, e.g. frames of a batch. Times are reported per item.
+
+    Returns:
+        dict: 'iterations', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms' and 'per_second'.
+    """
+    ms = np.asarray(durations, dtype=np.float64) * 1000 / items
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {
+        'iterations': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'per_second': float(1000 / ms.mean()) if ms.mean() > 0 else 0.0,
+    }
+
+def measure(function, iterations, warmup=3, items=1):
+    """
+    Times `function()` over `iterations` calls after `warmup` untimed ones.
+    """
+    for _ in range(warmup):
+        function()
+    durations = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - t0)
+    return summarize(durations, items)
+
+def synthetic_landmarks(frames, seed=0):
+    """
+    Deterministic face and hand landmarks that drift slowly over `frames` frames.
+
+    The face is a seeded point cloud inside a face-sized box, so the metrics and the head
+    pose solve have realistic work to do without running the face model.
+
+    Returns:
+        tuple: ((frames, 478, 3) face, (frames, 2, 21, 3) hands) float32 arrays, normalized.
+    """
+    rng = np.random.default_rng(seed)
+    face = rng.uniform((0.4, 0.3, -0.05), (0.6, 0.6, 0.05), size=(NUM_FACE_LANDMARKS, 3)).astype(np.float32)
+    hands = rng.uniform((0.2, 0.5, -0.05), (0.8, 0.9, 0.05), size=(2, NUM_HAND_LANDMARKS, 3)).astype(np.float32)
+    drift = (0.01 * np.sin(np.linspace(0, 2 * np.pi, frames))).astype(np.float32)[:, None, None]
+    return face[None] + drift, hands[None] + drift[..., None]
+
+def bench_util(frames, iterations):
+    """
+    Frame and landmark helpers of `util` and `landmark_arrays` on one clip.
+    """
+    _, hands = synthetic_landmarks(len(frames))
+    frame_lms = FrameLandmarks()
+    frame_lms.hands[:] = hands[0]
+    frame_lms.hand_present[:] = True
+    frame = frames[0]
+    # Drawing happens in place, on a copy of the clip frame
+    canvas = frame.copy()
+    results = {
+        'resize_to_inference': measure(lambda: resize_to_inference(frame, 640), iterations),
+        'resize_to_fullscreen': measure(lambda: resize_to_fullscreen(frame, 1920, 1000), iterations),
+        'convert_bgr2rgb': measure(lambda: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), iterations),
+        'draw_circle_on_coord': measure(lambda: draw_circle_on_coord(canvas, frame_lms.hands[LEFT], (255, 0, 0)), iterations),
+        'hands_to_payload': measure(lambda: hands_to_payload(frame_lms), iterations),
+    }
+    face, _ = synthetic_landmarks(1)
+    frame_lms.face[:] = face[0]
+    frame_lms.face_present = True
+    for level in ('keypoints', 'full'):
+        try:
+            renderer = OverlayRenderer(level)
+            results[f"render_{level}"] = measure(lambda: renderer.render(canvas, frame_lms), iterations)
+        except AttributeError as e:
+            # The connection sets come from mediapipe's solutions API
+            results[f"render_{level}"] = {'skipped': f"{type(e).__name__}: {e}"}
+    return results
+
+def bench_face(width, height, iterations):
+    """
+    `analyze_face_landmarks` per frame, with and without a warm head pose solver, and the batch variant.
+    """
+    face, _ = synthetic_landmarks(iterations)
+    results = {}
+    for name, solver in (('analyze_face_landmarks', HeadPoseSolver()), ('analyze_face_landmarks_cold', None)):
+        state = FaceState()
+        index = iter(range(10**9))
+        results[name] = measure(lambda: analyze_face_landmarks(face[next(index) % len(face)], width, height, solver, state), iterations)
+    results['analyze_face_landmarks_batch'] = measure(lambda: analyze_face_landmarks_batch(face, width, height), 5, warmup=1, items=len(face))
+    return results
+
+class _Receiver:
+    """
+    Local WebSocket server that records when each message arrives, for the WebSocket benchmarks.
+    """
+
+    def __init__(self):
+        self.arrivals = []
+        self.received = threading.Condition()
+        self.port = None
+        self._loop = None
+        self._stop = None
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="BenchmarkReceiver", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._stop = asyncio.Event()
+
+        async def handler(websocket):
+            async for _ in websocket:
+                with self.received:
+                    self.arrivals.append(time.perf_counter())
+                    self.received.notify_all()
+
+        async def serve():
+            async with websockets.serve(handler, '127.0.0.1', 0) as server:
+                self.port = next(iter(server.sockets)).getsockname()[1]
+                ready.set()
+                await self._stop.wait()
+
+        self._loop.run_until_complete(serve())
+        self._loop.close()
+
+    def wait_for(self, count, timeout=5.0):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.arrivals) >= count, timeout)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(2.0)
+
+def bench_websocket(iterations):
+    """
+    Message encoding and the publisher path to a local server: latency of single messages and
+    time per message of a burst.
+    """
+    face, hands = synthetic_landmarks(1)
+    frame_lms = FrameLandmarks()
+    frame_lms.hands[:] = hands[0]
+    frame_lms.hand_present[:] = True
+    frame_lms.face[:] = face[0]
+    frame_lms.face_present = True
+    face_metrics = analyze_face_landmarks(face[0], 1280, 720)
+    data = dict(face_metrics)
+    data.update(hands_to_payload(frame_lms))
+    encoders = {encoding: LandmarkEncoder(encoding) for encoding in ('float32', 'int16')}
+    results = {
+        'encode_json': measure(lambda: json.dumps(data), iterations),
+        'encode_float32': measure(lambda: encoders['float32'].encode(frame_lms, face_metrics), iterations),
+        'encode_int16': measure(lambda: encoders['int16'].encode(frame_lms, face_metrics), iterations),
+    }
+
+    message = json.dumps(data)
+    receiver = _Receiver()
+    publisher = WebSocketPublisher(f"ws://127.0.0.1:{receiver.port}", max_queue=iterations).start()
+    try:
+        publisher.publish(message)
+        if not receiver.wait_for(1):
+            return dict(results, ws_latency={'skipped': "publisher did not connect"})
+        # One message at a time: publish() to arrival at the server
+        latencies = []
+        for _ in range(iterations):
+            expected = len(receiver.arrivals) + 1
+            t0 = time.perf_counter()
+            publisher.publish(message)
+            if not receiver.wait_for(expected):
+                break
+            latencies.append(receiver.arrivals[expected - 1] - t0)
+        results['ws_latency'] = summarize(latencies)
+
+        # A burst: time per delivered message when the queue never runs dry
+        expected = len(receiver.arrivals) + iterations
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            publisher.publish(message)
+        receiver.wait_for(expected)
+        results['ws_burst'] = summarize([receiver.arrivals[-1] - t0], items=iterations)
+    finally:
+        publisher.close()
+        receiver.close()
+    return results
+
+def _session_or_reason():
+    # The models need mediapipe's legacy solutions API; report why instead of failing the whole run
+    try:
+        from mediapipe_util import StreamSession
+        return StreamSession(), None
+    except (ImportError, AttributeError, RuntimeError) as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def bench_detect(frames, iterations):
+    """
+    `detect_process` on the decoded frames of one clip, headless and with drawing.
+    """
+    session, reason = _session_or_reason()
+    if session is None:
+        return {'detect_process': {'skipped': reason}}
+    try:
+        rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        index = iter(range(10**9))
+
+        def headless():
+            session.process(rgb_frames[next(index) % len(rgb_frames)])
+
+        def drawn():
+            i = next(index) % len(rgb_frames)
+            session.process(rgb_frames[i], frames[i].copy())
+
+        return {
+            'detect_process': measure(headless, iterations),
+            'detect_process_draw': measure(drawn, iterations),
+        }
+    finally:
+        session.close()
+
+def bench_end_to_end(path, inference_size=None):
+    """
+    The whole loop over one clip: decode, resize, convert, detect, encode and publish to a local server.
+    """
+    session, reason = _session_or_reason()
+    if session is None:
+        return {'end_to_end': {'skipped': reason}}
+    receiver = _Receiver()
+    session.publisher = WebSocketPublisher(f"ws://127.0.0.1:{receiver.port}").start()
+    cap = cv2.VideoCapture(path)
+    durations = []
+    try:
+        while True:
+            t0 = time.perf_counter()
+            success, frame = cap.read()
+            if not success:
+                break
+            frame_rgb = cv2.cvtColor(resize_to_inference(frame, inference_size), cv2.COLOR_BGR2RGB)
+            session.process(frame_rgb, None, Send2WSS=True, frame_size=(frame.shape[1], frame.shape[0]))
+            durations.append(time.perf_counter() - t0)
+    finally:
+        cap.release()
+        session.close()
+        session.publisher.close()
+        receiver.close()
+    return {'end_to_end': summarize(durations)}
+
+def run_benchmarks(clip_dir='.benchmark_clips', suites=SUITES, clips=None, iterations=100, inference_size=None):
+    """
+    Runs the selected suites on the selected clips.
+
+    Benchmarks that depend on a clip are named '<clip>/<benchmark>'; the others run once.
+
+    Args:
+        clip_dir (str, optional): Folder of the synthetic clips. Default is '.benchmark_clips'.
+        suites (tuple, optional): Any of SUITES. Default is all.
+        clips (list, optional): Names from CLIPS. Default is all.
+        iterations (int, optional): Timed calls per benchmark. Default is 100.
+        inference_size (int, optional): Longest side the models run at end to end. Default is the source size.
+
+    Returns:
+        dict: {'meta': {...}, 'results': {benchmark name: statistics or {'skipped': reason}}}.
+    """
+    clips = list(CLIPS) if clips is None else clips
+    paths = prepare_clips(clip_dir, {name: CLIPS[name] for name in clips})
+    results = {}
+    for name in clips:
+        width, height, _ = CLIPS[name]
+        frames = read_clip(paths[name])
+        suite_results = {}
+        if 'util' in suites:
+            suite_results.update(bench_util(frames, iterations))
+        if 'face' in suites:
+            suite_results.update(bench_face(width, height, iterations))
+        if 'detect' in suites:
+            suite_results.update(bench_detect(frames, min(iterations, len(frames))))
+        if 'end_to_end' in suites:
+            suite_results.update(bench_end_to_end(paths[name], inference_size))
+        results.update({f"{name}/{key}": value for key, value in suite_results.items()})
+        print(f"{name}: {len(suite_results)} benchmarks")
+    if 'websocket' in suites:
+        results.update(bench_websocket(iterations))
+    meta = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+        'iterations': iterations,
+    }
+    return {'meta': meta, 'results': results}
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, thresholds=None, min_change_ms=DEFAULT_MIN_CHANGE_MS):
+    """
+    Compares the median times of a run with a baseline run.
+
+    Args:
+        results (dict): The 'results' of `run_benchmarks`.
+        baseline (dict): The 'results' of the baseline run.
+        threshold (float, optional): Allowed relative growth of 'p50_ms'. Default is DEFAULT_THRESHOLD.
+        thresholds (dict, optional): Benchmark name patterns (fnmatch, e.g. '*/detect_process')
+            mapped to their own threshold; the first matching pattern wins.
+        min_change_ms (float, optional): Growth of 'p50_ms' in milliseconds below which nothing
+            counts as a regression. Default is DEFAULT_MIN_CHANGE_MS.
+
+    Returns:
+        list of dict: One row per benchmark found in both runs with 'name', 'baseline_ms',
+        'current_ms', 'change' (relative), 'threshold' and 'regressed'.
+    """
+    thresholds = thresholds or {}
+    rows = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None or 'p50_ms' not in previous or 'p50_ms' not in current:
+            continue
+        limit = next((value for pattern, value in thresholds.items() if fnmatch.fnmatch(name, pattern)), threshold)
+        change = current['p50_ms'] / previous['p50_ms'] - 1 if previous['p50_ms'] > 0 else 0.0
+        rows.append({'name': name, 'baseline_ms': previous['p50_ms'], 'current_ms': current['p50_ms'],
+                     'change': change, 'threshold': limit, 'regressed': change > limit and current['p50_ms'] - previous['p50_ms'] > min_change_ms})
+    return rows
+
+def _parse_threshold(value):
+    pattern, _, fraction = value.rpartition('=')
+    if not pattern:
+        raise argparse.ArgumentTypeError(f"expected PATTERN=FRACTION, got {value!r}")
+    return pattern, float(fraction)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline, CPU-only benchmarks on synthetic clips made from test_media/image.jpg.")
+    parser.add_argument('--suite', action='append', choices=SUITES, help="Suite to run; repeatable (default: all)")
+    parser.add_argument('--clip', action='append', choices=list(CLIPS), help="Clip resolution to run; repeatable (default: all)")
+    parser.add_argument('-n', '--iterations', type=int, default=100, help="Timed calls per benchmark (default: 100)")
+    parser.add_argument('--inference-size', type=int, default=None, help="Longest side the models run at end to end (default: source size)")
+    parser.add_argument('--clip-dir', default='.benchmark_clips', help="Folder of the synthetic clips (default: .benchmark_clips)")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="Results file (default: benchmark_results.json)")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="Baseline results to compare with (default: benchmark_baseline.json)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help=f"Allowed growth of the median time (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument('--min-change-ms', type=float, default=DEFAULT_MIN_CHANGE_MS, help=f"Smallest growth of the median in ms that can count as a regression (default: {DEFAULT_MIN_CHANGE_MS})")
+    parser.add_argument('--threshold-for', type=_parse_threshold, action='append', default=[], help="Per-benchmark threshold as PATTERN=FRACTION, e.g. '*/detect_process=0.4'; repeatable")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the baseline")
+    args = parser.parse_args()
+
+    run = run_benchmarks(args.clip_dir, tuple(args.suite or SUITES), args.clip, args.iterations, args.inference_size)
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=2)
+
+    for name, stats in sorted(run['results'].items()):
+        if 'skipped' in stats:
+            print(f"{name:<45} skipped ({stats['skipped']})")
+        else:
+            print(f"{name:<45}{stats['p50_ms']:>10.3f} ms p50{stats['p95_ms']:>10.3f} ms p95{stats['per_second']:>10.0f}/s")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(run['results'], baseline['results'], args.threshold, dict(args.threshold_for), args.min_change_ms)
+    regressions = [row for row in rows if row['regressed']]
+    for row in regressions:
+        print(f"REGRESSION {row['name']}: {row['baseline_ms']:.3f} -> {row['current_ms']:.3f} ms "
+              f"({row['change']:+.0%}, allowed {row['threshold']:+.0%})")
+    print(f"{len(rows)} benchmarks compared with {args.baseline}, {len(regressions)} regressed")
+    if regressions:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
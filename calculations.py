@@ -1,7 +1,6 @@
 import numpy as np
 import cv2
 import lm_indices as ids
-import gloabal_vars as G_var
 
 # Euclidean distance
 def eDist(pointA, pointB):
@@ -17,26 +16,29 @@ def eDist(pointA, pointB):
     """
     return np.linalg.norm(np.array([pointA[ids.X], pointA[ids.Y]]) - np.array([pointB[ids.X], pointB[ids.Y]]))
 
-# Nod and Turn of head
-def get_nodturn(landmarks, img_w, img_h):
+# Landmarks used for the head pose
+HEAD_POSE_INDICES = [ids.eye_right_right, ids.eye_left_left, ids.nose, ids.lips_right, ids.lips_left, ids.face_bottom]
+
+def head_pose_points(landmarks, img_w, img_h):
     """
-    Calculate the nod and turn angles based on 3D face landmarks.
+    Builds the 2D image points and 3D object points of the head pose problem.
 
     Args:
-        landmarks (list): List of 3D face landmarks.
+        landmarks (numpy.ndarray or list): 3D face landmarks, indexed as landmarks[idx][X|Y|Z].
         img_w (int): Width of the image.
         img_h (int): Height of the image.
 
     Returns:
-        tuple: Tuple containing the nod and turn angles.
+        tuple: (6, 2) image points and (6, 3) object points, float64.
     """
-    # Select relevant landmarks
-    indices = [ids.eye_right_right, ids.eye_left_left, ids.nose, ids.lips_right, ids.lips_left, ids.face_bottom]
-    face_2d = np.array([[int(landmarks[idx][ids.X] * img_w), int(landmarks[idx][ids.Y] * img_h)] for idx in indices], dtype=np.float64)
-    face_3d = np.array([[int(landmarks[idx][ids.X] * img_w), int(landmarks[idx][ids.Y] * img_h), landmarks[idx][ids.Z]] for idx in indices], dtype=np.float64)
-
+    face_2d = np.array([[int(landmarks[idx][ids.X] * img_w), int(landmarks[idx][ids.Y] * img_h)] for idx in HEAD_POSE_INDICES], dtype=np.float64)
+    face_3d = np.array([[int(landmarks[idx][ids.X] * img_w), int(landmarks[idx][ids.Y] * img_h), landmarks[idx][ids.Z]] for idx in HEAD_POSE_INDICES], dtype=np.float64)
+    return face_2d, face_3d
 
-    # Camera matrix
+def camera_intrinsics(img_w, img_h):
+    """
+    Returns the pinhole camera matrix (focal length = image width) and a zero distortion vector.
+    """
     focal_length = img_w
     cam_matrix = np.array([
         [focal_length, 0, img_w / 2],
@@ -45,6 +47,55 @@ def get_nodturn(landmarks, img_w, img_h):
     ], dtype=np.float64)
 
     dist_matrix = np.zeros((4, 1), dtype=np.float64)
+    return cam_matrix, dist_matrix
+
+def rotation_vectors_to_nodturn(rot_vecs):
+    """
+    Converts rotation vectors to nod and turn angles without per-frame OpenCV calls.
+
+    Uses Rodrigues' formula and the closed-form Euler angles that `cv2.RQDecomp3x3` returns for
+    a pure rotation (R = Rz * Ry * Rx), vectorized over all frames.
+
+    Args:
+        rot_vecs (numpy.ndarray): (N, 3) rotation vectors.
+
+    Returns:
+        numpy.ndarray: (N, 2) nod and turn angles in degrees.
+    """
+    rot_vecs = np.asarray(rot_vecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rot_vecs, axis=1)
+    safe_theta = np.where(theta > 1e-12, theta, 1.0)
+    kx, ky, kz = (rot_vecs / safe_theta[:, None]).T
+    sin_t, cos_t = np.sin(theta), np.cos(theta)
+    one_minus_cos = 1 - cos_t
+    # Only the bottom row of the rotation matrix is needed
+    r20 = one_minus_cos * kz * kx - sin_t * ky
+    r21 = one_minus_cos * kz * ky + sin_t * kx
+    r22 = cos_t + one_minus_cos * kz * kz
+    nod = np.degrees(np.arctan2(r21, r22))
+    turn = np.degrees(np.arctan2(-r20, np.hypot(r21, r22)))
+    return np.column_stack([nod, turn])
+
+# Nod and Turn of head
+def get_nodturn(landmarks, img_w, img_h):
+    """
+    Calculate the nod and turn angles based on 3D face landmarks.
+
+    This is the reference cold solve; HeadPoseSolver gives the same angles at a lower cost.
+
+    Args:
+        landmarks (list): List of 3D face landmarks.
+        img_w (int): Width of the image.
+        img_h (int): Height of the image.
+
+    Returns:
+        tuple: Tuple containing the nod and turn angles.
+    """
+    # Select relevant landmarks
+    face_2d, face_3d = head_pose_points(landmarks, img_w, img_h)
+
+    # Camera matrix
+    cam_matrix, dist_matrix = camera_intrinsics(img_w, img_h)
 
     # Solve PnP problem
     success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
@@ -57,6 +108,119 @@ def get_nodturn(landmarks, img_w, img_h):
 
     return angles[0], angles[1]  # angles[2] is the rotation/roll
 
+class HeadPoseSolver:
+    """
+    Head pose (nod and turn) solver that keeps state between frames.
+
+    Camera intrinsics are built once per resolution, and each solve starts from the previous
+    frame's rotation and translation (`useExtrinsicGuess`) so the iterative solver only has to
+    refine a nearby pose. A cold solve is used for the first frame, after a failed solve, when
+    the result jumps by more than `max_jump` degrees, and every `reseed_interval` frames so any
+    drift from the cold result stays bounded. One solver belongs to one video stream.
+
+    Args:
+        warm_start (bool, optional): Seed each solve with the previous pose. Default is True.
+        max_jump (float, optional): Largest nod/turn change in degrees accepted from a warm solve. Default is 15.0.
+        reseed_interval (int, optional): Frames between forced cold solves; 0 disables it. Default is 30.
+
+    Example:
+        >>> solver = HeadPoseSolver()
+        >>> nod, turn = solver.solve(face_landmarks, img_w, img_h)
+    """
+
+    def __init__(self, warm_start=True, max_jump=15.0, reseed_interval=30):
+        self.warm_start = warm_start
+        self.max_jump = max_jump
+        self.reseed_interval = reseed_interval
+        self.cold_solves = 0
+        self.warm_solves = 0
+        self._intrinsics = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the previous pose, e.g. when the face was lost or a new video starts.
+        """
+        self._rot_vec = None
+        self._trans_vec = None
+        self._angles = None
+        self._since_cold = 0
+
+    def intrinsics(self, img_w, img_h):
+        """
+        Returns the cached camera matrix and distortion vector of a resolution.
+        """
+        key = (img_w, img_h)
+        intrinsics = self._intrinsics.get(key)
+        if intrinsics is None:
+            intrinsics = self._intrinsics[key] = camera_intrinsics(img_w, img_h)
+        return intrinsics
+
+    def _solve_points(self, face_2d, face_3d, img_w, img_h):
+        cam_matrix, dist_matrix = self.intrinsics(img_w, img_h)
+        use_guess = (self.warm_start and self._rot_vec is not None
+                     and not (self.reseed_interval and self._since_cold >= self.reseed_interval))
+        if use_guess:
+            success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix,
+                                                       self._rot_vec.copy(), self._trans_vec.copy(),
+                                                       True, cv2.SOLVEPNP_ITERATIVE)
+            if success:
+                angles = rotation_vectors_to_nodturn(rot_vec)[0]
+                if np.abs(angles - self._angles).max() <= self.max_jump:
+                    self.warm_solves += 1
+                    self._since_cold += 1
+                    self._rot_vec, self._trans_vec, self._angles = rot_vec, trans_vec, angles
+                    return angles
+
+        success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
+        self.cold_solves += 1
+        if not success:
+            self.reset()
+            return np.zeros(2)
+        self._since_cold = 0
+        self._rot_vec, self._trans_vec = rot_vec, trans_vec
+        self._angles = rotation_vectors_to_nodturn(rot_vec)[0]
+        return self._angles
+
+    def solve(self, landmarks, img_w, img_h):
+        """
+        Solves the head pose of one frame.
+
+        Args:
+            landmarks (numpy.ndarray or list): Pixel face landmarks, as passed to `get_nodturn`.
+            img_w (int): Width of the image.
+            img_h (int): Height of the image.
+
+        Returns:
+            tuple: Nod and turn angles in degrees.
+        """
+        face_2d, face_3d = head_pose_points(landmarks, img_w, img_h)
+        angles = self._solve_points(face_2d, face_3d, img_w, img_h)
+        return float(angles[0]), float(angles[1])
+
+    def solve_batch(self, points_block, img_w, img_h):
+        """
+        Solves the head pose of consecutive frames, e.g. a whole extracted video.
+
+        The image and object points of all frames are built with array operations, the solves
+        run in order with warm starts, and the angles come from one vectorized conversion.
+
+        Args:
+            points_block (numpy.ndarray): (N, 478, 3) pixel face landmarks of consecutive frames.
+            img_w (int): Width of the image.
+            img_h (int): Height of the image.
+
+        Returns:
+            numpy.ndarray: (N, 2) nod and turn angles in degrees.
+        """
+        # solvePnP needs C-contiguous point arrays
+        points = np.ascontiguousarray(np.asarray(points_block, dtype=np.float64)[:, HEAD_POSE_INDICES])
+        face_2d = np.ascontiguousarray(np.trunc(points[..., :2] * (img_w, img_h)))
+        face_3d = np.concatenate([face_2d, points[..., 2:3]], axis=2)
+        angles = np.empty((points.shape[0], 2))
+        for i in range(points.shape[0]):
+            angles[i] = self._solve_points(face_2d[i], face_3d[i], img_w, img_h)
+        return angles
 
 # Angle between three points
 def calculate_angle(pointA, pointB, pointC):
@@ -124,67 +288,183 @@ def mouth_aspect_ratio(mouth_landmarks):
     return mar
 
 def convert_normalized_landmarks(landmarks, image_width, image_height):
-    converted_landmarks = []
-    for landmark in landmarks.landmark:
-        x = int(landmark.x * image_width)
-        y = int(landmark.y * image_height)
-        z = landmark.z  # Assuming z-coordinate is already in a meaningful range
-        converted_landmarks.append((x, y, z))
+    """
+    Converts normalized face landmarks to pixel coordinates.
+
+    Args:
+        landmarks (numpy.ndarray or NormalizedLandmarkList):
+            (N, 3) array of normalized x, y, z values, or the protobuf landmark list.
+        image_width (int): Width of the image.
+        image_height (int): Height of the image.
+
+    Returns:
+        numpy.ndarray:
+            (N, 3) float64 array. x and y are truncated to whole pixels, z is kept as is.
+    """
+    if hasattr(landmarks, "landmark"):
+        landmarks = [(lm.x, lm.y, lm.z) for lm in landmarks.landmark]
+    converted_landmarks = np.array(landmarks, dtype=np.float64)
+    converted_landmarks[:, :2] = np.trunc(converted_landmarks[:, :2] * (image_width, image_height))
     return converted_landmarks
 
+class FaceState:
+    """
+    Face measurements of one stream.
+
+    Every stream keeps its own instance, so several streams in one process do not overwrite
+    each other's values. `analyze_face_landmarks` fills it on every face frame.
+    """
+
+    def __init__(self):
+        self.EYES_DISTANCE = None
+        self.ROT = None
+        self.NOD = None
+        self.TURN = None
+        self.BLINKR = None
+        self.BLINKL = None
+        self.EYE_L_H = None
+        self.EYE_R_H = None
+        self.EYE_L_V = None
+        self.EYE_R_V = None
+        self.NOSE_2_CHIN_DIST = None
+        self.MOUTH_OPNG_ANGLE = None
+        self.EYE_2_CHIN_RATIO = None
+
 # Example function that uses multiple calculations
-def analyze_face_landmarks(face_landmarks, img_w, img_h):
+def analyze_face_landmarks(face_landmarks, img_w, img_h, head_pose_solver=None, state=None):
     """
     Analyze various metrics from face landmarks.
 
     Args:
-        face_landmarks (list): List of face landmarks.
+        face_landmarks (numpy.ndarray or NormalizedLandmarkList):
+            (478, 3) array of normalized face landmarks, or the protobuf landmark list.
         img_w (int): Width of the image.
         img_h (int): Height of the image.
+        head_pose_solver (HeadPoseSolver, optional): Stateful solver for nod and turn. Without it
+            every frame gets a cold `get_nodturn` solve.
+        state (FaceState, optional): Per-stream object that receives every measurement, including
+            the eye ratios that are not part of the returned dict.
 
     Returns:
         dict: A dictionary containing various calculated metrics.
     """
     
+    if state is None:
+        state = FaceState()
     face_landmarks = convert_normalized_landmarks(face_landmarks, img_w, img_h)
     
     # Calculate distances
-    G_var.EYES_DISTANCE = eDist(face_landmarks[ids.iris_right], face_landmarks[ids.iris_left])
+    state.EYES_DISTANCE = eDist(face_landmarks[ids.iris_right], face_landmarks[ids.iris_left])
     
-    G_var.NOSE_2_CHIN_DIST = eDist(face_landmarks[ids.nose], face_landmarks[ids.face_bottom])
+    state.NOSE_2_CHIN_DIST = eDist(face_landmarks[ids.nose], face_landmarks[ids.face_bottom])
     
     # Calculate nod and turn angles
-    G_var.NOD, G_var.TURN = get_nodturn(face_landmarks, img_w, img_h)
+    if head_pose_solver is None:
+        state.NOD, state.TURN = get_nodturn(face_landmarks, img_w, img_h)
+    else:
+        state.NOD, state.TURN = head_pose_solver.solve(face_landmarks, img_w, img_h)
     
     # Calculate angles
-    G_var.MOUTH_OPNG_ANGLE = calculate_angle(face_landmarks[ids.lips_left], face_landmarks[ids.lips_upper], face_landmarks[ids.lips_right])
+    state.MOUTH_OPNG_ANGLE = calculate_angle(face_landmarks[ids.lips_left], face_landmarks[ids.lips_upper], face_landmarks[ids.lips_right])
     
     # Calculate ratios
-    G_var.EYE_2_CHIN_RATIO = calculate_ratio(G_var.EYES_DISTANCE, G_var.NOSE_2_CHIN_DIST)
+    state.EYE_2_CHIN_RATIO = calculate_ratio(state.EYES_DISTANCE, state.NOSE_2_CHIN_DIST)
     
     L_eye_gap_L2R = eDist(face_landmarks[ids.eye_right_right], face_landmarks[ids.eye_right_left])
     L_eye_gap_U2B = eDist(face_landmarks[ids.eye_right_upper], face_landmarks[ids.eye_right_bottom])
-    G_var.BLINKL = L_eye_gap_U2B / L_eye_gap_L2R
+    state.BLINKL = L_eye_gap_U2B / L_eye_gap_L2R
 
     R_eye_gap_L2R = eDist(face_landmarks[ids.eye_left_right], face_landmarks[ids.eye_left_left])
     R_eye_gap_U2B = eDist(face_landmarks[ids.eye_left_upper], face_landmarks[ids.eye_left_bottom])
-    G_var.BLINKR = R_eye_gap_U2B / R_eye_gap_L2R
+    state.BLINKR = R_eye_gap_U2B / R_eye_gap_L2R
 
-    G_var.EYE_L_H = eDist(face_landmarks[ids.iris_left], face_landmarks[ids.eye_left_left]) / R_eye_gap_L2R
-    G_var.EYE_R_H = eDist(face_landmarks[ids.iris_right], face_landmarks[ids.eye_right_left]) / L_eye_gap_L2R
+    state.EYE_L_H = eDist(face_landmarks[ids.iris_left], face_landmarks[ids.eye_left_left]) / R_eye_gap_L2R
+    state.EYE_R_H = eDist(face_landmarks[ids.iris_right], face_landmarks[ids.eye_right_left]) / L_eye_gap_L2R
 
-    G_var.EYE_L_V = eDist(face_landmarks[ids.iris_left], face_landmarks[ids.eye_left_bottom]) / R_eye_gap_U2B
-    G_var.EYE_R_V = eDist(face_landmarks[ids.iris_right], face_landmarks[ids.eye_right_bottom]) / L_eye_gap_U2B
+    state.EYE_L_V = eDist(face_landmarks[ids.iris_left], face_landmarks[ids.eye_left_bottom]) / R_eye_gap_U2B
+    state.EYE_R_V = eDist(face_landmarks[ids.iris_right], face_landmarks[ids.eye_right_bottom]) / L_eye_gap_U2B
     
     metrics = {
-    'gap': G_var.EYES_DISTANCE,
-    'nod': G_var.NOD,
-    'turn': G_var.TURN,
-    'blinkR': G_var.BLINKR,
-    'blinkL': G_var.BLINKL,
-    'nose_2_chin_dist': G_var.NOSE_2_CHIN_DIST,
-    'mouth_opening_angle': G_var.MOUTH_OPNG_ANGLE,
-    'eye_2_chin_ratio': G_var.EYE_2_CHIN_RATIO,
+    'gap': state.EYES_DISTANCE,
+    'nod': state.NOD,
+    'turn': state.TURN,
+    'blinkR': state.BLINKR,
+    'blinkL': state.BLINKL,
+    'nose_2_chin_dist': state.NOSE_2_CHIN_DIST,
+    'mouth_opening_angle': state.MOUTH_OPNG_ANGLE,
+    'eye_2_chin_ratio': state.EYE_2_CHIN_RATIO,
     }
     
-    return metrics
\ No newline at end of file
+    return metrics
+
+def _batch_dist(points, idx_a, idx_b):
+    # Row-wise Euclidean distance between two landmarks over all frames
+    d = points[:, idx_a, :2] - points[:, idx_b, :2]
+    return np.sqrt(d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1])
+
+def _batch_angle(points, idx_a, idx_b, idx_c):
+    # Row-wise angle A-B-C in degrees, as in calculate_angle
+    ab = points[:, idx_b, :2] - points[:, idx_a, :2]
+    cb = points[:, idx_b, :2] - points[:, idx_c, :2]
+    dot = ab[:, 0] * cb[:, 0] + ab[:, 1] * cb[:, 1]
+    norms = np.sqrt(ab[:, 0] * ab[:, 0] + ab[:, 1] * ab[:, 1]) * np.sqrt(cb[:, 0] * cb[:, 0] + cb[:, 1] * cb[:, 1])
+    return np.degrees(np.arccos(dot / norms))
+
+def analyze_face_landmarks_batch(face_blocks, img_w, img_h, with_nodturn=True, head_pose_solver=None):
+    """
+    Vectorized `analyze_face_landmarks` over a block of frames.
+
+    Every metric is computed for all frames at once with whole-array operations, giving the
+    same numbers as the per-frame path. Nod and turn need one PnP solve per frame; they run
+    through a HeadPoseSolver with warm starts, since the frames are consecutive.
+
+    Args:
+        face_blocks (numpy.ndarray): (N, 478, 3) normalized face landmarks, e.g. a dataset 'face' column.
+        img_w (int): Width of the image.
+        img_h (int): Height of the image.
+        with_nodturn (bool, optional): Also compute nod and turn. Default is True.
+        head_pose_solver (HeadPoseSolver, optional): Solver for nod and turn. Defaults to a new one.
+
+    Returns:
+        dict: Metric name mapped to an (N,) float64 array. Besides the keys of
+        `analyze_face_landmarks` it holds the eye ratios 'eye_l_h', 'eye_r_h', 'eye_l_v' and 'eye_r_v'.
+
+    Example:
+        >>> video = LandmarkDataset('landmarks').open('Anne')
+        >>> metrics = analyze_face_landmarks_batch(video.column('face'), 1920, 1080)
+        >>> metrics['blinkL'].shape
+        (87,)
+    """
+    points = np.array(face_blocks, dtype=np.float64)
+    points[..., :2] = np.trunc(points[..., :2] * (img_w, img_h))
+
+    eyes_distance = _batch_dist(points, ids.iris_right, ids.iris_left)
+    nose_2_chin_dist = _batch_dist(points, ids.nose, ids.face_bottom)
+
+    L_eye_gap_L2R = _batch_dist(points, ids.eye_right_right, ids.eye_right_left)
+    L_eye_gap_U2B = _batch_dist(points, ids.eye_right_upper, ids.eye_right_bottom)
+    R_eye_gap_L2R = _batch_dist(points, ids.eye_left_right, ids.eye_left_left)
+    R_eye_gap_U2B = _batch_dist(points, ids.eye_left_upper, ids.eye_left_bottom)
+
+    if with_nodturn:
+        solver = HeadPoseSolver() if head_pose_solver is None else head_pose_solver
+        nodturn = solver.solve_batch(points, img_w, img_h)
+    else:
+        nodturn = np.full((points.shape[0], 2), np.nan)
+
+    # Degenerate frames (e.g. all-zero rows of missing faces) give NaN/inf like the scalar path would
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'gap': eyes_distance,
+            'nod': nodturn[:, 0],
+            'turn': nodturn[:, 1],
+            'blinkR': R_eye_gap_U2B / R_eye_gap_L2R,
+            'blinkL': L_eye_gap_U2B / L_eye_gap_L2R,
+            'nose_2_chin_dist': nose_2_chin_dist,
+            'mouth_opening_angle': _batch_angle(points, ids.lips_left, ids.lips_upper, ids.lips_right),
+            'eye_2_chin_ratio': eyes_distance / nose_2_chin_dist,
+            'eye_l_h': _batch_dist(points, ids.iris_left, ids.eye_left_left) / R_eye_gap_L2R,
+            'eye_r_h': _batch_dist(points, ids.iris_right, ids.eye_right_left) / L_eye_gap_L2R,
+            'eye_l_v': _batch_dist(points, ids.iris_left, ids.eye_left_bottom) / R_eye_gap_U2B,
+            'eye_r_v': _batch_dist(points, ids.iris_right, ids.eye_right_bottom) / L_eye_gap_U2B,
+        }
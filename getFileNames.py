@@ -1,5 +1,6 @@
 import requests
 import re
+from http_util import make_session
 from videoDigger import download_ts_files_from_playlist
 
 # URL of the API endpoint
@@ -36,8 +37,10 @@ if response.status_code == 200:
             if match:
                 # Add the extracted part to the filtered parts list
                 filtered_parts.append(match.group(1))
+    # One pooled session for every playlist, so connections are reused across them
+    session = make_session()
     for part in filtered_parts:
-        download_ts_files_from_playlist(part)
+        download_ts_files_from_playlist(part, session=session)
         print(part)
 else:
     print("Failed to retrieve .ts file names.")
\ No newline at end of file
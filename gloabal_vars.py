@@ -1,19 +0,0 @@
-EYES_DISTANCE = None
-ROT = None
-NOD = None
-TURN = None
-BLINKR = None
-BLINKL = None
-EYE_L_H = None
-EYE_R_H = None
-EYE_L_V = None
-EYE_R_V = None
-ED_R_H = None
-ED_R_V = None
-ED_L_H = None
-ED_L_V = None
-NOSE_2_CHIN_DIST = None
-MOUTH_OPNG_ANGLE = None
-EYE_2_CHIN_RATIO = None
-
-DATA = {}
\ No newline at end of file
@@ -0,0 +1,247 @@
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import cv2
+import numpy as np
+
+# Protocols a playlist may pull its segments through, e.g. a local .m3u8 listing https segments
+PROTOCOL_WHITELIST = 'file,http,https,tcp,tls,crypto,data'
+# Environment variable OpenCV takes its FFmpeg capture options from
+CAPTURE_OPTIONS = 'OPENCV_FFMPEG_CAPTURE_OPTIONS'
+# Capture opens on other threads must not see the playlist options
+_options_lock = threading.Lock()
+# Seconds a file playlist may end before its probed duration without counting as truncated
+END_TOLERANCE = 0.5
+
+def is_playlist(source):
+    """
+    Tells whether a source is an HLS playlist, a local .m3u8 file or an .m3u8 URL.
+    """
+    return isinstance(source, str) and source.split('?', 1)[0].lower().endswith('.m3u8')
+
+def probe(source, ffprobe='ffprobe'):
+    """
+    Reads the size, frame rate and duration of the first video stream with ffprobe.
+
+    Returns:
+        dict: 'width', 'height', 'fps' and 'duration' (seconds, None for live playlists).
+
+    Raises:
+        IOError: If ffprobe fails or finds no video stream.
+    """
+    command = [
+        ffprobe, '-v', 'error', '-protocol_whitelist', PROTOCOL_WHITELIST,
+        '-select_streams', 'v:0', '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate:format=duration',
+        '-of', 'json', source,
+    ]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True).stdout
+    except (subprocess.CalledProcessError, OSError) as e:
+        raise IOError(f"Cannot probe {source}: {e}")
+    info = json.loads(output)
+    if not info.get('streams'):
+        raise IOError(f"No video stream in {source}")
+    stream = info['streams'][0]
+    fps = 0.0
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        numerator, _, denominator = stream.get(key, '0/0').partition('/')
+        if float(denominator or 1) > 0 and float(numerator) > 0:
+            fps = float(numerator) / float(denominator or 1)
+            break
+    duration = info.get('format', {}).get('duration')
+    return {'width': int(stream['width']), 'height': int(stream['height']), 'fps': fps,
+            'duration': float(duration) if duration not in (None, 'N/A') else None}
+
+class HLSFrameSource:
+    """
+    Decodes an HLS playlist with ffmpeg straight into BGR frames, without intermediate files.
+
+    ffmpeg fetches and demuxes the segments itself and writes raw bgr24 frames to a pipe,
+    which are read directly into frame arrays. The object answers the cv2.VideoCapture calls
+    the rest of the project uses (read, grab, retrieve, get, set, isOpened, release), so it
+    can stand in for a capture in `useMediaPipe`, FramePipeline, RealtimeScheduler and the
+    batch extraction. ffmpeg's error output is kept, and a decode that fails or ends well before
+    the probed duration raises it instead of looking like the end of the video.
+
+    Args:
+        playlist (str): Local .m3u8 path or URL; any other input ffmpeg reads works as well.
+        size (tuple, optional): (width, height) to scale the frames to inside ffmpeg. Default is
+            the stream's own size.
+        ffmpeg (str, optional): ffmpeg executable. Default is 'ffmpeg'.
+        ffprobe (str, optional): ffprobe executable. Default is 'ffprobe'.
+
+    Raises:
+        IOError: If the playlist cannot be probed.
+
+    Example:
+        >>> cap = HLSFrameSource("https://turkisaretdili.net/media/SIYAH2.m3u8")
+        >>> success, frame = cap.read()
+        >>> cap.release()
+    """
+
+    def __init__(self, playlist, size=None, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+        self.playlist = playlist
+        self.ffmpeg = ffmpeg
+        self.size = size
+        self._process = None
+        self._stderr = None
+        self._frame = None
+        self._index = -1
+        info = probe(playlist, ffprobe)
+        self.width, self.height = size if size is not None else (info['width'], info['height'])
+        self.fps = info['fps']
+        self.duration = info['duration']
+        self._start()
+
+    def _start(self):
+        command = [self.ffmpeg, '-nostdin', '-loglevel', 'error', '-protocol_whitelist', PROTOCOL_WHITELIST, '-i', self.playlist]
+        if self.size is not None:
+            command += ['-vf', f'scale={self.width}:{self.height}']
+        command += ['-an', '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        frame_bytes = self.width * self.height * 3
+        # A file rather than a pipe, so a chatty ffmpeg can never block on a full stderr
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=self._stderr, bufsize=2 * frame_bytes)
+        self._frame = None
+        self._index = -1
+
+    def isOpened(self):
+        return self._process is not None
+
+    def grab(self):
+        """
+        Reads the next frame from the pipe. Unlike a file capture it is decoded either way.
+
+        Raises:
+            IOError: With ffmpeg's error output, if ffmpeg failed or the frames ran out more than
+                END_TOLERANCE seconds before the probed duration.
+        """
+        if self._process is None:
+            return False
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                self._frame = None
+                self._check_end()
+                return False
+            filled += count
+        self._frame = frame
+        self._index += 1
+        return True
+
+    def _check_end(self):
+        # The pipe is closed: ffmpeg is exiting, either at the end of the playlist or on an error
+        returncode = self._process.wait()
+        frames = self._index + 1
+        expected = self.duration * self.fps - END_TOLERANCE * self.fps if self.duration and self.fps else 0
+        if returncode == 0 and frames >= expected:
+            return
+        self._stderr.seek(0)
+        errors = self._stderr.read().decode('utf-8', 'replace').strip()
+        if returncode != 0:
+            problem = f"ffmpeg exited with code {returncode}"
+        else:
+            problem = f"ffmpeg stopped after {frames / self.fps:.2f} of {self.duration:.2f} s"
+        raise IOError(f"Cannot decode {self.playlist}: {problem}" + (f"\n{errors}" if errors else ""))
+
+    def retrieve(self):
+        return (True, self._frame) if self._frame is not None else (False, None)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self._index + 1
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            # Timestamp of the last frame read, from its index; raw frames carry no timestamps
+            return max(self._index, 0) * 1000 / self.fps if self.fps else 0.0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return round(self.duration * self.fps) if self.duration and self.fps else 0
+        return 0.0
+
+    def set(self, prop, value):
+        """
+        Supports rewinding to the start (CAP_PROP_POS_FRAMES = 0), which restarts ffmpeg.
+        """
+        if prop == cv2.CAP_PROP_POS_FRAMES and value == 0 and self._process is not None:
+            self._stop()
+            self._start()
+            return True
+        return False
+
+    def _stop(self):
+        self._process.kill()
+        self._process.stdout.close()
+        self._process.wait()
+        self._stderr.close()
+
+    def release(self):
+        if self._process is not None:
+            self._stop()
+            self._process = None
+
+def _with_whitelist(options):
+    # OpenCV's option string is 'key;value|key;value'; the user's own whitelist wins
+    if not options:
+        return f'protocol_whitelist;{PROTOCOL_WHITELIST}'
+    if any(option.split(';', 1)[0] == 'protocol_whitelist' for option in options.split('|')):
+        return options
+    return f'{options}|protocol_whitelist;{PROTOCOL_WHITELIST}'
+
+def open_capture(source):
+    """
+    Opens a video file, URL, camera index or HLS playlist for reading frames.
+
+    Playlists are decoded in memory: by OpenCV's own FFmpeg backend when it can open them,
+    otherwise by an HLSFrameSource over an ffmpeg pipe. Either way no segment or converted
+    file touches the disk. Everything else goes to cv2.VideoCapture as before.
+
+    Args:
+        source (str or int): Video path, URL, .m3u8 playlist, or camera index (also as a digit string).
+
+    Returns:
+        cv2.VideoCapture or HLSFrameSource: The capture; check `isOpened()`.
+
+    Raises:
+        IOError: If neither OpenCV nor ffprobe can open a playlist.
+
+    Example:
+        >>> cap = open_capture("ts/SIYAH2.m3u8")
+        >>> success, frame = cap.read()
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, int):
+        return cv2.VideoCapture(source)
+    if not is_playlist(source):
+        return cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+    # A local playlist may list remote segments. OpenCV reads its FFmpeg options from the
+    # environment when a capture opens, so the whitelist is only set for this one open
+    with _options_lock:
+        previous = os.environ.get(CAPTURE_OPTIONS)
+        os.environ[CAPTURE_OPTIONS] = _with_whitelist(previous)
+        try:
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+        finally:
+            if previous is None:
+                del os.environ[CAPTURE_OPTIONS]
+            else:
+                os.environ[CAPTURE_OPTIONS] = previous
+    if cap.isOpened():
+        return cap
+    cap.release()
+    return HLSFrameSource(source)
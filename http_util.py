@@ -0,0 +1,235 @@
+import hashlib
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 1 << 16
+HASH_CHUNK_SIZE = 1 << 20
+# Responses worth another try: rate limiting and server-side failures
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class DownloadError(IOError):
+    """
+    A download that failed for good: a non-retryable status, or every retry used up.
+    """
+
+def file_hash(path):
+    """
+    Returns the SHA-256 of a file's content, read in 1 MiB chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_session(pool_size=16, user_agent=None):
+    """
+    Creates a requests.Session whose connection pool fits `pool_size` concurrent downloads.
+
+    Connections are kept alive and reused, so many small files from one host cost one TLS
+    handshake per pooled connection instead of one per file. One session may be shared by
+    all download threads.
+
+    Args:
+        pool_size (int, optional): Connections kept per host; match it to the concurrency. Default is 16.
+        user_agent (str, optional): User-Agent header. Default is the requests default.
+
+    Returns:
+        requests.Session: The session.
+
+    Example:
+        >>> session = make_session(8)
+        >>> download_file(session, "https://turkisaretdili.net/media/SIYAH2_0.ts", "ts/SIYAH2_0.ts")
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if user_agent is not None:
+        session.headers['User-Agent'] = user_agent
+    return session
+
+def _sleep_backoff(attempt, backoff):
+    # Exponential backoff with jitter, so parallel downloads do not retry in lockstep
+    time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+def _remote_size(session, url, timeout):
+    response = session.head(url, timeout=timeout, allow_redirects=True)
+    if response.status_code != 200:
+        return None
+    length = response.headers.get('Content-Length')
+    return int(length) if length is not None else None
+
+def _content_range(response):
+    # "bytes 100-199/1000" -> (100, 1000); "bytes */1000" -> (None, 1000); unknown parts are None
+    match = re.match(r'bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)', response.headers.get('Content-Range', ''))
+    if match is None:
+        return None, None
+    start, total = match.groups()
+    return (int(start) if start is not None else None), (int(total) if total != '*' else None)
+
+def _discard_part(part_path):
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+def request_with_retries(session, method, url, retries=4, backoff=0.5, timeout=30, **kwargs):
+    """
+    Sends a request, retrying connection errors and RETRY_STATUS responses with exponential backoff.
+
+    Returns:
+        requests.Response: The last response; its status may still be an error.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                return response
+            response.close()
+        _sleep_backoff(attempt, backoff)
+
+def download_file(session, url, path, expected_size=None, retries=4, backoff=0.5, timeout=30, chunk_size=CHUNK_SIZE, overwrite=False):
+    """
+    Downloads a URL to a file, streamed in chunks, resuming and skipping where possible.
+
+    The body goes to `<path>.part` and is renamed to `path` once complete, so `path` only
+    ever holds whole files. An existing `path` whose size matches the remote size is skipped.
+    A leftover `.part` file is resumed with a Range request; servers that ignore the range
+    send the whole file again, which restarts it. The Content-Range of a resumed response must
+    start where the part file ends and report the same total size as before, else the remote
+    file changed and the download restarts from zero; the same goes for a 416 answer whose
+    size differs from the part file. Dropped connections and RETRY_STATUS responses are
+    retried with exponential backoff, resuming from what already arrived.
+
+    Args:
+        session (requests.Session): Session to use, e.g. from `make_session`.
+        url (str): File URL.
+        path (str): Destination file.
+        expected_size (int, optional): Known size in bytes; saves the HEAD request for the skip check.
+        retries (int, optional): Retries after the first attempt. Default is 4.
+        backoff (float, optional): First retry delay in seconds, doubled on each retry. Default is 0.5.
+        timeout (float, optional): Connect and read timeout in seconds. Default is 30.
+        chunk_size (int, optional): Bytes written per chunk. Default is CHUNK_SIZE.
+        overwrite (bool, optional): Download even if `path` exists, e.g. because the remote file
+            changed; a leftover part file is discarded. The old file stays in place until the new
+            one is complete. Default is False.
+
+    Returns:
+        dict: 'url', 'path', 'status' ('downloaded', 'resumed' or 'skipped'), 'size' in bytes
+        and the 'etag' and 'last_modified' validators (None unless the server sent them with the body).
+
+    Raises:
+        DownloadError: If the server answers with an error, or the retries run out.
+
+    Example:
+        >>> download_file(session, "https://turkisaretdili.net/media/SIYAH2_0.ts", "ts/SIYAH2_0.ts")
+        {'url': '...', 'path': 'ts/SIYAH2_0.ts', 'status': 'downloaded', 'size': 297264, 'etag': '"5f1c-..."', 'last_modified': None}
+    """
+    result = {'url': url, 'path': path, 'status': 'downloaded', 'size': None, 'etag': None, 'last_modified': None}
+    part_path = path + '.part'
+    if overwrite:
+        _discard_part(part_path)
+    elif os.path.exists(path):
+        size = expected_size if expected_size is not None else _remote_size(session, url, timeout)
+        if size is not None and os.path.getsize(path) == size:
+            result.update(status='skipped', size=size)
+            return result
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Size of the whole remote file, once known; a different size later means it changed
+    remote_size = expected_size
+    last_error = None
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416 and offset:
+                    _, total = _content_range(response)
+                    if total is None or total != offset or (remote_size is not None and total != remote_size):
+                        # The remote file is not what the part file was cut from
+                        last_error = DownloadError(f"{url}: remote size {total} does not match the {offset} bytes downloaded")
+                        _discard_part(part_path)
+                        continue
+                    # The part file already holds the whole body
+                    remote_size = total
+                elif response.status_code in (200, 206):
+                    length = response.headers.get('Content-Length')
+                    if response.status_code == 206:
+                        start, total = _content_range(response)
+                        if start != offset or total is None or (remote_size is not None and total != remote_size):
+                            last_error = DownloadError(f"{url}: Content-Range {response.headers.get('Content-Range')!r} does not continue the {offset} bytes downloaded")
+                            _discard_part(part_path)
+                            continue
+                        result['status'] = 'resumed'
+                        mode = 'ab'
+                    else:
+                        # No range support, or no part file: start over
+                        mode = 'wb'
+                        result['status'] = 'downloaded'
+                        # A whole body describes the file as it is now
+                        total = None if length is None else int(length)
+                    remote_size = total
+                    result['etag'] = response.headers.get('ETag')
+                    result['last_modified'] = response.headers.get('Last-Modified')
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(chunk_size):
+                            f.write(chunk)
+                elif response.status_code in RETRY_STATUS:
+                    last_error = DownloadError(f"{url}: HTTP {response.status_code}")
+                    if attempt < retries:
+                        _sleep_backoff(attempt, backoff)
+                    continue
+                else:
+                    raise DownloadError(f"{url}: HTTP {response.status_code}")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            # The bytes that arrived stay in the part file and the next attempt resumes after them
+            last_error = DownloadError(f"{url}: {e}")
+            if attempt < retries:
+                _sleep_backoff(attempt, backoff)
+            continue
+
+        size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if remote_size is not None and size < remote_size:
+            last_error = DownloadError(f"{url}: got {size} of {remote_size} bytes")
+            if attempt < retries:
+                _sleep_backoff(attempt, backoff)
+            continue
+        os.replace(part_path, path)
+        result['size'] = size
+        return result
+    raise last_error
+
+def download_many(session, jobs, workers=8, **kwargs):
+    """
+    Runs `download_file` for many files on a pool of `workers` threads.
+
+    Downloads are mostly waiting on the network, so threads sharing one pooled session keep
+    `workers` requests in flight without the process doing much.
+
+    Args:
+        session (requests.Session): Shared session; give it at least `workers` pooled connections.
+        jobs (list of tuple): (url, path) pairs.
+        workers (int, optional): Concurrent downloads. Default is 8.
+        **kwargs: Passed on to `download_file`, e.g. `retries`.
+
+    Yields:
+        dict: The `download_file` result of every job as it finishes, in completion order. A
+        failed job yields {'url', 'path', 'status': 'failed', 'error': message}.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Download") as executor:
+        futures = {executor.submit(download_file, session, url, path, **kwargs): (url, path) for url, path in jobs}
+        for future in as_completed(futures):
+            url, path = futures[future]
+            try:
+                yield future.result()
+            except (DownloadError, requests.RequestException, OSError) as e:
+                yield {'url': url, 'path': path, 'status': 'failed', 'error': str(e)}
@@ -0,0 +1,538 @@
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+import instrumentation
+from hls_source import open_capture
+from instrumentation import registry as metrics
+from pipeline import FramePacket
+from util import resize_to_inference
+
+# Frames pushed over the local socket: every message is a 4-byte big-endian length followed by
+# the payload. The first message of a connection is the UTF-8 stream id, every later one a
+# JPEG or PNG encoded frame.
+LENGTH_PREFIX = struct.Struct(">I")
+MAX_MESSAGE_BYTES = 64 * 2**20
+
+class Stream:
+    """
+    One input feed of the server: its queue, its counters and the worker it is pinned to.
+
+    The queue keeps the newest `queue_size` frames; when the worker falls behind, the oldest
+    frame is discarded, so a live feed never builds up latency.
+
+    Attributes:
+        stream_id (str): Name of the stream, also sent in its JSON messages.
+        index (int): Number of the stream in the header of its binary messages.
+        worker (ModelWorker): The worker that owns the stream's session.
+        received (int): Frames put into the queue.
+        processed (int): Frames that went through the models.
+        dropped (int): Frames discarded because the queue was full.
+        fps (float): Processed frames per second, smoothed.
+        latency_ms (float): Time from arrival to the end of inference of the last frame.
+        finished (bool): The source ended; the stream is removed once its queue is empty.
+    """
+
+    def __init__(self, stream_id, queue_size, index=0):
+        self.stream_id = stream_id
+        self.index = index
+        self.worker = None
+        self.session = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.fps = 0.0
+        self.latency_ms = 0.0
+        self.finished = False
+        self._frames = deque(maxlen=queue_size)
+        self._last_done = None
+
+    def put(self, frame, timestamp_ms):
+        """
+        Queues a BGR frame for inference.
+        """
+        packet = FramePacket(self.received, timestamp_ms, frame)
+        with self.worker.condition:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+                metrics.count('stream_dropped')
+            self._frames.append((packet, time.perf_counter()))
+            self.received += 1
+            self.worker.condition.notify()
+
+    def finish(self):
+        """
+        Marks the end of the source.
+        """
+        with self.worker.condition:
+            self.finished = True
+            self.worker.condition.notify()
+
+    def queue_depth(self):
+        return len(self._frames)
+
+    def _done(self, arrival_time):
+        now = time.perf_counter()
+        self.processed += 1
+        self.latency_ms = (now - arrival_time) * 1000
+        metrics.tick('frames')
+        metrics.record('stream_latency', arrival_time)
+        if self._last_done is not None and now > self._last_done:
+            # Exponential moving average over roughly the last 10 frames
+            self.fps += (1 / (now - self._last_done) - self.fps) * 0.1
+        self._last_done = now
+
+class ModelWorker:
+    """
+    A thread that runs the models for the streams pinned to it.
+
+    MediaPipe graphs carry tracking state from frame to frame, so each stream keeps one
+    StreamSession for its whole life, created and used only on this thread. The worker serves
+    its streams round-robin, one frame per stream per turn, so a busy feed cannot starve a
+    quiet one.
+
+    Args:
+        index (int): Position of the worker in the pool.
+        process (callable): Called as process(stream, packet) for every frame on this thread.
+        model_config (dict, optional): Settings of the three solutions for new sessions.
+        roi (bool, optional): Pose-guided cropping of new sessions; None keeps the model config setting.
+        rates (dict, optional): Per-model periods of new sessions (see rate_scheduler.RateScheduler).
+        motion_gate (bool or dict, optional): Motion gate of new sessions (see motion_gate.MotionGate).
+    """
+
+    def __init__(self, index, process, model_config=None, roi=None, rates=None, motion_gate=None):
+        self.index = index
+        self.process = process
+        self.model_config = model_config
+        self.roi = roi
+        self.rates = rates
+        self.motion_gate = motion_gate
+        self.condition = threading.Condition()
+        self.streams = []
+        self.error = None
+        self._stop = False
+        self._next = 0
+        self._thread = threading.Thread(target=self._run, name=f"ModelWorker-{index}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self.condition:
+            self._stop = True
+            self.condition.notify()
+        self._thread.join()
+
+    def add(self, stream):
+        with self.condition:
+            stream.worker = self
+            self.streams.append(stream)
+
+    def _take_turn(self):
+        # Called with the condition held; returns one (stream, packet, arrival time) per stream that has a frame
+        turn = []
+        streams = self.streams
+        count = len(streams)
+        for offset in range(count):
+            stream = streams[(self._next + offset) % count]
+            if stream._frames:
+                turn.append((stream, *stream._frames.popleft()))
+        if count:
+            self._next = (self._next + 1) % count
+        return turn
+
+    def _remove_finished(self):
+        for stream in [stream for stream in self.streams if stream.finished and not stream._frames]:
+            self.streams.remove(stream)
+            if stream.session is not None:
+                stream.session.close()
+                stream.session = None
+
+    def _run(self):
+        from mediapipe_util import StreamSession
+
+        while True:
+            with self.condition:
+                while True:
+                    self._remove_finished()
+                    if self._stop:
+                        turn = None
+                        break
+                    turn = self._take_turn()
+                    if turn:
+                        break
+                    self.condition.wait(0.5)
+            if turn is None:
+                break
+            for stream, packet, arrival_time in turn:
+                if stream.session is None:
+                    stream.session = StreamSession(self.model_config, stream_id=stream.stream_id, roi=self.roi, rates=self.rates, motion_gate=self.motion_gate, overlay='none', stream_index=stream.index)
+                try:
+                    self.process(stream, packet)
+                except Exception as e:
+                    # A bad frame or a failing model must not take down the other streams
+                    self.error = e
+                    print(f"[{stream.stream_id}] Inference failed: {type(e).__name__}: {e}")
+                stream._done(arrival_time)
+
+        for stream in self.streams:
+            if stream.session is not None:
+                stream.session.close()
+                stream.session = None
+
+class InferenceServer:
+    """
+    Serves many video feeds from one process with a fixed pool of model workers.
+
+    Streams come from capture sources (files, RTSP/HTTP URLs, device indices) via `add_source`,
+    or from clients pushing encoded frames to the local socket opened by `listen`. Every new
+    stream is pinned to the worker with the fewest streams and stays there, so its tracking
+    state lives in one place.
+
+    Args:
+        workers (int, optional): Number of model workers. Defaults to the CPU count.
+        queue_size (int, optional): Frames kept per stream while its worker is busy. Default is 2.
+        Send2WSS (bool, optional): Publish every stream's landmarks to the WebSocket server. Default is False.
+        wire_format (str, optional): WebSocket message format, "json", "float32" or "int16". Default is "json".
+            JSON messages name their stream in 'stream_id', binary ones carry `Stream.index` in the header.
+        model_config (dict, optional): Settings of the three solutions. Defaults to model_config.MODEL_CONFIG.
+        on_result (callable, optional): Called as on_result(stream, packet, session) after inference,
+            on the worker thread.
+        inference_size (int or tuple, optional): Resolution the models run at (see util.resize_to_inference).
+            None runs them on the source frames. Face metrics are measured in source pixels either way.
+        roi (bool, optional): Run face mesh and hands on pose-guided crops (see roi.RoiTracker).
+            None keeps the model config setting.
+        rates (dict, optional): Run each model only every n-th frame, e.g. {'face': 2, 'pose': 3, 'hands': 1}.
+            None runs every model on every frame.
+        motion_gate (bool or dict, optional): Reuse the previous results of a stream while its frames
+            do not change (see motion_gate.MotionGate). Default is None.
+
+    Example:
+        >>> server = InferenceServer(workers=4, Send2WSS=True)
+        >>> server.add_source('rtsp://camera-1/live', 'camera-1')
+        >>> server.add_source('videos/Anne.mp4', loop=True)
+        >>> server.listen(('127.0.0.1', 9100))
+        >>> server.serve_forever(stats_interval=5)
+    """
+
+    def __init__(self, workers=None, queue_size=2, Send2WSS=False, wire_format="json", model_config=None, on_result=None, inference_size=None, roi=None, rates=None, motion_gate=None):
+        self.queue_size = queue_size
+        self.inference_size = inference_size
+        self.Send2WSS = Send2WSS
+        self.wire_format = wire_format
+        self.on_result = on_result
+        self.workers = [ModelWorker(i, self._process, model_config, roi, rates, motion_gate) for i in range(workers or os.cpu_count() or 1)]
+        self.streams = {}
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._tcp_server = None
+        self._closing = threading.Event()
+        for worker in self.workers:
+            worker.start()
+
+    def _process(self, stream, packet):
+        session = stream.session
+        frame = packet.frame
+        frame_rgb = cv2.cvtColor(resize_to_inference(frame, self.inference_size), cv2.COLOR_BGR2RGB)
+        session.extract_landmarks(frame_rgb, frame_size=(frame.shape[1], frame.shape[0]))
+        if self.Send2WSS:
+            session.publish(self.wire_format)
+        if self.on_result is not None:
+            self.on_result(stream, packet, session)
+
+    def open_stream(self, stream_id=None):
+        """
+        Creates a stream and pins it to the least loaded worker.
+
+        Args:
+            stream_id (str, optional): Name of the stream. Defaults to "stream-<n>"; taken names
+                get a numeric suffix.
+
+        Returns:
+            Stream: The new stream; feed it with `put()` and end it with `finish()`.
+        """
+        with self._lock:
+            base = stream_id or f"stream-{len(self.streams)}"
+            stream_id = base
+            suffix = 1
+            while stream_id in self.streams:
+                stream_id = f"{base}_{suffix}"
+                suffix += 1
+            # Binary messages tell the streams apart by this number (a 16-bit header field)
+            stream = Stream(stream_id, self.queue_size, self._opened & 0xFFFF)
+            self._opened += 1
+            min(self.workers, key=lambda worker: len(worker.streams)).add(stream)
+            self.streams[stream_id] = stream
+        return stream
+
+    def add_source(self, source, stream_id=None, loop=False, realtime=None):
+        """
+        Opens a capture source and feeds it to a new stream from a reader thread.
+
+        Args:
+            source (str or int): Video file, RTSP/HTTP URL, HLS playlist (.m3u8 path or URL), or camera device index.
+            stream_id (str, optional): Name of the stream. Defaults to the source.
+            loop (bool, optional): Restart a file from the beginning when it ends. Default is False.
+            realtime (bool, optional): Read at the capture timestamps instead of as fast as possible.
+                Defaults to True for files; live sources are paced by the source itself.
+
+        Returns:
+            Stream: The new stream.
+        """
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        is_file = isinstance(source, str) and os.path.isfile(source)
+        cap = open_capture(source)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open {source}")
+        stream = self.open_stream(stream_id or str(source))
+        thread = threading.Thread(target=self._read_capture, args=(cap, stream, loop and is_file, is_file if realtime is None else realtime),
+                                  name=f"Reader-{stream.stream_id}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return stream
+
+    def _read_capture(self, cap, stream, loop, realtime):
+        clock_start = None
+        first_timestamp_ms = 0.0
+        try:
+            while not self._closing.is_set():
+                success, frame = cap.read()
+                if not success:
+                    if loop and stream.received > 0:
+                        # If the video has ended, reset to the beginning and restart the media clock
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        clock_start = None
+                        continue
+                    break
+                timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                if realtime:
+                    if clock_start is None:
+                        clock_start = time.perf_counter()
+                        first_timestamp_ms = timestamp_ms
+                    delay = clock_start + (timestamp_ms - first_timestamp_ms) / 1000 - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                stream.put(frame, timestamp_ms)
+        finally:
+            cap.release()
+            stream.finish()
+
+    def listen(self, address):
+        """
+        Accepts pushed frames on a TCP socket (see LENGTH_PREFIX for the message format).
+
+        Every connection becomes one stream, which ends when the connection closes.
+
+        Args:
+            address (tuple): (host, port) to bind; use a loopback host for local producers.
+
+        Returns:
+            tuple: The bound (host, port).
+        """
+        server = self
+
+        class FrameHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._read_socket(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._tcp_server = socketserver.ThreadingTCPServer(address, FrameHandler)
+        self._tcp_server.daemon_threads = True
+        thread = threading.Thread(target=self._tcp_server.serve_forever, name="FrameListener", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return self._tcp_server.server_address
+
+    def _read_socket(self, connection):
+        reader = connection.makefile('rb')
+        stream = None
+        try:
+            stream_id = _read_message(reader)
+            if stream_id is None:
+                return
+            stream = self.open_stream(stream_id.decode('utf-8') or None)
+            start_time = time.perf_counter()
+            while not self._closing.is_set():
+                data = _read_message(reader)
+                if data is None:
+                    break
+                frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    print(f"[{stream.stream_id}] Skipping a frame that could not be decoded")
+                    continue
+                stream.put(frame, (time.perf_counter() - start_time) * 1000)
+        except (ConnectionError, ValueError) as e:
+            # ValueError covers oversized messages and stream ids that are not UTF-8
+            name = stream.stream_id if stream is not None else "listener"
+            print(f"[{name}] Connection closed: {e}")
+        finally:
+            reader.close()
+            connection.close()
+            if stream is not None:
+                stream.finish()
+
+    def stats(self):
+        """
+        Returns a snapshot of every open stream.
+
+        Returns:
+            dict: Stream id mapped to a dict of 'index', 'worker', 'fps', 'queue_depth', 'received',
+            'processed', 'dropped', 'gated' (frames the motion gate let reuse results) and 'latency_ms'.
+        """
+        with self._lock:
+            streams = list(self.streams.values())
+        return {stream.stream_id: {
+            'index': stream.index,
+            'worker': stream.worker.index,
+            'fps': round(stream.fps, 1),
+            'queue_depth': stream.queue_depth(),
+            'received': stream.received,
+            'processed': stream.processed,
+            'dropped': stream.dropped,
+            'gated': _gated_frames(stream),
+            'latency_ms': round(stream.latency_ms, 1),
+        } for stream in streams}
+
+    def _forget_finished(self):
+        with self._lock:
+            for stream_id in [stream_id for stream_id, stream in self.streams.items() if stream.finished and stream.queue_depth() == 0]:
+                del self.streams[stream_id]
+
+    def serve_forever(self, stats_interval=5.0, exit_when_idle=False):
+        """
+        Prints the stream stats every `stats_interval` seconds until interrupted.
+
+        Args:
+            stats_interval (float, optional): Seconds between reports. Default is 5.
+            exit_when_idle (bool, optional): Return once every stream has ended, unless the socket
+                listener is running. Default is False.
+        """
+        try:
+            while not self._closing.wait(stats_interval):
+                for stream_id, stats in self.stats().items():
+                    print(f"[{stream_id}] worker {stats['worker']}: {stats['fps']:.1f} fps, queue {stats['queue_depth']}, "
+                          f"{stats['processed']}/{stats['received']} frames, {stats['dropped']} dropped, {stats['gated']} gated, {stats['latency_ms']:.0f} ms")
+                self._forget_finished()
+                if exit_when_idle and self._tcp_server is None and not self.streams:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops the readers, the listener and the workers.
+        """
+        self._closing.set()
+        if self._tcp_server is not None:
+            self._tcp_server.shutdown()
+            self._tcp_server.server_close()
+            self._tcp_server = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for worker in self.workers:
+            worker.stop()
+
+def _gated_frames(stream):
+    session = stream.session
+    if session is None or session.motion_gate is None:
+        return 0
+    return session.motion_gate.gated
+
+def _read_message(reader):
+    header = reader.read(LENGTH_PREFIX.size)
+    if len(header) < LENGTH_PREFIX.size:
+        return None
+    (length,) = LENGTH_PREFIX.unpack(header)
+    if length > MAX_MESSAGE_BYTES:
+        raise ValueError(f"Message of {length} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    data = reader.read(length)
+    if len(data) < length:
+        return None
+    return data
+
+def push_frames(address, stream_id, frames, quality=90):
+    """
+    Sends frames to a server started with `listen`, e.g. from a capture process.
+
+    Args:
+        address (tuple): (host, port) of the server.
+        stream_id (str): Name of the stream.
+        frames (iterable of numpy.ndarray): BGR frames.
+        quality (int, optional): JPEG quality. Default is 90.
+
+    Returns:
+        int: Number of frames sent.
+    """
+    sent = 0
+    with socket.create_connection(address) as connection:
+        stream_id = stream_id.encode('utf-8')
+        connection.sendall(LENGTH_PREFIX.pack(len(stream_id)) + stream_id)
+        for frame in frames:
+            success, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not success:
+                continue
+            connection.sendall(LENGTH_PREFIX.pack(len(encoded)) + encoded.tobytes())
+            sent += 1
+    return sent
+
+def _parse_source(value):
+    # "name=url" names the stream; a bare url or device index is named after itself
+    name, sep, source = value.partition('=')
+    if sep and '://' not in name:
+        return source, name
+    return value, None
+
+def _parse_rates(value):
+    # "face=2,pose=3" -> {'face': 2, 'pose': 3}
+    rates = {}
+    for item in value.split(','):
+        model, _, period = item.partition('=')
+        rates[model.strip()] = int(period)
+    return rates
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the models over many live feeds with a pool of workers.")
+    parser.add_argument('-s', '--source', action='append', default=[], help="Video file, RTSP/HTTP URL, HLS playlist (.m3u8) or device index, optionally as name=source; repeatable")
+    parser.add_argument('--listen', default=None, help="host:port accepting frames pushed over TCP (e.g. 127.0.0.1:9100)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Model workers (default: CPU count)")
+    parser.add_argument('--queue-size', type=int, default=2, help="Frames kept per stream while its worker is busy (default: 2)")
+    parser.add_argument('--inference-size', type=int, default=None, help="Longest side of the frames the models run on (default: source size)")
+    parser.add_argument('--roi', action='store_true', default=None, help="Run face mesh and hands on crops found from the pose")
+    parser.add_argument('--rates', type=_parse_rates, default=None, help="Run models every n-th frame, e.g. face=2,pose=3,hands=1")
+    parser.add_argument('--motion-gate', action='store_true', help="Reuse the previous results while a stream's frames do not change")
+    parser.add_argument('--loop', action='store_true', help="Restart video files when they end")
+    parser.add_argument('--send2wss', action='store_true', help="Publish the landmarks to the WebSocket server")
+    parser.add_argument('--wire-format', default="json", choices=("json", "float32", "int16"), help="WebSocket message format (default: json)")
+    parser.add_argument('--stats-interval', type=float, default=5.0, help="Seconds between stats reports (default: 5)")
+    parser.add_argument('--metrics-port', type=int, default=None, help="Serve per-stage timings on http://127.0.0.1:<port>/metrics")
+    parser.add_argument('--no-metrics', action='store_true', help="Turn the timing instrumentation off")
+    args = parser.parse_args()
+    if not args.source and args.listen is None:
+        parser.error("give at least one --source or --listen")
+    if args.no_metrics:
+        instrumentation.set_enabled(False)
+    elif args.metrics_port is not None:
+        print(f"Metrics on http://{':'.join(map(str, metrics.serve(args.metrics_port)))}/metrics")
+
+    server = InferenceServer(args.workers, args.queue_size, args.send2wss, args.wire_format, inference_size=args.inference_size, roi=args.roi, rates=args.rates, motion_gate=args.motion_gate or None)
+    for value in args.source:
+        source, name = _parse_source(value)
+        stream = server.add_source(source, name, loop=args.loop)
+        print(f"Stream {stream.stream_id} (binary stream {stream.index}) on worker {stream.worker.index}")
+    if args.listen is not None:
+        host, _, port = args.listen.rpartition(':')
+        print(f"Listening for frames on {server.listen((host or '127.0.0.1', int(port)))}")
+    server.serve_forever(args.stats_interval, exit_when_idle=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# Samples kept per stage for the percentiles
+WINDOW = 1024
+# Events kept per rate for the FPS estimate
+RATE_WINDOW = 120
+QUANTILES = (0.5, 0.95, 0.99)
+
+now = time.perf_counter
+
+class StageTimer:
+    """
+    Rolling window of the durations of one stage.
+
+    Recording writes one slot of a preallocated ring buffer; percentiles are only computed when
+    the metrics are read.
+    """
+
+    def __init__(self, window=WINDOW):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples[self._index] = seconds
+            self._index = (self._index + 1) % len(self._samples)
+            self.count += 1
+            self.total += seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        with self._lock:
+            samples = self._samples[:min(self.count, len(self._samples))].copy()
+        if not len(samples):
+            return [0.0] * len(quantiles)
+        return np.quantile(samples, quantiles).tolist()
+
+class RateMeter:
+    """
+    Events per second over the last RATE_WINDOW events, e.g. processed frames.
+    """
+
+    def __init__(self, window=RATE_WINDOW):
+        self._times = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def tick(self):
+        with self._lock:
+            self._times[self._index] = now()
+            self._index = (self._index + 1) % len(self._times)
+            self.count += 1
+
+    def rate(self):
+        with self._lock:
+            filled = min(self.count, len(self._times))
+            if filled < 2:
+                return 0.0
+            newest = self._times[(self._index - 1) % len(self._times)]
+            oldest = self._times[self._index % len(self._times)] if self.count >= len(self._times) else self._times[0]
+        # Stale once nothing happened for a few seconds
+        if now() - newest > 2.0 or newest <= oldest:
+            return 0.0
+        return (filled - 1) / (newest - oldest)
+
+class MetricsRegistry:
+    """
+    Hot-path timers, counters, gauges and rates of the whole process.
+
+    Stages are timed by taking `now()` before the work and passing it to `record()` after it,
+    which costs two clock reads and a ring buffer write. With the registry disabled every call
+    returns immediately and nothing is stored.
+
+    Args:
+        enabled (bool, optional): Record anything at all. Defaults to True unless the
+            MEDIAPIPE_METRICS environment variable is "0".
+
+    Example:
+        >>> metrics = instrumentation.registry
+        >>> t0 = instrumentation.now()
+        >>> results = face_mesh.process(frame_rgb)
+        >>> metrics.record('face_mesh', t0)
+        >>> metrics.tick('frames')
+        >>> metrics.serve(9108)    # curl http://127.0.0.1:9108/metrics
+    """
+
+    def __init__(self, enabled=None):
+        self.enabled = os.environ.get('MEDIAPIPE_METRICS', '1') != '0' if enabled is None else enabled
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.rates = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _get(self, table, name, factory):
+        entry = table.get(name)
+        if entry is None:
+            with self._lock:
+                entry = table.setdefault(name, factory())
+        return entry
+
+    def record(self, stage, t0):
+        """
+        Records the time since `t0` (a `now()` reading) under a stage name.
+        """
+        if self.enabled:
+            self._get(self.stages, stage, StageTimer).add(now() - t0)
+
+    def count(self, name, n=1):
+        """
+        Adds to a counter, e.g. dropped frames.
+        """
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        """
+        Sets a gauge, e.g. a queue depth.
+        """
+        if self.enabled:
+            self.gauges[name] = value
+
+    def tick(self, name):
+        """
+        Counts one event of a rate, e.g. one processed frame for the FPS.
+        """
+        if self.enabled:
+            self._get(self.rates, name, RateMeter).tick()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+            self.rates = {}
+
+    def snapshot(self):
+        """
+        Returns all metrics as a JSON-serializable dict; stage times are in milliseconds.
+        """
+        stages = {}
+        for name, timer in list(self.stages.items()):
+            p50, p95, p99 = (value * 1000 for value in timer.quantiles())
+            stages[name] = {'count': timer.count, 'mean_ms': timer.total / timer.count * 1000 if timer.count else 0.0,
+                            'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+        return {
+            'stages': stages,
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'rates': {name: meter.rate() for name, meter in list(self.rates.items())},
+        }
+
+    def render_text(self):
+        """
+        Formats the metrics in the Prometheus text format.
+        """
+        snapshot = self.snapshot()
+        lines = ['# TYPE mediapipe_stage_seconds summary']
+        for name, stage in sorted(snapshot['stages'].items()):
+            for quantile, key in zip(QUANTILES, ('p50_ms', 'p95_ms', 'p99_ms')):
+                lines.append(f'mediapipe_stage_seconds{{stage="{name}",quantile="{quantile}"}} {stage[key] / 1000:.6f}')
+            lines.append(f'mediapipe_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines.append('# TYPE mediapipe_events_total counter')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'mediapipe_events_total{{name="{name}"}} {value}')
+        lines.append('# TYPE mediapipe_gauge gauge')
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f'mediapipe_gauge{{name="{name}"}} {value}')
+        lines.append('# TYPE mediapipe_rate_per_second gauge')
+        for name, value in sorted(snapshot['rates'].items()):
+            lines.append(f'mediapipe_rate_per_second{{name="{name}"}} {value:.2f}')
+        return '\n'.join(lines) + '\n'
+
+    def render_table(self):
+        """
+        Formats the metrics as a human-readable table, e.g. for a periodic dump to the console.
+        """
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<20}{'count':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+        for name, stage in sorted(snapshot['stages'].items()):
+            lines.append(f"{name:<20}{stage['count']:>9}{stage['p50_ms']:>9.2f}{stage['p95_ms']:>9.2f}{stage['p99_ms']:>9.2f}")
+        for name, value in sorted(snapshot['rates'].items()):
+            lines.append(f"{name} rate: {value:.1f}/s")
+        for name, value in sorted({**snapshot['counters'], **snapshot['gauges']}.items()):
+            lines.append(f"{name}: {value}")
+        return '\n'.join(lines)
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """
+        Serves the metrics over HTTP from a background thread: /metrics (Prometheus text) and /metrics.json.
+
+        Returns:
+            tuple: The bound (host, port).
+        """
+        if self._server is not None:
+            return self._server.server_address
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(registry.snapshot()).encode('utf-8')
+                    content_type = 'application/json'
+                elif self.path.startswith('/metrics') or self.path == '/':
+                    body = registry.render_text().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would flood the console
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        return self._server.server_address
+
+    def dump_periodically(self, interval=10.0, stream=None):
+        """
+        Prints `render_table()` every `interval` seconds from a background thread.
+
+        Returns:
+            threading.Event: Set it to stop the dumps.
+        """
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                print(self.render_table(), file=stream or sys.stdout, flush=True)
+
+        threading.Thread(target=dump, name="MetricsDump", daemon=True).start()
+        return stop
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# The registry every module records into
+registry = MetricsRegistry()
+
+def set_enabled(enabled):
+    """
+    Turns recording on or off for the whole process.
+    """
+    registry.enabled = enabled
@@ -0,0 +1,145 @@
+import numpy as np
+import lm_indices as ids
+
+# Fixed shapes of the landmark arrays
+NUM_HANDS = 2
+NUM_HAND_LANDMARKS = 21
+NUM_POSE_LANDMARKS = 33
+NUM_FACE_LANDMARKS = 478
+
+# Hand slots inside the hands array
+LEFT = 0
+RIGHT = 1
+HAND_LABELS = {"Left hand": LEFT, "Right hand": RIGHT}
+
+# WebSocket payload keys, built once instead of with f-strings on every frame
+HAND_PAYLOAD_KEYS = (
+    tuple(f"Left_Hand_{name}_Pose" for name in ids.hand_constants_names),
+    tuple(f"Right_Hand_{name}_Pose" for name in ids.hand_constants_names),
+)
+
+class FrameLandmarks:
+    """
+    Fixed-shape float32 landmark arrays for a single frame.
+
+    The arrays are allocated once and refilled in place for every frame, straight from the
+    protobuf landmark fields. Coordinates stay normalized exactly as MediaPipe returns them.
+
+    Attributes:
+        hands (numpy.ndarray): (2, 21, 3) x, y, z of the left and right hand.
+        pose (numpy.ndarray): (33, 4) x, y, z, visibility of the body pose.
+        face (numpy.ndarray): (478, 3) x, y, z of the face mesh.
+        hand_present (numpy.ndarray): (2,) bool, whether each hand slot holds a detection.
+        pose_present (bool): Whether the pose array holds a detection.
+        face_present (bool): Whether the face array holds a detection.
+        hand_synthesized (numpy.ndarray): (2,) bool, whether each present hand was extrapolated
+            instead of measured on this frame (see rate_scheduler).
+        pose_synthesized (bool): Whether the present pose was extrapolated.
+        face_synthesized (bool): Whether the present face was extrapolated.
+
+    Example:
+        >>> frame_lms = FrameLandmarks()
+        >>> fill_hand(frame_lms, LEFT, hand_results.multi_hand_landmarks[0])
+        >>> frame_lms.hands[LEFT, ids.WRIST]
+        array([0.43638033, 0.87518704, 0.], dtype=float32)
+    """
+
+    def __init__(self):
+        self.hands = np.zeros((NUM_HANDS, NUM_HAND_LANDMARKS, 3), dtype=np.float32)
+        self.pose = np.zeros((NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+        self.face = np.zeros((NUM_FACE_LANDMARKS, 3), dtype=np.float32)
+        self.hand_present = np.zeros(NUM_HANDS, dtype=bool)
+        self.pose_present = False
+        self.face_present = False
+        self.hand_synthesized = np.zeros(NUM_HANDS, dtype=bool)
+        self.pose_synthesized = False
+        self.face_synthesized = False
+
+    def reset(self):
+        """
+        Marks every slot as empty and zeroes the arrays so stale values from the previous frame never leak.
+        """
+        self.hands.fill(0)
+        self.pose.fill(0)
+        self.face.fill(0)
+        self.hand_present.fill(False)
+        self.pose_present = False
+        self.face_present = False
+        self.hand_synthesized.fill(False)
+        self.pose_synthesized = False
+        self.face_synthesized = False
+
+def landmarks_to_array(landmark_list, out, with_visibility=False):
+    """
+    Copies a NormalizedLandmarkList into a preallocated float32 array.
+
+    Args:
+        landmark_list (NormalizedLandmarkList):
+            The protobuf landmark list returned by a MediaPipe solution.
+        out (numpy.ndarray):
+            Destination array of shape (N, 3), or (N, 4) when `with_visibility` is set.
+            Landmarks beyond N are ignored, missing ones are left at zero.
+        with_visibility (bool, optional):
+            Also copy the `visibility` field into the fourth column. Default is False.
+
+    Returns:
+        numpy.ndarray: The `out` array.
+    """
+    landmarks = landmark_list.landmark
+    count = min(len(landmarks), out.shape[0])
+    if with_visibility:
+        values = np.fromiter((v for lm in landmarks[:count] for v in (lm.x, lm.y, lm.z, lm.visibility)), dtype=np.float32, count=count * 4)
+        out[:count] = values.reshape(count, 4)
+    else:
+        values = np.fromiter((v for lm in landmarks[:count] for v in (lm.x, lm.y, lm.z)), dtype=np.float32, count=count * 3)
+        out[:count, :3] = values.reshape(count, 3)
+    out[count:] = 0
+    return out
+
+def fill_hand(frame_lms, slot, hand_landmarks):
+    """
+    Fills one hand slot (LEFT or RIGHT) of a FrameLandmarks from a protobuf landmark list.
+    """
+    landmarks_to_array(hand_landmarks, frame_lms.hands[slot])
+    frame_lms.hand_present[slot] = True
+
+def fill_pose(frame_lms, pose_landmarks):
+    """
+    Fills the pose array, including visibility, of a FrameLandmarks from a protobuf landmark list.
+    """
+    landmarks_to_array(pose_landmarks, frame_lms.pose, with_visibility=True)
+    frame_lms.pose_present = True
+
+def fill_face(frame_lms, face_landmarks):
+    """
+    Fills the face mesh array of a FrameLandmarks from a protobuf landmark list.
+
+    Without `refine_landmarks` the model returns 468 points; the iris rows then stay zero.
+    """
+    landmarks_to_array(face_landmarks, frame_lms.face)
+    frame_lms.face_present = True
+
+def hands_to_payload(frame_lms):
+    """
+    Builds the per-landmark hand entries of the WebSocket message.
+
+    Args:
+        frame_lms (FrameLandmarks): The landmarks of the current frame.
+
+    Returns:
+        dict:
+            `Left_Hand_<NAME>_Pose` / `Right_Hand_<NAME>_Pose` keys mapped to [x, y, z] lists,
+            or to None when that hand was not detected.
+
+    Example:
+        >>> hands_to_payload(frame_lms)["Left_Hand_WRIST_Pose"]
+        [0.4363803267478943, 0.8751870393753052, 0.0]
+    """
+    payload = {}
+    for slot in (LEFT, RIGHT):
+        keys = HAND_PAYLOAD_KEYS[slot]
+        if frame_lms.hand_present[slot]:
+            payload.update(zip(keys, frame_lms.hands[slot].tolist()))
+        else:
+            payload.update(dict.fromkeys(keys))
+    return payload
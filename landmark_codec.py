@@ -0,0 +1,256 @@
+import json
+import struct
+import time
+import numpy as np
+import lm_indices as ids
+from landmark_arrays import NUM_HANDS, NUM_HAND_LANDMARKS, NUM_POSE_LANDMARKS, LEFT, RIGHT
+
+# Binary landmark wire format
+#
+# Every message starts with the same little-endian header:
+#   magic (4s) | version (B) | kind (B) | encoding (B) | presence (B) | seq (I) | timestamp (d) | stream (H)
+# `stream` tells the streams of one producer apart (e.g. the feeds of the inference server);
+# version 1 messages have no stream field and belong to stream 0.
+# A SCHEMA message carries a UTF-8 JSON description of the layout after the header and is sent
+# once per connection. A FRAME message carries, after the header:
+#   metrics  float32[len(METRIC_NAMES)]           (NaN when a metric is missing)
+#   hands    float32 or int16 [2, 21, 3]          (left, right; x, y, z)
+#   pose     float32 or int16 [33, 4]             (x, y, z, visibility)
+# int16 values are the float values multiplied by QUANT_SCALE and rounded.
+# The low 4 presence bits say which parts were detected, the high 4 which of those were
+# extrapolated rather than measured; decoders that predate the high bits simply ignore them.
+
+MAGIC = b"MPLM"
+VERSION = 2
+HEADER = struct.Struct("<4sBBBBIdH")
+HEADER_V1 = struct.Struct("<4sBBBBId")
+HEADER_FIELDS = ('magic', 'version', 'kind', 'encoding', 'presence', 'seq', 'timestamp', 'stream')
+
+KIND_SCHEMA = 0
+KIND_FRAME = 1
+
+ENCODING_FLOAT32 = 0
+ENCODING_INT16 = 1
+ENCODINGS = {"float32": ENCODING_FLOAT32, "int16": ENCODING_INT16}
+ENCODING_DTYPES = {ENCODING_FLOAT32: np.dtype("<f4"), ENCODING_INT16: np.dtype("<i2")}
+
+# Normalized coordinates stay well inside [-2, 2); 1/16384 resolution is far below a pixel
+QUANT_SCALE = 16384.0
+
+# Presence bits
+PRESENT_FACE = 1 << 0
+PRESENT_LEFT_HAND = 1 << 1
+PRESENT_RIGHT_HAND = 1 << 2
+PRESENT_POSE = 1 << 3
+
+# Synthesized bits: the present landmarks were extrapolated, not measured (see rate_scheduler)
+SYNTHESIZED_FACE = 1 << 4
+SYNTHESIZED_LEFT_HAND = 1 << 5
+SYNTHESIZED_RIGHT_HAND = 1 << 6
+SYNTHESIZED_POSE = 1 << 7
+
+# Face metrics in wire order, as returned by calculations.analyze_face_landmarks
+METRIC_NAMES = (
+    'gap',
+    'nod',
+    'turn',
+    'blinkR',
+    'blinkL',
+    'nose_2_chin_dist',
+    'mouth_opening_angle',
+    'eye_2_chin_ratio',
+)
+
+HANDS_SHAPE = (NUM_HANDS, NUM_HAND_LANDMARKS, 3)
+POSE_SHAPE = (NUM_POSE_LANDMARKS, 4)
+
+def build_schema(encoding="float32"):
+    """
+    Describes the frame layout for a given encoding.
+
+    Args:
+        encoding (str, optional): "float32" or "int16". Default is "float32".
+
+    Returns:
+        dict: JSON-serializable schema, the payload of a SCHEMA message.
+    """
+    return {
+        'magic': MAGIC.decode('ascii'),
+        'version': VERSION,
+        'header': {'format': HEADER.format, 'size': HEADER.size, 'fields': list(HEADER_FIELDS)},
+        'encoding': encoding,
+        'scale': QUANT_SCALE if encoding == "int16" else 1.0,
+        'presence': {'face': PRESENT_FACE, 'left_hand': PRESENT_LEFT_HAND, 'right_hand': PRESENT_RIGHT_HAND, 'pose': PRESENT_POSE},
+        'synthesized': {'face': SYNTHESIZED_FACE, 'left_hand': SYNTHESIZED_LEFT_HAND, 'right_hand': SYNTHESIZED_RIGHT_HAND, 'pose': SYNTHESIZED_POSE},
+        'metrics': list(METRIC_NAMES),
+        'hands': {'shape': list(HANDS_SHAPE), 'landmarks': list(ids.hand_constants_names)},
+        'pose': {'shape': list(POSE_SHAPE)},
+    }
+
+def encode_schema(encoding="float32", stream=0):
+    """
+    Builds the SCHEMA message that is sent once per connection.
+
+    Args:
+        encoding (str, optional): "float32" or "int16". Default is "float32".
+        stream (int, optional): Stream number put in the header. Default is 0.
+
+    Returns:
+        bytes: The encoded message.
+    """
+    header = HEADER.pack(MAGIC, VERSION, KIND_SCHEMA, ENCODINGS[encoding], 0, 0, time.time(), stream)
+    return header + json.dumps(build_schema(encoding)).encode('utf-8')
+
+def is_schema_message(message):
+    """
+    Tells whether a raw WebSocket message is a SCHEMA message of this format.
+    """
+    return isinstance(message, (bytes, bytearray)) and message[:4] == MAGIC and len(message) > 5 and message[5] == KIND_SCHEMA
+
+def _frame_layout(encoding_id, header_size=HEADER.size):
+    dtype = ENCODING_DTYPES[encoding_id]
+    metrics_offset = header_size
+    hands_offset = metrics_offset + len(METRIC_NAMES) * 4
+    pose_offset = hands_offset + int(np.prod(HANDS_SHAPE)) * dtype.itemsize
+    size = pose_offset + int(np.prod(POSE_SHAPE)) * dtype.itemsize
+    return dtype, metrics_offset, hands_offset, pose_offset, size
+
+class LandmarkEncoder:
+    """
+    Packs FrameLandmarks and face metrics into FRAME messages.
+
+    The message buffer and its array views are allocated once; encoding a frame only copies
+    the arrays into place and patches the header.
+
+    Args:
+        encoding (str, optional): "float32" or "int16". Default is "float32".
+        stream (int, optional): Stream number written into every header (0-65535). Default is 0.
+
+    Example:
+        >>> encoder = LandmarkEncoder("int16", stream=3)
+        >>> publisher.set_hello(encoder.schema_message, key=3)
+        >>> publisher.publish(encoder.encode(session.frame_landmarks, session.metrics))
+    """
+
+    def __init__(self, encoding="float32", stream=0):
+        self.encoding = encoding
+        self.encoding_id = ENCODINGS[encoding]
+        self.stream = stream
+        self.schema_message = encode_schema(encoding, stream)
+        self.seq = 0
+        dtype, metrics_offset, hands_offset, pose_offset, size = _frame_layout(self.encoding_id)
+        self._buffer = bytearray(size)
+        self._metrics = np.frombuffer(self._buffer, dtype="<f4", count=len(METRIC_NAMES), offset=metrics_offset)
+        self._hands = np.frombuffer(self._buffer, dtype=dtype, count=int(np.prod(HANDS_SHAPE)), offset=hands_offset).reshape(HANDS_SHAPE)
+        self._pose = np.frombuffer(self._buffer, dtype=dtype, count=int(np.prod(POSE_SHAPE)), offset=pose_offset).reshape(POSE_SHAPE)
+
+    def encode(self, frame_lms, metrics, timestamp=None):
+        """
+        Encodes one frame.
+
+        Args:
+            frame_lms (FrameLandmarks): Landmarks of the frame.
+            metrics (dict): Face metrics keyed by METRIC_NAMES; missing keys are sent as NaN.
+            timestamp (float, optional): Seconds since the epoch. Defaults to the current time.
+
+        Returns:
+            bytes: The encoded FRAME message.
+        """
+        presence = 0
+        if frame_lms.face_present:
+            presence |= PRESENT_FACE
+        if frame_lms.hand_present[LEFT]:
+            presence |= PRESENT_LEFT_HAND
+        if frame_lms.hand_present[RIGHT]:
+            presence |= PRESENT_RIGHT_HAND
+        if frame_lms.pose_present:
+            presence |= PRESENT_POSE
+        if frame_lms.face_synthesized:
+            presence |= SYNTHESIZED_FACE
+        if frame_lms.hand_synthesized[LEFT]:
+            presence |= SYNTHESIZED_LEFT_HAND
+        if frame_lms.hand_synthesized[RIGHT]:
+            presence |= SYNTHESIZED_RIGHT_HAND
+        if frame_lms.pose_synthesized:
+            presence |= SYNTHESIZED_POSE
+
+        for i, name in enumerate(METRIC_NAMES):
+            value = metrics.get(name)
+            self._metrics[i] = np.nan if value is None else value
+        if self.encoding_id == ENCODING_INT16:
+            self._hands[:] = np.clip(np.rint(frame_lms.hands * QUANT_SCALE), -32768, 32767)
+            self._pose[:] = np.clip(np.rint(frame_lms.pose * QUANT_SCALE), -32768, 32767)
+        else:
+            self._hands[:] = frame_lms.hands
+            self._pose[:] = frame_lms.pose
+
+        HEADER.pack_into(self._buffer, 0, MAGIC, VERSION, KIND_FRAME, self.encoding_id, presence, self.seq, time.time() if timestamp is None else timestamp, self.stream)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return bytes(self._buffer)
+
+def decode_message(message):
+    """
+    Decodes a SCHEMA or FRAME message.
+
+    Args:
+        message (bytes): The raw WebSocket message.
+
+    Returns:
+        dict:
+            For a SCHEMA message: {'kind': 'schema', 'schema': dict}.
+            For a FRAME message: {'kind': 'frame', 'stream', 'seq', 'timestamp', 'metrics' (dict),
+            'hands' ((2, 21, 3) float32), 'pose' ((33, 4) float32), 'face_present',
+            'hand_present' ((2,) bool), 'pose_present', 'face_synthesized',
+            'hand_synthesized' ((2,) bool), 'pose_synthesized'}.
+
+    Raises:
+        ValueError: If the message is not of this format or has an unknown version.
+
+    Example:
+        >>> frame = decode_message(message)
+        >>> frame['metrics']['nod'], frame['hands'][LEFT, ids.WRIST]
+    """
+    if len(message) < HEADER_V1.size:
+        raise ValueError("Message is shorter than the header")
+    if message[:4] != MAGIC:
+        raise ValueError("Not a landmark message")
+    version = message[4]
+    if version == VERSION:
+        header = HEADER
+    elif version == 1:
+        header = HEADER_V1
+    else:
+        raise ValueError(f"Unsupported landmark message version {version}")
+    if len(message) < header.size:
+        raise ValueError("Message is shorter than the header")
+    _, _, kind, encoding_id, presence, seq, timestamp, *stream = header.unpack_from(message, 0)
+    stream = stream[0] if stream else 0
+
+    if kind == KIND_SCHEMA:
+        return {'kind': 'schema', 'schema': json.loads(bytes(message[header.size:]).decode('utf-8'))}
+
+    dtype, metrics_offset, hands_offset, pose_offset, size = _frame_layout(encoding_id, header.size)
+    if len(message) < size:
+        raise ValueError("Truncated landmark frame")
+    metrics = np.frombuffer(message, dtype="<f4", count=len(METRIC_NAMES), offset=metrics_offset)
+    hands = np.frombuffer(message, dtype=dtype, count=int(np.prod(HANDS_SHAPE)), offset=hands_offset).reshape(HANDS_SHAPE).astype(np.float32)
+    pose = np.frombuffer(message, dtype=dtype, count=int(np.prod(POSE_SHAPE)), offset=pose_offset).reshape(POSE_SHAPE).astype(np.float32)
+    if encoding_id == ENCODING_INT16:
+        hands /= QUANT_SCALE
+        pose /= QUANT_SCALE
+
+    return {
+        'kind': 'frame',
+        'stream': stream,
+        'seq': seq,
+        'timestamp': timestamp,
+        'metrics': dict(zip(METRIC_NAMES, metrics.tolist())),
+        'hands': hands,
+        'pose': pose,
+        'face_present': bool(presence & PRESENT_FACE),
+        'hand_present': np.array([presence & PRESENT_LEFT_HAND, presence & PRESENT_RIGHT_HAND], dtype=bool),
+        'pose_present': bool(presence & PRESENT_POSE),
+        'face_synthesized': bool(presence & SYNTHESIZED_FACE),
+        'hand_synthesized': np.array([presence & SYNTHESIZED_LEFT_HAND, presence & SYNTHESIZED_RIGHT_HAND], dtype=bool),
+        'pose_synthesized': bool(presence & SYNTHESIZED_POSE),
+    }
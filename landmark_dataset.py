@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+import numpy as np
+from landmark_arrays import NUM_HANDS, NUM_HAND_LANDMARKS, NUM_POSE_LANDMARKS, NUM_FACE_LANDMARKS, LEFT, RIGHT
+from landmark_codec import METRIC_NAMES
+from calculations import analyze_face_landmarks_batch
+
+# On-disk layout
+#
+#   <root>/manifest.json              index of every video in the dataset
+#   <root>/videos/<name>/meta.json    description of one video
+#   <root>/videos/<name>/<column>.npy one contiguous array per column, frames first
+#
+# Every column is a plain .npy file, so np.load(..., mmap_mode='r') maps it without reading it
+# and any frame range is a zero-copy slice.
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+META_FILE = 'meta.json'
+VIDEOS_DIR = 'videos'
+
+PRESENCE_FIELDS = ('face', 'left_hand', 'right_hand', 'pose')
+
+# Column name -> (per-frame shape, dtype)
+COLUMNS = {
+    'face': ((NUM_FACE_LANDMARKS, 3), np.float32),
+    'hands': ((NUM_HANDS, NUM_HAND_LANDMARKS, 3), np.float32),
+    'pose': ((NUM_POSE_LANDMARKS, 4), np.float32),
+    'metrics': ((len(METRIC_NAMES),), np.float32),
+    'presence': ((len(PRESENCE_FIELDS),), np.bool_),
+    'timestamps_ms': ((), np.float64),
+}
+
+def _write_json(path, data):
+    # Write next to the target and rename, so readers never see a half-written file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+class VideoLandmarksWriter:
+    """
+    Collects the per-frame landmarks of one video and writes them as columnar .npy files.
+
+    Frames are appended into in-memory column buffers that grow geometrically, so appending is
+    amortized O(1). `close()` writes the columns to a temporary folder and renames it into place.
+
+    Args:
+        root (str): Dataset root folder.
+        name (str): Name of the video inside the dataset.
+        source (str, optional): Path or URL of the source video, stored in the metadata.
+        fps (float, optional): Frame rate of the source video.
+        initial_capacity (int, optional): Frames to allocate up front. Default is 256.
+
+    Example:
+        >>> writer = VideoLandmarksWriter('landmarks', 'Anne', source='videos/Anne.mp4', fps=25)
+        >>> writer.append(session.frame_landmarks, session.metrics, cap.get(cv2.CAP_PROP_POS_MSEC))
+        >>> meta = writer.close()
+    """
+
+    def __init__(self, root, name, source=None, fps=None, initial_capacity=256):
+        self.root = root
+        self.name = name
+        self.source = source
+        self.fps = fps
+        self.frames = 0
+        self._columns = {column: np.zeros((initial_capacity, *shape), dtype=dtype) for column, (shape, dtype) in COLUMNS.items()}
+
+    def _grow(self):
+        for column, array in self._columns.items():
+            grown = np.zeros((array.shape[0] * 2, *array.shape[1:]), dtype=array.dtype)
+            grown[:self.frames] = array[:self.frames]
+            self._columns[column] = grown
+
+    def append(self, frame_lms, metrics, timestamp_ms):
+        """
+        Adds one frame.
+
+        Args:
+            frame_lms (FrameLandmarks): Landmarks of the frame.
+            metrics (dict or None): Face metrics keyed by METRIC_NAMES; ignored when no face was detected.
+            timestamp_ms (float): Capture timestamp of the frame.
+        """
+        if self.frames == self._columns['timestamps_ms'].shape[0]:
+            self._grow()
+        i = self.frames
+        columns = self._columns
+        columns['face'][i] = frame_lms.face
+        columns['hands'][i] = frame_lms.hands
+        columns['pose'][i] = frame_lms.pose
+        columns['presence'][i] = (frame_lms.face_present, frame_lms.hand_present[LEFT], frame_lms.hand_present[RIGHT], frame_lms.pose_present)
+        row = columns['metrics'][i]
+        for j, name in enumerate(METRIC_NAMES):
+            value = metrics.get(name) if (metrics and frame_lms.face_present) else None
+            row[j] = np.nan if value is None else value
+        columns['timestamps_ms'][i] = timestamp_ms
+        self.frames += 1
+
+    def compute_metrics(self, img_w, img_h):
+        """
+        Fills the metrics column of every frame with a face in one vectorized pass.
+
+        Used when frames were appended without per-frame metrics, as in offline extraction.
+
+        Args:
+            img_w (int): Width of the frames the landmarks were detected on.
+            img_h (int): Height of the frames the landmarks were detected on.
+        """
+        has_face = self._columns['presence'][:self.frames, 0]
+        if not has_face.any():
+            return
+        metrics = analyze_face_landmarks_batch(self._columns['face'][:self.frames][has_face], img_w, img_h)
+        column = self._columns['metrics']
+        for j, name in enumerate(METRIC_NAMES):
+            column[:self.frames, j][has_face] = metrics[name]
+
+    def close(self):
+        """
+        Writes the columns and the video metadata.
+
+        Returns:
+            dict: The video metadata, as stored in meta.json and in the manifest.
+        """
+        video_dir = os.path.join(self.root, VIDEOS_DIR, self.name)
+        tmp_dir = video_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for column, array in self._columns.items():
+            np.save(os.path.join(tmp_dir, column + '.npy'), array[:self.frames])
+
+        meta = {
+            'name': self.name,
+            'source': self.source,
+            'fps': self.fps,
+            'frames': self.frames,
+            'format_version': FORMAT_VERSION,
+            'metric_names': list(METRIC_NAMES),
+            'presence_fields': list(PRESENCE_FIELDS),
+            'columns': {column: {'shape': [self.frames, *shape], 'dtype': np.dtype(dtype).str} for column, (shape, dtype) in COLUMNS.items()},
+        }
+        _write_json(os.path.join(tmp_dir, META_FILE), meta)
+
+        shutil.rmtree(video_dir, ignore_errors=True)
+        os.replace(tmp_dir, video_dir)
+        return meta
+
+class VideoLandmarks:
+    """
+    Memory-mapped, read-only view of one video of a LandmarkDataset.
+
+    Columns are mapped on first access; slicing them reads only the touched pages.
+
+    Attributes:
+        meta (dict): The video metadata.
+        frames (int): Number of frames.
+
+    Example:
+        >>> video = dataset.open('Anne')
+        >>> video.column('hands')[100:200, LEFT]    # (100, 21, 3) view, nothing copied
+    """
+
+    def __init__(self, video_dir, meta):
+        self.video_dir = video_dir
+        self.meta = meta
+        self.frames = meta['frames']
+        self._mapped = {}
+
+    def column(self, column):
+        """
+        Returns the whole column as a read-only memory map.
+        """
+        array = self._mapped.get(column)
+        if array is None:
+            array = self._mapped[column] = np.load(os.path.join(self.video_dir, column + '.npy'), mmap_mode='r')
+        return array
+
+    def slice(self, start=0, stop=None, columns=None):
+        """
+        Returns a frame range of several columns as zero-copy views.
+
+        Args:
+            start (int, optional): First frame. Default is 0.
+            stop (int, optional): End frame (exclusive). Defaults to the end of the video.
+            columns (list of str, optional): Columns to return. Defaults to all of COLUMNS.
+
+        Returns:
+            dict: Column name mapped to its (stop - start, ...) view.
+        """
+        return {column: self.column(column)[start:stop] for column in (columns or COLUMNS)}
+
+    def metric(self, name):
+        """
+        Returns one face metric over all frames, e.g. video.metric('nod').
+        """
+        return self.column('metrics')[:, self.meta['metric_names'].index(name)]
+
+class LandmarkDataset:
+    """
+    A folder of extracted videos with a manifest index.
+
+    Only one process should update the manifest; workers write their video folders with
+    VideoLandmarksWriter and hand the returned metadata to `add()`.
+
+    Args:
+        root (str): Dataset root folder; created if missing.
+
+    Example:
+        >>> dataset = LandmarkDataset('landmarks')
+        >>> for name in dataset.names():
+        >>>     pose = dataset.open(name).slice(0, 50, ['pose'])['pose']
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, VIDEOS_DIR), exist_ok=True)
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'format_version': FORMAT_VERSION, 'videos': {}}
+
+    def names(self):
+        return sorted(self.manifest['videos'])
+
+    def __contains__(self, name):
+        return name in self.manifest['videos']
+
+    def __len__(self):
+        return len(self.manifest['videos'])
+
+    def add(self, meta, save=True):
+        """
+        Records a written video in the manifest.
+
+        Args:
+            meta (dict): Metadata returned by VideoLandmarksWriter.close().
+            save (bool, optional): Write the manifest right away. Default is True.
+        """
+        self.manifest['videos'][meta['name']] = {key: meta[key] for key in ('source', 'fps', 'frames')}
+        if save:
+            self.save()
+
+    def save(self):
+        _write_json(self.manifest_path, self.manifest)
+
+    def open(self, name):
+        """
+        Opens one video for reading.
+
+        Raises:
+            KeyError: If the video is not in the manifest.
+        """
+        if name not in self.manifest['videos']:
+            raise KeyError(f"{name} is not in the dataset at {self.root}")
+        video_dir = os.path.join(self.root, VIDEOS_DIR, name)
+        with open(os.path.join(video_dir, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        return VideoLandmarks(video_dir, meta)
+
+    def rebuild_manifest(self):
+        """
+        Rebuilds the manifest from the video folders, e.g. after an interrupted run.
+
+        Returns:
+            int: Number of videos found.
+        """
+        videos_dir = os.path.join(self.root, VIDEOS_DIR)
+        self.manifest['videos'] = {}
+        for name in sorted(os.listdir(videos_dir)):
+            if name.endswith('.tmp'):
+                continue
+            meta_path = os.path.join(videos_dir, name, META_FILE)
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    self.add(json.load(f), save=False)
+        self.save()
+        return len(self.manifest['videos'])
@@ -97,7 +97,7 @@ hand_constants_names = [
     "INDEX_FINGER_MCP", "INDEX_FINGER_PIP", "INDEX_FINGER_DIP", "INDEX_FINGER_TIP",
     "MIDDLE_FINGER_MCP", "MIDDLE_FINGER_PIP", "MIDDLE_FINGER_DIP", "MIDDLE_FINGER_TIP",
     "RING_FINGER_MCP", "RING_FINGER_PIP", "RING_FINGER_DIP", "RING_FINGER_TIP",
-    "PINKY_MCP," "PINKY_PIP", "PINKY_DIP", "PINKY_TIP"
+    "PINKY_MCP", "PINKY_PIP", "PINKY_DIP", "PINKY_TIP"
 ]
 
 face_constants = [
@@ -1,115 +1,480 @@
 import mediapipe as mp
-from calculations import analyze_face_landmarks
-import lm_indices as ids
-import gloabal_vars as G_var
+from calculations import analyze_face_landmarks, FaceState, HeadPoseSolver
 import json # for messages
-import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import websocket_util
 from test_hand import classify_hands_with_hand_lanmarks
-from util import parse_landmarks_data_with_regex,extract_coordinates_with_max_possible,draw_circle_on_coord
+from model_config import MODEL_CONFIG
+from landmark_codec import LandmarkEncoder
+from roi import FACE, HANDS, RoiTracker, crop, map_landmarks_to_frame
+from rate_scheduler import RateScheduler
+from motion_gate import MotionGate
+from renderer import OverlayRenderer
+from instrumentation import now, registry as metrics
+from landmark_arrays import FrameLandmarks, HAND_LABELS, LEFT, RIGHT, fill_face, fill_hand, fill_pose, hands_to_payload
 
 # Initialize MediaPipe Hand module
-mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 mp_hands = mp.solutions.hands
 mp_face = mp.solutions.face_mesh
-face_mesh = mp_face.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True, min_detection_confidence=0.5, min_tracking_confidence=0.5)
-pose = mp_pose.Pose(static_image_mode=False, min_detection_confidence=0.5, min_tracking_confidence=0.5)
-hands = mp_hands.Hands(static_image_mode=False, max_num_hands=2, min_detection_confidence=0.5, min_tracking_confidence=0.5)
 
-# Initialize MediaPipe drawing module
+class StreamSession:
+    """
+    Everything one video stream needs: its own model instances, metric state and output buffer.
+
+    MediaPipe graphs track landmarks from frame to frame, and the head pose solver and face
+    metrics carry state too, so every camera or video gets its own session. Several sessions can
+    run in one process without cross-talk; the module import is paid once per process.
+    A session must not be used by two threads at the same time.
+
+    Args:
+        model_config (dict, optional): Settings of the three solutions. Defaults to model_config.MODEL_CONFIG.
+        stream_id (str, optional): Identifies the stream; added to JSON messages as 'stream_id' when set.
+        stream_index (int, optional): Stream number in the header of binary messages (see landmark_codec).
+            Give every stream sharing a publisher its own number. Default is 0.
+        publisher (WebSocketPublisher, optional): Where messages go. Defaults to the process-wide publisher.
+        roi (bool, optional): Run face mesh and hands on crops found from the pose (see `set_roi`).
+            Defaults to the 'roi' 'enabled' setting of the model config.
+        rates (dict, optional): Run each model only every n-th frame, e.g. {'face': 2, 'pose': 3, 'hands': 1},
+            and extrapolate the skipped frames (see `set_rates`). Default is None (every model on every frame).
+        motion_gate (bool or dict, optional): Reuse the previous results while the frame does not change
+            (see `set_motion_gate`). Default is None (no gate).
+        overlay (str, optional): What `draw` puts on output frames: 'none', 'keypoints' or 'full'
+            (see renderer.OverlayRenderer). Default is 'full'.
+
+    Attributes:
+        frame_landmarks (FrameLandmarks): Landmark arrays of the last processed frame.
+        face_state (FaceState): Face measurements of the last frame with a face.
+        metrics (dict): Face metrics of the last frame with a face.
+        data (dict): The last message dictionary built for the WebSocket server.
+
+    Example:
+        >>> session = StreamSession(stream_id="camera-1")
+        >>> output_frame = session.process(frame_rgb, frame_bgr, Send2WSS=True)
+        >>> session.close()
+    """
+
+    def __init__(self, model_config=None, stream_id=None, publisher=None, roi=None, rates=None, motion_gate=None, overlay='full', stream_index=0):
+        config = MODEL_CONFIG if model_config is None else model_config
+        self.model_config = config
+        self.stream_id = stream_id
+        self.stream_index = stream_index
+        self.publisher = publisher
+        self.face_mesh = mp_face.FaceMesh(**config['face_mesh'])
+        self.pose = mp_pose.Pose(**config['pose'])
+        self.hands = mp_hands.Hands(**config['hands'])
+        self.frame_landmarks = FrameLandmarks()
+        self.head_pose_solver = HeadPoseSolver()
+        self.face_state = FaceState()
+        self.metrics = {}
+        self.data = {}
+        self.encoders = {}
+        self.model_executor = None
+        self.roi_tracker = None
+        self.set_roi(config.get('roi', {}).get('enabled', False) if roi is None else roi)
+        self.rate_scheduler = None
+        self._due = None
+        self.set_rates(rates)
+        # Last measured results per model, returned on the frames the model skips
+        self._held = None
+        self.motion_gate = None
+        self._last_results = None
+        self.set_motion_gate(motion_gate)
+        self.renderer = OverlayRenderer(overlay)
+
+    def set_overlay(self, level):
+        """
+        Sets what `draw` puts on output frames: 'none', 'keypoints' or 'full'.
+        """
+        self.renderer = OverlayRenderer(level)
+
+    def set_motion_gate(self, motion_gate):
+        """
+        Skips the models on frames where nothing moved.
+
+        Args:
+            motion_gate (bool or dict): True for a MotionGate with default settings, a dict of
+                MotionGate arguments (e.g. {'threshold': 2.0, 'max_reuse': 15}), or None/False to
+                run the models on every frame.
+        """
+        if not motion_gate:
+            self.motion_gate = None
+        else:
+            self.motion_gate = MotionGate(**(motion_gate if isinstance(motion_gate, dict) else {}))
+        self._last_results = None
+
+    def set_rates(self, rates):
+        """
+        Sets how often each model runs, or None to run every model on every frame.
+
+        Skipped frames get landmarks extrapolated from the model's last two measurements, and face
+        metrics derived from them; `frame_landmarks` flags them as synthesized and the messages carry
+        the flags (see rate_scheduler.RateScheduler).
+        """
+        self.rate_scheduler = None if rates is None else RateScheduler(rates)
+        self._held = None
+
+    def set_roi(self, enabled):
+        """
+        Turns pose-guided cropping on or off.
+
+        With cropping on, pose runs first and face mesh and hands only see padded crops around the
+        face and hands it found; their landmarks are mapped back to full-frame coordinates, so
+        everything downstream is unchanged. Regions fall back to the full frame when the pose or
+        the detection is lost (see roi.RoiTracker).
+        """
+        if not enabled:
+            self.roi_tracker = None
+        elif self.roi_tracker is None:
+            settings = {key: value for key, value in self.model_config.get('roi', {}).items() if key != 'enabled'}
+            self.roi_tracker = RoiTracker(**settings)
+
+    def close(self):
+        """
+        Releases the MediaPipe graphs and worker threads of the session.
+        """
+        for model in (self.face_mesh, self.pose, self.hands):
+            model.close()
+        if self.model_executor is not None:
+            self.model_executor.shutdown()
+            self.model_executor = None
+
+    def reset(self, stream_id=None):
+        """
+        Prepares the session for a new, unrelated stream without rebuilding the MediaPipe graphs.
+
+        The graphs restart their runs and every tracker, scheduler, gate and face measurement
+        forgets the previous stream, so no tracking state carries over from one video to the next.
+
+        Args:
+            stream_id (str, optional): Name of the new stream. Default keeps the current one.
+        """
+        for model in (self.face_mesh, self.pose, self.hands):
+            model.reset()
+        if stream_id is not None:
+            self.stream_id = stream_id
+        self.frame_landmarks.reset()
+        self.head_pose_solver.reset()
+        self.face_state = FaceState()
+        self.metrics = {}
+        self.data = {}
+        self.encoders = {}
+        if self.roi_tracker is not None:
+            self.roi_tracker.reset()
+        if self.rate_scheduler is not None:
+            self.rate_scheduler.reset()
+        self._due = None
+        self._held = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        self._last_results = None
+
+    def run_models(self, process_frame, parallel_models=False):
+        """
+        Runs face mesh, pose and hands on the same RGB frame.
+
+        Args:
+            process_frame (numpy.ndarray):
+                RGB frame to be processed. It is only read, never modified.
+            parallel_models (bool, optional):
+                Run the three solutions at the same time: face mesh and pose on a worker pool, hands on
+                the calling thread. MediaPipe releases the GIL while its graphs run, so the frame latency
+                approaches the slowest model instead of the sum. Default is False.
+
+        Returns:
+            tuple: The face mesh, pose and hands results; None for a model the rate scheduler skipped.
+        """
+        due = self.rate_scheduler.plan() if self.rate_scheduler is not None else None
+        self._due = due
+        models = (
+            self._face_mesh_process if due is None or due['face'] else None,
+            self._pose_process if due is None or due['pose'] else None,
+            self._hands_process if due is None or due['hands'] else None,
+        )
+        if self.roi_tracker is not None:
+            return self._run_models_roi(process_frame, parallel_models, models)
+
+        if not parallel_models:
+            return tuple(None if model is None else model(process_frame) for model in models)
+
+        if self.model_executor is None:
+            self.model_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="MediaPipeModel")
+        futures = [None if model is None else self.model_executor.submit(model, process_frame) for model in models[:2]]
+        hand_results = None if models[2] is None else models[2](process_frame)
+        return tuple(None if future is None else future.result() for future in futures) + (hand_results,)
+
+    # Timed model calls; each records its own stage, also when run on the worker pool
+    def _face_mesh_process(self, frame):
+        t0 = now()
+        results = self.face_mesh.process(frame)
+        metrics.record('face_mesh', t0)
+        return results
+
+    def _pose_process(self, frame):
+        t0 = now()
+        results = self.pose.process(frame)
+        metrics.record('pose', t0)
+        return results
+
+    def _hands_process(self, frame):
+        t0 = now()
+        results = self.hands.process(frame)
+        metrics.record('hands', t0)
+        return results
+
+    def _run_models_roi(self, process_frame, parallel_models, models):
+        # Pose first: its landmarks decide where the other two models look
+        face_process, pose_process, hands_process = models
+        img_h, img_w = process_frame.shape[:2]
+        if pose_process is not None:
+            pose_results = pose_process(process_frame)
+            pose_landmarks = pose_results.pose_landmarks
+        else:
+            # Skipped by the rate scheduler: the crops follow the last measured pose
+            pose_results = None
+            pose_landmarks = self._held['pose'].pose_landmarks
+        face_roi, hands_roi = self.roi_tracker.update(pose_landmarks, img_w, img_h)
+
+        results = hand_results = None
+        face_future = None
+        if face_process is not None:
+            if parallel_models and hands_process is not None:
+                if self.model_executor is None:
+                    self.model_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="MediaPipeModel")
+                face_future = self.model_executor.submit(face_process, crop(process_frame, face_roi))
+            else:
+                results = face_process(crop(process_frame, face_roi))
+        if hands_process is not None:
+            hand_results = hands_process(crop(process_frame, hands_roi))
+        if face_future is not None:
+            results = face_future.result()
+
+        if face_roi is not None and results is not None:
+            if results.multi_face_landmarks:
+                for face_landmarks in results.multi_face_landmarks:
+                    map_landmarks_to_frame(face_landmarks, face_roi, img_w, img_h)
+            else:
+                self.roi_tracker.lost(FACE)
+        if hands_roi is not None and hand_results is not None:
+            if hand_results.multi_hand_landmarks:
+                for hand_landmarks in hand_results.multi_hand_landmarks:
+                    map_landmarks_to_frame(hand_landmarks, hands_roi, img_w, img_h)
+            else:
+                self.roi_tracker.lost(HANDS)
+        return results, pose_results, hand_results
+
+    def extract_landmarks(self, process_frame, parallel_models=False, analyze_face=True, frame_size=None):
+        """
+        Runs the models on a frame and stores the results without drawing anything.
+
+        Fills `frame_landmarks` and, when a face is found, replaces `metrics` and `data` with the
+        face metrics.
+
+        Args:
+            process_frame (numpy.ndarray):
+                RGB frame to be processed.
+            parallel_models (bool, optional):
+                Run the three solutions concurrently (see `run_models`). Default is False.
+            analyze_face (bool, optional):
+                Compute the face metrics. Offline callers turn it off and compute them for a whole
+                video at once with `calculations.analyze_face_landmarks_batch`. Default is True.
+            frame_size (tuple, optional):
+                (width, height) the face metrics are measured in. Pass the source resolution when
+                the models run on a downscaled frame, so pixel metrics do not depend on the
+                inference resolution. Defaults to the size of `process_frame`.
+
+        Returns:
+            tuple:
+                The face mesh results, the pose results and a list of (hand label, hand landmarks)
+                pairs. With a rate scheduler, skipped models return their last
+                measured results; frames stopped by the motion gate return those of the last
+                processed frame and leave `frame_landmarks` and `metrics` unchanged.
+        """
+        if self.motion_gate is not None and not self.motion_gate.check(process_frame) and self._last_results is not None:
+            # Nothing moved: the landmarks, metrics and results of the last processed frame still hold
+            metrics.count('motion_gated_frames')
+            return self._last_results
+        t0 = now()
+        results = self._extract_landmarks(process_frame, parallel_models, analyze_face, frame_size)
+        metrics.record('extract', t0)
+        if self.motion_gate is not None:
+            self._last_results = results
+        return results
+
+    def _extract_landmarks(self, process_frame, parallel_models, analyze_face, frame_size):
+        # Process the frame to detect processes
+        results, pose_results, hand_results = self.run_models(process_frame, parallel_models)
+
+        if frame_size is None:
+            img_h, img_w, img_c = process_frame.shape
+        else:
+            img_w, img_h = frame_size
+        frame_lms = self.frame_landmarks
+        frame_lms.reset()
+        if results is not None and results.multi_face_landmarks:
+            for face_landmarks in results.multi_face_landmarks:
+                if face_landmarks:
+                    fill_face(frame_lms, face_landmarks)
+                    if analyze_face:
+                        t0 = now()
+                        self.metrics = analyze_face_landmarks(frame_lms.face,img_w,img_h,self.head_pose_solver,self.face_state)
+                        metrics.record('analyze_face', t0)
+                        self.data = dict(self.metrics)
+
+        if pose_results is not None and pose_results.pose_landmarks:
+            fill_pose(frame_lms, pose_results.pose_landmarks)
+
+        labelled_hands = []
+        if hand_results is not None and hand_results.multi_hand_landmarks:
+            for hand_landmarks in hand_results.multi_hand_landmarks:
+                hand_label = classify_hands_with_hand_lanmarks(hand_landmarks)
+                fill_hand(frame_lms, HAND_LABELS[hand_label], hand_landmarks)
+                labelled_hands.append((hand_label, hand_landmarks))
+
+        if self.rate_scheduler is None:
+            return results, pose_results, labelled_hands
+
+        self.rate_scheduler.update(frame_lms, self._due)
+        if results is None and frame_lms.face_present and analyze_face:
+            # Metrics of the extrapolated face
+            t0 = now()
+            self.metrics = analyze_face_landmarks(frame_lms.face,img_w,img_h,self.head_pose_solver,self.face_state)
+            metrics.record('analyze_face', t0)
+            self.data = dict(self.metrics)
+        # Skipped models return their last measured results
+        held = self._held
+        if held is None:
+            held = self._held = {}
+        if results is not None:
+            held['face'] = results
+        if pose_results is not None:
+            held['pose'] = pose_results
+        if hand_results is not None:
+            held['hands'] = labelled_hands
+        return held['face'], held['pose'], held['hands']
+
+    def draw(self, output_frame):
+        """
+        Draws the landmarks of the last frame on an output frame, in place.
+
+        The landmarks are normalized, so the output frame may have any resolution, e.g. a display
+        buffer larger than the frame the models ran on. Extrapolated landmarks of skipped models
+        are drawn like measured ones.
+
+        Returns:
+            numpy.ndarray: Output frame with landmarks drawn.
+        """
+        return self.renderer.render(output_frame, self.frame_landmarks)
+
+    def publish(self, wire_format="json"):
+        """
+        Sends the landmarks and metrics of the last frame to the WebSocket server.
+
+        Args:
+            wire_format (str, optional):
+                "json" for the keyed JSON dictionary, or "float32" / "int16" for the fixed-schema
+                binary format of `landmark_codec`. Default is "json".
+        """
+        if wire_format == "json":
+            # Add the hand landmark coordinates to the data dictionary
+            self.data.update(hands_to_payload(self.frame_landmarks))
+            if self.stream_id is not None:
+                self.data['stream_id'] = self.stream_id
+            if self.rate_scheduler is not None:
+                frame_lms = self.frame_landmarks
+                self.data['_measured'] = {
+                    'face': not frame_lms.face_synthesized,
+                    'pose': not frame_lms.pose_synthesized,
+                    'left_hand': not frame_lms.hand_synthesized[LEFT],
+                    'right_hand': not frame_lms.hand_synthesized[RIGHT],
+                }
+
+            # Prepare the JSON message with all data
+            t0 = now()
+            msg = json.dumps(self.data) # Velmi to taha dole FPS
+            metrics.record('encode', t0)
+            hello = None
+        else:
+            encoder = self.encoders.get(wire_format)
+            if encoder is None:
+                encoder = self.encoders[wire_format] = LandmarkEncoder(wire_format, self.stream_index)
+            t0 = now()
+            msg = encoder.encode(self.frame_landmarks, self.metrics)
+            metrics.record('encode', t0)
+            # Every stream keeps its own schema on the shared publisher, sent ahead of its frames
+            hello = encoder.schema_message
+
+        if self.publisher is None:
+            self.publisher = websocket_util.get_publisher()
+        if hello is not None:
+            self.publisher.set_hello(hello, key=self.stream_index)
+        # Queue data for the ws server; the publisher thread does the network I/O
+        self.publisher.publish(msg)
+
+    def process(self, process_frame, output_frame=None, Send2WSS=False, wire_format="json", parallel_models=False, frame_size=None):
+        """
+        Detects landmarks, draws them and optionally sends them; see `detect_process`.
+        """
+        self.extract_landmarks(process_frame, parallel_models, frame_size=frame_size)
+        if output_frame is not None:
+            t0 = now()
+            output_frame = self.draw(output_frame)
+            metrics.record('draw', t0)
+        if Send2WSS:
+            self.publish(wire_format)
+        return output_frame
+
+# Session behind the module-level functions, created on first use
+_default_session = None
+
+def default_session():
+    """
+    Returns the process-wide StreamSession used by `detect_process` and `extract_landmarks`.
+    """
+    global _default_session
+    if _default_session is None:
+        _default_session = StreamSession()
+    return _default_session
+
+def extract_landmarks(process_frame, parallel_models=False, analyze_face=True):
+    """
+    Runs the models on a frame of the default session without drawing anything.
+
+    See `StreamSession.extract_landmarks`; the landmarks end up in `default_session().frame_landmarks`.
+    """
+    return default_session().extract_landmarks(process_frame, parallel_models, analyze_face)
 
-def detect_process(process_frame, output_frame, Send2WSS=False):
+def detect_process(process_frame, output_frame=None, Send2WSS=False, wire_format="json", parallel_models=False, frame_size=None):
     """
     Detects and draws landmarks on the input frame.
 
-    This function processes the input frame to detect landmarks, such as facial features or hand points, 
-    and then draws these landmarks on the output frame. Optionally, the detected landmarks can be sent 
-    to a WebSocket server.
+    This function processes the input frame to detect landmarks, such as facial features or hand points,
+    and then draws these landmarks on the output frame. Optionally, the detected landmarks can be sent
+    to a WebSocket server. It uses the default session, i.e. one stream per process; create a
+    StreamSession per stream to handle several.
 
     Args:
-        process_frame (numpy.ndarray): 
+        process_frame (numpy.ndarray):
             Input frame to be processed. This frame is analyzed to detect landmarks.
-        output_frame (numpy.ndarray): 
-            Frame on which landmarks will be drawn. This is typically a copy of the input frame or 
-            a blank frame of the same dimensions.
-        Send2WSS (bool, optional): 
-            Flag indicating whether the detected landmarks should be sent to a WebSocket server. 
+        output_frame (numpy.ndarray, optional):
+            Frame on which landmarks will be drawn. It may differ in size from the input frame,
+            e.g. a full-screen render buffer while the models run on a downscaled frame. None
+            skips drawing, as in headless runs. Default is None.
+        Send2WSS (bool, optional):
+            Flag indicating whether the detected landmarks should be sent to a WebSocket server.
             Default is False.
+        wire_format (str, optional):
+            Message format used with Send2WSS: "json" for the keyed JSON dictionary, or "float32" /
+            "int16" for the fixed-schema binary format of `landmark_codec`. Default is "json".
+        parallel_models (bool, optional):
+            Run the three solutions concurrently and merge their results before analysis and
+            drawing (see `StreamSession.run_models`). Default is False.
+        frame_size (tuple, optional):
+            (width, height) of the source frame, in which the face metrics are measured.
+            Defaults to the size of `process_frame`.
 
     Returns:
-        numpy.ndarray: 
-            Output frame with landmarks drawn. This frame can be displayed or further processed.
+        numpy.ndarray:
+            Output frame with landmarks drawn, or None without an output frame.
     """
-    
-     # Process the frame to detect processes
-    results = face_mesh.process(process_frame)
-    pose_results = pose.process(process_frame)
-    hand_results = hands.process(process_frame)
-    
-    img_h, img_w, img_c = process_frame.shape
-    if results.multi_face_landmarks:
-      for face_landmarks in results.multi_face_landmarks:
-        
-        if face_landmarks:
-            
-            G_var.DATA = analyze_face_landmarks(face_landmarks,img_w,img_h)
-            
-            #Draw each face landmark
-            mp_drawing.draw_landmarks(
-                output_frame, face_landmarks, mp_face.FACEMESH_TESSELATION,landmark_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=1, circle_radius=1),connection_drawing_spec=mp_drawing.DrawingSpec(color=(63, 127, 63),thickness=1, circle_radius=1))
-
-    # Draw pose landmarks on the frame
-    if pose_results.pose_landmarks:
-        mp_drawing.draw_landmarks(
-            output_frame, pose_results.pose_landmarks, mp_pose.POSE_CONNECTIONS,landmark_drawing_spec=mp_drawing.DrawingSpec(color=(255, 127, 255), thickness=1, circle_radius=2),connection_drawing_spec=mp_drawing.DrawingSpec(color=(127, 63, 127),thickness=1, circle_radius=1))
-        
-    Left_Hand_landmarks = [None]
-    Right_Hand_landmarks = [None]
-    
-    # Draw hand landmarks on the frame
-    if hand_results.multi_hand_landmarks:
-        for hand_landmarks in hand_results.multi_hand_landmarks:
-           
-            hand_label = classify_hands_with_hand_lanmarks(hand_landmarks)
-            
-            if hand_label=="Left hand":
-                    mp_drawing.draw_landmarks(
-                        output_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS,landmark_drawing_spec=mp_drawing.DrawingSpec(color=(255, 0, 0), thickness=1, circle_radius=1),connection_drawing_spec=mp_drawing.DrawingSpec(color=(127, 63, 63),thickness=1, circle_radius=1))
-                    Left_Hand_landmarks = parse_landmarks_data_with_regex([f"{hand_landmarks}"])
-                    
-            elif hand_label=="Right hand":
-                    mp_drawing.draw_landmarks(
-                        output_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS,landmark_drawing_spec=mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=1, circle_radius=1),connection_drawing_spec=mp_drawing.DrawingSpec(color=(63, 63, 127),thickness=1, circle_radius=1))
-                    Right_Hand_landmarks = parse_landmarks_data_with_regex([f"{hand_landmarks}"])
-    
-    Left_Hands_landmark_coordinates = extract_coordinates_with_max_possible(Left_Hand_landmarks)
-    Right_Hands_landmark_coordinates = extract_coordinates_with_max_possible(Right_Hand_landmarks)
-    output_frame = draw_circle_on_coord(output_frame,Left_Hands_landmark_coordinates,COLOR_DOTS=(255, 0, 0))
-    output_frame = draw_circle_on_coord(output_frame,Right_Hands_landmark_coordinates,COLOR_DOTS=(0, 0, 255))
-    
-    if Send2WSS:
-        landmark_coordinates = {}
-        len_hand_constants_names = len(ids.hand_constants_names)-1
-        # Iterate over all possible landmarks
-        for landmark_id in ids.hand_constants:
-            # Check if the landmark is available for left hands
-            landmark_coordinates[f"Left_Hand_{ids.hand_constants_names[min(landmark_id,len_hand_constants_names)]}_Pose"] = Left_Hands_landmark_coordinates[landmark_id] if landmark_id < len(Left_Hands_landmark_coordinates) else None
-
-        for landmark_id in ids.hand_constants:
-            # Check if the landmark is available for right hands
-            landmark_coordinates[f"Right_Hand_{ids.hand_constants_names[min(landmark_id,len_hand_constants_names)]}_Pose"] = Right_Hands_landmark_coordinates[landmark_id] if landmark_id < len(Right_Hands_landmark_coordinates) else None
-
-        # Add the landmark coordinates to the data dictionary
-        G_var.DATA.update(landmark_coordinates)
-
-        # Prepare the JSON message with all data
-        msg = json.dumps(G_var.DATA) # Velmi to taha dole FPS
-
-        # Send data to ws server
-        try:
-          asyncio.run(websocket_util.send(msg))
-        except ConnectionRefusedError:
-          print('WS Server is down')
-                
-    return output_frame
\ No newline at end of file
+    return default_session().process(process_frame, output_frame, Send2WSS, wire_format, parallel_models, frame_size)
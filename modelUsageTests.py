@@ -1,62 +1,219 @@
+import os
 import cv2
-from util import get_video_name, resize_to_fullscreen
-from mediapipe_util import detect_process
-import time
+from hls_source import is_playlist, open_capture
+from instrumentation import now, registry as metrics
+from util import get_video_name, resize_to_fullscreen, resize_to_inference
+from mediapipe_util import default_session, detect_process
+from pipeline import FramePipeline
+from realtime_scheduler import RealtimeScheduler
 
-def useMediaPipe(video_path = 'test_media/video.mp4',screen_width = 1920, screen_height = 1000, Send2WSS=False):
+def useMediaPipe(video_path = 'test_media/video.mp4',screen_width = 1920, screen_height = 1000, Send2WSS=False, wire_format="json", pipelined=False, drop_policy="drop_oldest", queue_size=4, parallel_models=False, inference_size=None, headless=False, roi=None, rates=None, motion_gate=None, max_latency_ms=100, metrics_port=None, metrics_interval=None, overlay='full'):
     """
     Process a video using MediaPipe to detect and annotate poses, hands, and face landmarks.
 
     Args:
-        video_path (str): Path to the input video file.
+        video_path (str): Path or URL of the input video, or an HLS playlist (.m3u8 path or URL) decoded in memory (see hls_source).
         screen_width (int): Width of the screen for displaying the video.
         screen_height (int): Height of the screen for displaying the video.
         Send2WSS (bool): Whether to send the processed data to a WebSocket server.
+        wire_format (str): WebSocket message format, "json", "float32" or "int16".
+        pipelined (bool): Run decoding, inference and display as overlapping stages on separate threads.
+        drop_policy (str): With `pipelined`, what to do when inference falls behind:
+            "block", "drop_oldest" or "drop_newest" (see pipeline.DROP_POLICIES).
+        queue_size (int): With `pipelined`, capacity of each stage queue.
+        parallel_models (bool): Run face mesh, pose and hands concurrently on each frame.
+        inference_size (int or tuple): Resolution the models run at, as the longest side or a
+            (width, height) box (see util.resize_to_inference). None runs them on the source frame.
+            The landmarks are drawn on the full-screen frame either way.
+        headless (bool): Do not display anything; the frames are neither resized for the screen nor drawn on.
+            Only a local video file shown in a window starts over at its end; headless runs, playlists
+            and streams stop there.
+        roi (bool): Run face mesh and hands only on crops around the face and hands found by the pose
+            model. None keeps the 'roi' setting of model_config.
+        rates (dict): Run each model only every n-th frame, e.g. {'face': 2, 'pose': 3, 'hands': 1};
+            skipped frames get extrapolated landmarks (see rate_scheduler). None runs every model on every frame.
+        motion_gate (bool or dict): Reuse the previous results while nothing moves, optionally with
+            MotionGate settings such as {'threshold': 2.0, 'max_reuse': 15} (see motion_gate).
+        max_latency_ms (float): Target bound on how late a frame is shown relative to its capture
+            timestamp; frames that cannot make it are dropped before decoding (see realtime_scheduler).
+        metrics_port (int): Serve the per-stage timings, rates and counters on
+            http://127.0.0.1:<metrics_port>/metrics (see instrumentation). Set MEDIAPIPE_METRICS=0
+            to turn the instrumentation off.
+        metrics_interval (float): Print the metrics table every `metrics_interval` seconds.
+        overlay (str): Landmarks drawn on the displayed frames: 'none', 'keypoints' or 'full'
+            (see renderer.OverlayRenderer). Headless runs draw nothing.
 
     Returns:
         None
     """
-    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_time = 1 / fps
+    if roi is not None:
+        default_session().set_roi(roi)
+    if rates is not None:
+        default_session().set_rates(rates)
+    if motion_gate is not None:
+        default_session().set_motion_gate(motion_gate)
+    default_session().set_overlay('none' if headless else overlay)
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    if metrics_interval:
+        stop_dump = metrics.dump_periodically(metrics_interval)
+
+    cap = open_capture(video_path)
 
     # Get video name without extension
     video_name = get_video_name(video_path)
+    # Without a window nobody can press 'q', and streams cannot seek back to the start
+    rewind = not headless and isinstance(video_path, str) and os.path.isfile(video_path) and not is_playlist(video_path)
+
+    if pipelined:
+        runPipelined(cap, video_name, screen_width, screen_height, Send2WSS, wire_format, drop_policy, queue_size, parallel_models, inference_size, headless, rewind)
+        if metrics_interval:
+            stop_dump.set()
+        return
+
+    scheduler = RealtimeScheduler(cap, max_latency_ms)
+    # Display frames are resized into the same buffer every time; imshow keeps its own copy
+    display_buffer = None
+    # Frames read since the start or the last rewind; a pass without any means the rewind failed
+    frames_read = 0
 
     while True:
-        start_time = time.time()
-        success, frame = cap.read()
+        t0 = now()
+        success, frame, timestamp_ms = scheduler.read()
+        metrics.record('decode', t0)
         if not success:
-            # If the video has ended, reset to the beginning
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
+            if rewind and frames_read > 0 and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                # If the video has ended, reset to the beginning and restart the media clock
+                scheduler.reset()
+                frames_read = 0
+                continue
+            break
+        frames_read += 1
 
-        # Resize the frame to fullscreen while maintaining aspect ratio
-        frame_resized = resize_to_fullscreen(frame, screen_width, screen_height)
+        # The models run on the source frame, or a downscaled copy of it
+        t0 = now()
+        frame_small = resize_to_inference(frame, inference_size)
+        metrics.record('resize', t0)
+        t0 = now()
+        frame_rgb = cv2.cvtColor(frame_small, cv2.COLOR_BGR2RGB)
+        metrics.record('convert', t0)
+        # Face metrics are measured in source pixels whatever the inference resolution
+        frame_size = (frame.shape[1], frame.shape[0])
 
-        # Convert the frame to RGB
-        frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
+        if headless:
+            t0 = now()
+            detect_process(frame_rgb,None,Send2WSS,wire_format,parallel_models,frame_size)
+            metrics.record('detect_process', t0)
+        else:
+            # Resize the frame to fullscreen while maintaining aspect ratio
+            t0 = now()
+            frame_resized = display_buffer = resize_to_fullscreen(frame, screen_width, screen_height, display_buffer)
+            metrics.record('display_resize', t0)
 
-        frame_resized = detect_process(frame_rgb,frame_resized,Send2WSS)
+            t0 = now()
+            frame_resized = detect_process(frame_rgb,frame_resized,Send2WSS,wire_format,parallel_models,frame_size)
+            metrics.record('detect_process', t0)
 
-        cv2.putText(frame_resized, video_name, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-        # Display the frame
-        cv2.imshow('Pose and Hand and Face Blendshapes Landmarks', frame_resized)
-        
-        elapsed_time = time.time() - start_time
-        if elapsed_time < frame_time:
-            sleep_time = frame_time - elapsed_time
-            time.sleep(sleep_time)
-        else:
-            # Skip frames if processing is slower than real-time
-            while elapsed_time > frame_time:
-                cap.grab()  # Grab the next frame without decoding
-                elapsed_time -= frame_time
+            t0 = now()
+            cv2.putText(frame_resized, video_name, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+            # Display the frame
+            cv2.imshow('Pose and Hand and Face Blendshapes Landmarks', frame_resized)
+            metrics.record('display', t0)
+
+        # Wait until the frame is due; the display window is served while waiting
+        key = scheduler.present(timestamp_ms, wait_key=not headless)
+        metrics.tick('frames')
+        metrics.gauge('scheduler_dropped', scheduler.dropped)
+        metrics.gauge('scheduler_late', scheduler.late)
 
         # Break the loop on 'q' key press
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if key == ord('q'):
             break
 
+    print(scheduler.summary())
+    if metrics_interval:
+        stop_dump.set()
+    if metrics.enabled:
+        print(metrics.render_table())
+
+    gate = default_session().motion_gate
+    if gate is not None:
+        print(f"Motion gate reused results on {gate.gated} frames ({gate.gated_fraction:.0%})")
+
+    # Release the capture and destroy all windows
+    cap.release()
+    cv2.destroyAllWindows()
+
+def runPipelined(cap, video_name, screen_width, screen_height, Send2WSS, wire_format, drop_policy, queue_size, parallel_models=False, inference_size=None, headless=False, rewind=False):
+    """
+    Pipelined variant of the useMediaPipe loop.
+
+    A decoder thread reads and paces frames, an inference thread resizes, converts and runs
+    detect_process, and this thread draws the title and displays the result. Headless runs only
+    drain the processed frames.
+
+    Args:
+        cap (cv2.VideoCapture): The opened video.
+        video_name (str): Name drawn on the frames.
+        screen_width (int): Width of the screen for displaying the video.
+        screen_height (int): Height of the screen for displaying the video.
+        Send2WSS (bool): Whether to send the processed data to a WebSocket server.
+        wire_format (str): WebSocket message format.
+        drop_policy (str): Drop policy of the decoder -> inference queue.
+        queue_size (int): Capacity of each stage queue.
+        parallel_models (bool): Run face mesh, pose and hands concurrently on each frame.
+        inference_size (int or tuple): Resolution the models run at; None runs them on the source frame.
+        headless (bool): Do not display anything.
+        rewind (bool): Start the video over when it ends instead of stopping.
+
+    Returns:
+        None
+    """
+    def infer(packet):
+        frame = packet.frame
+        t0 = now()
+        frame_small = resize_to_inference(frame, inference_size)
+        metrics.record('resize', t0)
+        t0 = now()
+        frame_rgb = cv2.cvtColor(frame_small, cv2.COLOR_BGR2RGB)
+        metrics.record('convert', t0)
+        frame_size = (frame.shape[1], frame.shape[0])
+        if headless:
+            t0 = now()
+            detect_process(frame_rgb,None,Send2WSS,wire_format,parallel_models,frame_size)
+            metrics.record('detect_process', t0)
+            return
+        # Resize the frame to fullscreen while maintaining aspect ratio
+        t0 = now()
+        frame_resized = resize_to_fullscreen(frame, screen_width, screen_height)
+        metrics.record('display_resize', t0)
+        t0 = now()
+        packet.frame = detect_process(frame_rgb,frame_resized,Send2WSS,wire_format,parallel_models,frame_size)
+        metrics.record('detect_process', t0)
+
+    pipeline = FramePipeline(cap, infer, queue_size=queue_size, drop_policy=drop_policy, realtime=True, loop=rewind)
+    try:
+        for packet in pipeline:
+            if headless:
+                continue
+            t0 = now()
+            cv2.putText(packet.frame, video_name, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+            # Display the frame
+            cv2.imshow('Pose and Hand and Face Blendshapes Landmarks', packet.frame)
+            metrics.record('display', t0)
+
+            # Break the loop on 'q' key press
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        pipeline.stop()
+        print(f"Decoded {pipeline.decoded} frames, processed {pipeline.processed}, dropped {pipeline.dropped}")
+        if metrics.enabled:
+            print(metrics.render_table())
+        gate = default_session().motion_gate
+        if gate is not None:
+            print(f"Motion gate reused results on {gate.gated} frames ({gate.gated_fraction:.0%})")
+
     # Release the capture and destroy all windows
     cap.release()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    cv2.destroyAllWindows()
@@ -0,0 +1,32 @@
+# Settings of the three MediaPipe solutions.
+# Kept apart from mediapipe_util so they can be read (e.g. for cache keys) without loading any model.
+MODEL_CONFIG = {
+    'face_mesh': {
+        'static_image_mode': False,
+        'max_num_faces': 1,
+        'refine_landmarks': True,
+        'min_detection_confidence': 0.5,
+        'min_tracking_confidence': 0.5,
+    },
+    'pose': {
+        'static_image_mode': False,
+        'min_detection_confidence': 0.5,
+        'min_tracking_confidence': 0.5,
+    },
+    'hands': {
+        'static_image_mode': False,
+        'max_num_hands': 2,
+        'min_detection_confidence': 0.5,
+        'min_tracking_confidence': 0.5,
+    },
+    # Pose-guided crops for the face mesh and hands models (see roi.RoiTracker)
+    'roi': {
+        'enabled': False,
+        'face_padding': 2.0,
+        'hand_padding': 0.6,
+        'hysteresis': 0.15,
+        'min_size': 96,
+        'min_visibility': 0.5,
+        'max_area_fraction': 0.7,
+    },
+}
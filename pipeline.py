@@ -0,0 +1,225 @@
+import queue
+import threading
+import time
+import cv2
+from instrumentation import now, registry as metrics
+
+# What the decoder does when the inference stage falls behind and its queue is full
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# Marks the end of the stream in a stage queue
+_END = object()
+
+class FramePacket:
+    """
+    One frame travelling through the pipeline.
+
+    Attributes:
+        index (int): Position of the frame in decode order.
+        timestamp_ms (float): Capture timestamp (`CAP_PROP_POS_MSEC`) of the frame.
+        frame (numpy.ndarray): The BGR frame; stages may replace it with their output.
+        result: Free slot for stage results.
+    """
+    __slots__ = ("index", "timestamp_ms", "frame", "result")
+
+    def __init__(self, index, timestamp_ms, frame):
+        self.index = index
+        self.timestamp_ms = timestamp_ms
+        self.frame = frame
+        self.result = None
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages with a configurable drop policy.
+
+    Args:
+        maxsize (int): Number of packets the queue holds.
+        drop_policy (str): "block" waits for space, "drop_oldest" discards the oldest queued packet,
+            "drop_newest" discards the packet being put.
+
+    Attributes:
+        dropped (int): Packets discarded by the drop policy.
+    """
+
+    def __init__(self, maxsize, drop_policy="block"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {drop_policy!r}, expected one of {DROP_POLICIES}")
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, packet, stop_event=None):
+        """
+        Puts a packet, applying the drop policy when the queue is full.
+
+        Returns:
+            bool: False if the packet was discarded or the pipeline stopped while waiting.
+        """
+        if self.drop_policy == "block" or packet is _END:
+            while True:
+                try:
+                    self._queue.put(packet, timeout=0.1)
+                    return True
+                except queue.Full:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+        try:
+            self._queue.put_nowait(packet)
+            return True
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.drop_policy == "drop_newest":
+            return False
+        # drop_oldest: this is the only producer, so after one get there is room
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put_nowait(packet)
+        return True
+
+    def get(self, stop_event=None):
+        """
+        Takes the next packet, or _END once the stream is over or the pipeline stopped.
+        """
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if stop_event is not None and stop_event.is_set():
+                    return _END
+
+    def qsize(self):
+        return self._queue.qsize()
+
+class FramePipeline:
+    """
+    Runs decoding and inference on their own threads, joined by bounded queues.
+
+    The decoder thread reads frames from the capture, the inference thread calls `process` on
+    each packet, and the caller consumes the processed packets by iterating over the pipeline,
+    which makes the caller's loop the render/output stage. Every stage is a single thread reading
+    a FIFO queue, so packets come out in decode order with their capture timestamps intact.
+
+    Args:
+        cap (cv2.VideoCapture): The opened video source.
+        process (callable): Called with each FramePacket on the inference thread; may modify it in place.
+        queue_size (int, optional): Capacity of each stage queue. Default is 4.
+        drop_policy (str, optional): Policy of the decoder -> inference queue, one of DROP_POLICIES.
+            The inference -> output queue always blocks so processed frames are never lost. Default is "block".
+        realtime (bool, optional): Pace the decoder on the capture timestamps, as for playback. Default is True.
+        loop (bool, optional): Restart the video from the beginning when it ends. Stops instead when
+            the capture cannot seek back, or a rewind yields no frame. Default is False.
+
+    Attributes:
+        decoded (int): Frames read from the capture.
+        processed (int): Frames that went through `process`.
+
+    Example:
+        >>> pipeline = FramePipeline(cap, infer, drop_policy="drop_oldest")
+        >>> for packet in pipeline:
+        >>>     cv2.imshow('Output', packet.frame)
+        >>> pipeline.stop()
+    """
+
+    def __init__(self, cap, process, queue_size=4, drop_policy="block", realtime=True, loop=False):
+        self.cap = cap
+        self.process = process
+        self.realtime = realtime
+        self.loop = loop
+        self.decoded = 0
+        self.processed = 0
+        self.error = None
+        self._inference_queue = StageQueue(queue_size, drop_policy)
+        self._output_queue = StageQueue(queue_size, "block")
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._decode_stage, name="PipelineDecode", daemon=True),
+            threading.Thread(target=self._inference_stage, name="PipelineInference", daemon=True),
+        ]
+        self._started = False
+
+    @property
+    def dropped(self):
+        """Frames discarded because inference fell behind."""
+        return self._inference_queue.dropped
+
+    def start(self):
+        if not self._started:
+            self._started = True
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops both worker threads and waits for them to finish.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    def __iter__(self):
+        self.start()
+        while True:
+            packet = self._output_queue.get(self._stop)
+            if packet is _END:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield packet
+
+    def _decode_stage(self):
+        index = 0
+        # Frames read since the start or the last rewind; a pass without any means the rewind failed
+        pass_frames = 0
+        clock_start = None
+        first_timestamp_ms = 0.0
+        try:
+            while not self._stop.is_set():
+                t0 = now()
+                success, frame = self.cap.read()
+                metrics.record('decode', t0)
+                if not success:
+                    if self.loop and pass_frames > 0 and self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                        # If the video has ended, reset to the beginning and restart the media clock
+                        clock_start = None
+                        pass_frames = 0
+                        continue
+                    break
+                pass_frames += 1
+                timestamp_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+                if self.realtime:
+                    if clock_start is None:
+                        clock_start = time.perf_counter()
+                        first_timestamp_ms = timestamp_ms
+                    delay = clock_start + (timestamp_ms - first_timestamp_ms) / 1000 - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.decoded += 1
+                self._inference_queue.put(FramePacket(index, timestamp_ms, frame), self._stop)
+                index += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self._inference_queue.put(_END, self._stop)
+
+    def _inference_stage(self):
+        try:
+            while True:
+                packet = self._inference_queue.get(self._stop)
+                if packet is _END:
+                    break
+                metrics.gauge('inference_queue_depth', self._inference_queue.qsize())
+                self.process(packet)
+                self.processed += 1
+                metrics.tick('frames')
+                metrics.gauge('pipeline_dropped', self._inference_queue.dropped)
+                self._output_queue.put(packet, self._stop)
+        except Exception as e:
+            self.error = e
+            self._stop.set()
+        finally:
+            self._output_queue.put(_END, self._stop)
@@ -0,0 +1,206 @@
+import numpy as np
+from landmark_arrays import NUM_HANDS, NUM_HAND_LANDMARKS, NUM_POSE_LANDMARKS, NUM_FACE_LANDMARKS
+
+MODELS = ('face', 'pose', 'hands')
+
+# Hands every frame, face every 2nd, pose every 3rd
+DEFAULT_PERIODS = {'face': 2, 'pose': 3, 'hands': 1}
+
+class LandmarkTrack:
+    """
+    The last two measurements of one model, for extrapolating the frames it skips.
+
+    Landmarks are stored per slot (one face, one pose, two hands). A slot is extrapolated
+    linearly from its last two measurements when both saw it, held at its last value when only
+    the latest did, and absent otherwise. Time is counted in frames.
+
+    Args:
+        shape (tuple): Shape of the landmark array, slots first, e.g. (2, 21, 3) for the hands.
+        max_steps (int, optional): Frames past the last measurement that are extrapolated; later
+            frames hold the last extrapolated value. Default is 1.
+    """
+
+    def __init__(self, shape, max_steps=1):
+        self.max_steps = max_steps
+        self._values = np.zeros((2, *shape), dtype=np.float32)
+        self._present = np.zeros((2, shape[0]), dtype=bool)
+        self._frames = [None, None]
+        self._velocity = np.zeros(shape, dtype=np.float32)
+
+    def push(self, frame_index, values, present):
+        """
+        Records a measurement.
+
+        Args:
+            frame_index (int): Frame the measurement belongs to.
+            values (numpy.ndarray): Landmark array of the frame.
+            present (numpy.ndarray): (slots,) bool, which slots were detected.
+        """
+        self._values[0] = self._values[1]
+        self._present[0] = self._present[1]
+        self._frames[0] = self._frames[1]
+        self._values[1] = values
+        self._present[1] = present
+        self._frames[1] = frame_index
+        if self._frames[0] is not None:
+            # Per-frame change, zero for slots missing from either measurement
+            np.subtract(self._values[1], self._values[0], out=self._velocity)
+            self._velocity /= self._frames[1] - self._frames[0]
+            self._velocity[~(self._present[0] & self._present[1])] = 0
+
+    def predict(self, frame_index, out, present_out):
+        """
+        Writes the landmarks expected at a frame without a measurement.
+
+        Args:
+            frame_index (int): The skipped frame.
+            out (numpy.ndarray): Destination landmark array.
+            present_out (numpy.ndarray): (slots,) bool destination of the slot presence.
+        """
+        if self._frames[1] is None:
+            out[:] = 0
+            present_out[:] = False
+            return
+        steps = min(frame_index - self._frames[1], self.max_steps)
+        np.multiply(self._velocity, steps, out=out)
+        out += self._values[1]
+        present_out[:] = self._present[1]
+        out[~self._present[1]] = 0
+
+class RateScheduler:
+    """
+    Runs each model at its own rate and synthesizes the landmarks of the frames it skips.
+
+    Fingers move much faster than the head or the body in sign language, so the hands can run
+    every frame while face mesh and pose run every few frames. On a skipped frame a model's
+    landmarks are extrapolated from its last two measurements (see LandmarkTrack) and the
+    FrameLandmarks marks them as synthesized. Phases are staggered so the slow models do not
+    land on the same frame; every model runs on the first frame.
+
+    Args:
+        periods (dict, optional): Model name ('face', 'pose', 'hands') mapped to "run every n-th
+            frame". Missing models run every frame. Defaults to DEFAULT_PERIODS.
+        max_extrapolation (float, optional): How far past a model's last measurement its landmarks are
+            extrapolated, in multiples of its period; later frames hold the value. Default is 1.0.
+
+    Attributes:
+        runs (dict): Frames each model ran on.
+        skips (dict): Frames each model was skipped on.
+
+    Example:
+        >>> scheduler = RateScheduler({'face': 2, 'pose': 3, 'hands': 1})
+        >>> due = scheduler.plan()
+        >>> ...  # run the due models and fill frame_lms with their results
+        >>> scheduler.update(frame_lms, due)
+    """
+
+    def __init__(self, periods=None, max_extrapolation=1.0):
+        periods = DEFAULT_PERIODS if periods is None else periods
+        self.periods = {model: max(1, int(periods.get(model, 1))) for model in MODELS}
+        self.max_extrapolation = max_extrapolation
+        self.runs = dict.fromkeys(MODELS, 0)
+        self.skips = dict.fromkeys(MODELS, 0)
+        self._face_present = np.zeros(1, dtype=bool)
+        self._pose_present = np.zeros(1, dtype=bool)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the measurements, e.g. when the stream jumps; the next frame runs every model.
+        """
+        self.frame_index = -1
+        self._tracks = {
+            'face': LandmarkTrack((1, NUM_FACE_LANDMARKS, 3), self._max_steps('face')),
+            'pose': LandmarkTrack((1, NUM_POSE_LANDMARKS, 4), self._max_steps('pose')),
+            'hands': LandmarkTrack((NUM_HANDS, NUM_HAND_LANDMARKS, 3), self._max_steps('hands')),
+        }
+
+    def _max_steps(self, model):
+        return max(1, int(round(self.max_extrapolation * self.periods[model])))
+
+    def plan(self):
+        """
+        Advances to the next frame and decides which models run on it.
+
+        Returns:
+            dict: Model name mapped to True when it runs on this frame.
+        """
+        self.frame_index += 1
+        due = {}
+        for offset, model in enumerate(MODELS):
+            period = self.periods[model]
+            due[model] = self.frame_index == 0 or (self.frame_index - offset) % period == 0
+            if due[model]:
+                self.runs[model] += 1
+            else:
+                self.skips[model] += 1
+        return due
+
+    def update(self, frame_lms, due):
+        """
+        Records the measured landmarks of the frame and synthesizes the skipped ones, in place.
+
+        Args:
+            frame_lms (FrameLandmarks): Landmarks of the frame; only the slots of models that ran are filled.
+            due (dict): The plan returned by `plan()` for this frame.
+        """
+        frame_index = self.frame_index
+        face = frame_lms.face[None]
+        pose = frame_lms.pose[None]
+        if due['face']:
+            self._face_present[0] = frame_lms.face_present
+            self._tracks['face'].push(frame_index, face, self._face_present)
+        else:
+            self._tracks['face'].predict(frame_index, face, self._face_present)
+            frame_lms.face_present = frame_lms.face_synthesized = bool(self._face_present[0])
+
+        if due['pose']:
+            self._pose_present[0] = frame_lms.pose_present
+            self._tracks['pose'].push(frame_index, pose, self._pose_present)
+        else:
+            self._tracks['pose'].predict(frame_index, pose, self._pose_present)
+            frame_lms.pose_present = frame_lms.pose_synthesized = bool(self._pose_present[0])
+
+        if due['hands']:
+            self._tracks['hands'].push(frame_index, frame_lms.hands, frame_lms.hand_present)
+        else:
+            self._tracks['hands'].predict(frame_index, frame_lms.hands, frame_lms.hand_present)
+            frame_lms.hand_synthesized[:] = frame_lms.hand_present
+
+def interpolate_missing(values, measured):
+    """
+    Fills unmeasured frames of a landmark sequence by linear interpolation, for offline use.
+
+    Frames between two measured frames are interpolated; frames before the first or after the
+    last measured frame take its value. Unlike the live extrapolation this can look ahead,
+    so it is the better choice when a whole recording is available.
+
+    Args:
+        values (numpy.ndarray): (N, ...) landmark or metric sequence, frames first.
+        measured (numpy.ndarray): (N,) bool, frames whose values were measured.
+
+    Returns:
+        numpy.ndarray: A float copy of `values` with the other frames filled in.
+
+    Example:
+        >>> video = LandmarkDataset('landmarks').open('Anne')
+        >>> face = interpolate_missing(video.column('face'), video.column('presence')[:, 0])
+    """
+    values = np.array(values, dtype=np.float32 if values.dtype == np.float32 else np.float64)
+    measured = np.asarray(measured, dtype=bool)
+    if measured.all() or not measured.any():
+        return values
+
+    frames = np.arange(len(measured))
+    # Index of the last measured frame at or before, and the first at or after, every frame
+    previous = np.maximum.accumulate(np.where(measured, frames, -1))
+    following = np.minimum.accumulate(np.where(measured, frames, len(measured))[::-1])[::-1]
+    previous = np.where(previous < 0, following, previous)
+    following = np.where(following >= len(measured), previous, following)
+
+    span = following - previous
+    weight = np.divide(frames - previous, span, out=np.zeros(len(frames)), where=span > 0)
+    weight = weight.reshape(-1, *([1] * (values.ndim - 1))).astype(values.dtype)
+    missing = ~measured
+    values[missing] = (values[previous] * (1 - weight) + values[following] * weight)[missing]
+    return values
@@ -0,0 +1,133 @@
+import time
+import cv2
+
+class RealtimeScheduler:
+    """
+    Plays a capture on its media clock with a bounded end-to-end latency.
+
+    Every frame is due at the wall-clock time its capture timestamp (`CAP_PROP_POS_MSEC`)
+    maps to, counted from the first frame. `read()` grabs frames and drops, without decoding,
+    those that could no longer be shown within `max_latency_ms` of their due time, given how
+    long processing has recently taken. It always keeps the newest due frame, so slow
+    processing lowers the frame rate instead of stalling. `present()` waits until the
+    processed frame is due and records whether it made it in time.
+
+    Args:
+        cap (cv2.VideoCapture): The opened video.
+        max_latency_ms (float, optional): Target bound between a frame's due time and its
+            presentation. Default is 100.
+
+    Attributes:
+        on_time (int): Frames presented within `max_latency_ms` of their due time.
+        late (int): Frames processed but presented later than that.
+        dropped (int): Frames skipped without decoding.
+        max_latency (float): Largest presentation latency seen, in milliseconds.
+
+    Example:
+        >>> scheduler = RealtimeScheduler(cap, max_latency_ms=80)
+        >>> while True:
+        >>>     success, frame, timestamp_ms = scheduler.read()
+        >>>     if not success:
+        >>>         break
+        >>>     output = detect_process(...)
+        >>>     cv2.imshow('Output', output)
+        >>>     if scheduler.present(timestamp_ms, wait_key=True) == ord('q'):
+        >>>         break
+        >>> print(scheduler.summary())
+    """
+
+    def __init__(self, cap, max_latency_ms=100.0):
+        self.cap = cap
+        self.max_latency_ms = max_latency_ms
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval_ms = 1000 / fps if fps and fps > 0 else 1000 / 30
+        self.on_time = 0
+        self.late = 0
+        self.dropped = 0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+        # Smoothed time from read() returning to present() being called
+        self._processing_ms = 0.0
+        self._read_time = None
+        self.reset()
+
+    def reset(self):
+        """
+        Restarts the media clock, e.g. after seeking or looping back to the start.
+        """
+        self._clock_start = None
+        self._first_timestamp_ms = 0.0
+
+    def due_time(self, timestamp_ms):
+        """
+        Returns the perf_counter() time a frame with the given capture timestamp is due.
+        """
+        return self._clock_start + (timestamp_ms - self._first_timestamp_ms) / 1000
+
+    def read(self):
+        """
+        Returns the next frame worth processing.
+
+        Returns:
+            tuple: (success, frame, timestamp_ms); success is False at the end of the video.
+        """
+        while True:
+            if not self.cap.grab():
+                return False, None, None
+            timestamp_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            now = time.perf_counter()
+            if self._clock_start is None:
+                self._clock_start = now
+                self._first_timestamp_ms = timestamp_ms
+            lateness_ms = (now - self.due_time(timestamp_ms)) * 1000
+            # Drop only while a newer frame is already due, so the freshest frame is always kept
+            if lateness_ms + self._processing_ms > self.max_latency_ms and lateness_ms >= self.frame_interval_ms:
+                self.dropped += 1
+                continue
+            success, frame = self.cap.retrieve()
+            if not success:
+                return False, None, None
+            self._read_time = time.perf_counter()
+            return True, frame, timestamp_ms
+
+    def present(self, timestamp_ms, wait_key=False):
+        """
+        Waits until the frame is due and records its latency.
+
+        Args:
+            timestamp_ms (float): Capture timestamp returned by `read()`.
+            wait_key (bool, optional): Wait with cv2.waitKey, which also keeps the display window
+                responsive; waits at least 1 ms. Default is False (time.sleep, no wait when late).
+
+        Returns:
+            int: The pressed key (cv2.waitKey(...) & 0xFF) with `wait_key`, otherwise -1.
+        """
+        now = time.perf_counter()
+        if self._read_time is not None:
+            # Exponential moving average over roughly the last 10 frames
+            self._processing_ms += ((now - self._read_time) * 1000 - self._processing_ms) * 0.1
+        remaining = self.due_time(timestamp_ms) - now
+
+        key = -1
+        if wait_key:
+            key = cv2.waitKey(max(1, int(remaining * 1000))) & 0xFF
+        elif remaining > 0:
+            time.sleep(remaining)
+
+        latency_ms = max(0.0, (time.perf_counter() - self.due_time(timestamp_ms)) * 1000)
+        self._total_latency += latency_ms
+        self.max_latency = max(self.max_latency, latency_ms)
+        if latency_ms <= self.max_latency_ms:
+            self.on_time += 1
+        else:
+            self.late += 1
+        return key
+
+    def summary(self):
+        """
+        Returns a one-line report of the frame counts and latencies.
+        """
+        presented = self.on_time + self.late
+        mean_latency = self._total_latency / presented if presented else 0.0
+        return (f"{presented} frames presented ({self.on_time} on time, {self.late} late), {self.dropped} dropped, "
+                f"latency mean {mean_latency:.0f} ms, max {self.max_latency:.0f} ms")
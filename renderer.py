@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+import mediapipe as mp
+from landmark_arrays import LEFT, RIGHT
+import lm_indices as ids
+
+LEVELS = ('none', 'keypoints', 'full')
+
+# MediaPipe hides pose landmarks below this visibility, and so do we
+VISIBILITY_THRESHOLD = 0.5
+
+# Colors (BGR), line thickness and dot radius of every part, as drawn so far by detect_process
+STYLES = {
+    'face': {'color': (0, 255, 0), 'line_color': (63, 127, 63), 'thickness': 1, 'radius': 1},
+    'pose': {'color': (255, 127, 255), 'line_color': (127, 63, 127), 'thickness': 1, 'radius': 2},
+    LEFT: {'color': (255, 0, 0), 'line_color': (127, 63, 63), 'thickness': 1, 'radius': 1},
+    RIGHT: {'color': (0, 0, 255), 'line_color': (63, 63, 127), 'thickness': 1, 'radius': 1},
+}
+# The large rings around the hand keypoints of lm_indices.hand_constants
+HAND_RING_RADIUS = 10
+
+# Connection index arrays, built from the MediaPipe frozensets on first use
+_connections = None
+
+def connections():
+    """
+    Returns the MediaPipe connection sets as (K, 2) int arrays, built once per process.
+
+    Returns:
+        dict: 'face_tessellation', 'face_contours', 'pose' and 'hands' arrays of landmark index pairs.
+    """
+    global _connections
+    if _connections is None:
+        solutions = mp.solutions
+        _connections = {
+            'face_tessellation': np.array(sorted(solutions.face_mesh.FACEMESH_TESSELATION), dtype=np.int32),
+            'face_contours': np.array(sorted(solutions.face_mesh.FACEMESH_CONTOURS), dtype=np.int32),
+            'pose': np.array(sorted(solutions.pose.POSE_CONNECTIONS), dtype=np.int32),
+            'hands': np.array(sorted(solutions.hands.HAND_CONNECTIONS), dtype=np.int32),
+        }
+    return _connections
+
+def _dot_polygon(radius):
+    # Offsets of a small closed polygon standing in for a circle; 8 corners look round at these radii
+    angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    return np.round(np.stack([np.cos(angles), np.sin(angles)], axis=1) * radius).astype(np.int32)
+
+class OverlayRenderer:
+    """
+    Draws the landmarks of a frame onto an output frame in place, with a few OpenCV calls per part.
+
+    Landmarks come straight from the FrameLandmarks arrays: they are scaled to pixels in one
+    vectorized step, every connection of a part goes to the screen in a single `cv2.polylines`
+    call, and the landmark dots are drawn as small polygons in one more. Drawing specs and
+    connection arrays are built once, and the output frame is never copied.
+
+    Levels:
+        'none': draws nothing, the default for headless runs.
+        'keypoints': pose and hand skeletons with their dots, and the face contours.
+        'full': the full face tessellation and the hand keypoint rings on top of that.
+
+    Args:
+        level (str, optional): One of LEVELS. Default is 'full'.
+
+    Example:
+        >>> renderer = OverlayRenderer('keypoints')
+        >>> renderer.render(display_frame, session.frame_landmarks)
+    """
+
+    def __init__(self, level='full'):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown overlay level {level!r}, expected one of {LEVELS}")
+        self.level = level
+        self._dots = {part: _dot_polygon(style['radius']) for part, style in STYLES.items()}
+        self._ring = _dot_polygon(HAND_RING_RADIUS)
+        self._face_points = {}
+
+    def _face_connections(self):
+        name = 'face_tessellation' if self.level == 'full' else 'face_contours'
+        edges = connections()[name]
+        if name not in self._face_points:
+            # Only landmarks used by an edge get a dot, so unfilled iris rows never show up at the origin
+            self._face_points[name] = np.unique(edges)
+        return edges, self._face_points[name]
+
+    def _draw_part(self, frame, pixels, edges, style, dots, points=None):
+        if len(edges):
+            cv2.polylines(frame, pixels[edges], False, style['line_color'], style['thickness'])
+        if dots is not None:
+            selected = pixels if points is None else pixels[points]
+            cv2.polylines(frame, selected[:, None, :] + dots, True, style['color'], style['thickness'])
+
+    def render(self, frame, frame_lms):
+        """
+        Draws the present landmarks on the frame.
+
+        Args:
+            frame (numpy.ndarray): BGR frame of any size, drawn on in place.
+            frame_lms (FrameLandmarks): Normalized landmarks of the frame.
+
+        Returns:
+            numpy.ndarray: `frame`.
+        """
+        if self.level == 'none':
+            return frame
+        img_h, img_w = frame.shape[:2]
+        scale = np.array((img_w, img_h), dtype=np.float32)
+        links = connections()
+
+        if frame_lms.face_present:
+            edges, points = self._face_connections()
+            pixels = (frame_lms.face[:, :2] * scale).astype(np.int32)
+            self._draw_part(frame, pixels, edges, STYLES['face'], self._dots['face'] if self.level == 'full' else None, points)
+
+        if frame_lms.pose_present:
+            pixels = (frame_lms.pose[:, :2] * scale).astype(np.int32)
+            visible = frame_lms.pose[:, 3] >= VISIBILITY_THRESHOLD
+            edges = links['pose'][visible[links['pose']].all(axis=1)]
+            self._draw_part(frame, pixels, edges, STYLES['pose'], self._dots['pose'], np.flatnonzero(visible))
+
+        for slot in (LEFT, RIGHT):
+            if not frame_lms.hand_present[slot]:
+                continue
+            pixels = (frame_lms.hands[slot, :, :2] * scale).astype(np.int32)
+            self._draw_part(frame, pixels, links['hands'], STYLES[slot], self._dots[slot])
+            if self.level == 'full':
+                rings = pixels[ids.hand_constants][:, None, :] + self._ring
+                cv2.polylines(frame, rings, True, STYLES[slot]['color'], 1)
+        return frame
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from http_util import file_hash
+from model_config import MODEL_CONFIG
+from landmark_dataset import FORMAT_VERSION, META_FILE, VIDEOS_DIR
+
+# Bump when a code change alters the extracted landmarks, so older entries stop matching
+CACHE_VERSION = 1
+
+INDEX_FILE = 'index.json'
+ENTRIES_DIR = 'entries'
+
+def config_hash(config=None):
+    """
+    Hashes the model settings together with the cache and dataset format versions.
+
+    Args:
+        config (dict, optional): Model settings. Defaults to model_config.MODEL_CONFIG.
+
+    Returns:
+        str: Hex digest identifying the settings.
+    """
+    payload = {'cache_version': CACHE_VERSION, 'format_version': FORMAT_VERSION, 'models': MODEL_CONFIG if config is None else config}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path))
+
+def _link_or_copy(src, dst):
+    # Hard links make restoring free when the cache and the dataset share a file system
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+class ResultCache:
+    """
+    Content-addressed cache of extracted landmarks.
+
+    An entry is keyed by the SHA-256 of the video's bytes plus the hash of the model settings,
+    so a renamed or copied video still hits and a settings change misses. Entries are stored
+    in the landmark dataset layout and restored into a dataset by hard link or copy, skipping
+    decoding and inference. The total size is capped with least-recently-used eviction.
+
+    Video hashes are remembered by (size, mtime), so unchanged videos are not re-read.
+
+    Args:
+        root (str): Cache folder; created if missing.
+        max_bytes (int, optional): Size cap of all entries. Default is 10 GiB.
+        config (dict, optional): Model settings. Defaults to model_config.MODEL_CONFIG.
+
+    Example:
+        >>> cache = ResultCache('.landmark_cache')
+        >>> key = cache.key('videos/Anne.mp4')
+        >>> if cache.restore(key, 'landmarks', 'Anne') is None:
+        >>>     ...  # extract, then
+        >>>     cache.put(key, 'landmarks/videos/Anne')
+    """
+
+    def __init__(self, root, max_bytes=10 * 2**30, config=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.config_hash = config_hash(config)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(root, ENTRIES_DIR), exist_ok=True)
+        self.index_path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+        else:
+            self.index = {'entries': {}, 'hashes': {}}
+
+    def save(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def video_hash(self, video_path):
+        """
+        Returns the content hash of a video, reusing the stored one while size and mtime are unchanged.
+        """
+        stat = os.stat(video_path)
+        path = os.path.abspath(video_path)
+        known = self.index['hashes'].get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = file_hash(video_path)
+        self.index['hashes'][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def key(self, video_path):
+        """
+        Returns the cache key of a video under the current model settings.
+        """
+        return f"{self.video_hash(video_path)[:32]}-{self.config_hash[:16]}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, ENTRIES_DIR, key)
+
+    def restore(self, key, dataset_root, name, source=None):
+        """
+        Copies a cached entry into a landmark dataset.
+
+        Args:
+            key (str): Key returned by `key()`.
+            dataset_root (str): Root folder of the LandmarkDataset.
+            name (str): Name of the video inside the dataset.
+            source (str, optional): Source path recorded in the restored metadata.
+
+        Returns:
+            dict or None: The restored video metadata, or None on a miss.
+        """
+        entry = self.index['entries'].get(key)
+        entry_dir = self._entry_dir(key)
+        if entry is None or not os.path.isdir(entry_dir):
+            self.misses += 1
+            return None
+
+        video_dir = os.path.join(dataset_root, VIDEOS_DIR, name)
+        tmp_dir = video_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for filename in os.listdir(entry_dir):
+            if filename != META_FILE:
+                _link_or_copy(os.path.join(entry_dir, filename), os.path.join(tmp_dir, filename))
+        with open(os.path.join(entry_dir, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['name'] = name
+        if source is not None:
+            meta['source'] = source
+        with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=1, ensure_ascii=False)
+        shutil.rmtree(video_dir, ignore_errors=True)
+        os.replace(tmp_dir, video_dir)
+
+        entry['last_access'] = time.time()
+        self.hits += 1
+        return meta
+
+    def put(self, key, video_dir):
+        """
+        Stores a written dataset video folder under a key, then evicts down to the size cap.
+
+        Args:
+            key (str): Key returned by `key()`.
+            video_dir (str): Folder written by VideoLandmarksWriter.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for filename in os.listdir(video_dir):
+            _link_or_copy(os.path.join(video_dir, filename), os.path.join(tmp_dir, filename))
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.index['entries'][key] = {'size': _dir_size(entry_dir), 'last_access': time.time(), 'config': self.config_hash}
+        self.evict()
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.index['entries'].values())
+
+    def _remove(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self.index['entries'].pop(key, None)
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits `max_bytes`.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        removed = 0
+        total = self.total_bytes()
+        for key, entry in sorted(self.index['entries'].items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['size']
+            self._remove(key)
+            removed += 1
+        return removed
+
+    def invalidate(self, all_entries=False):
+        """
+        Removes entries made with other model settings, or every entry.
+
+        Args:
+            all_entries (bool, optional): Remove every entry, not just the stale ones. Default is False.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        stale = [key for key, entry in self.index['entries'].items() if all_entries or entry['config'] != self.config_hash]
+        for key in stale:
+            self._remove(key)
+        return len(stale)
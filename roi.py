@@ -0,0 +1,185 @@
+import numpy as np
+import lm_indices as ids
+from landmark_arrays import NUM_POSE_LANDMARKS, landmarks_to_array
+
+# Pose keypoints that outline each region
+FACE_POSE_INDICES = np.array([ids.nose, ids.left_eye_inner, ids.left_eye, ids.left_eye_outer,
+                              ids.right_eye_inner, ids.right_eye, ids.right_eye_outer,
+                              ids.left_ear, ids.right_ear, ids.mouth_left, ids.mouth_right])
+HAND_POSE_INDICES = np.array([ids.left_wrist, ids.right_wrist, ids.left_pinky, ids.right_pinky,
+                              ids.left_index, ids.right_index, ids.left_thumb, ids.right_thumb])
+
+FACE = 'face'
+HANDS = 'hands'
+
+def crop(frame, roi):
+    """
+    Cuts a region out of a frame as a contiguous array, as MediaPipe requires.
+
+    Args:
+        frame (numpy.ndarray): The frame.
+        roi (tuple): (x0, y0, x1, y1) pixel box, or None for the whole frame.
+
+    Returns:
+        numpy.ndarray: The crop, or the frame itself for None.
+    """
+    if roi is None:
+        return frame
+    x0, y0, x1, y1 = roi
+    return np.ascontiguousarray(frame[y0:y1, x0:x1])
+
+def map_landmarks_to_frame(landmark_list, roi, img_w, img_h):
+    """
+    Converts landmarks detected on a crop to normalized coordinates of the full frame, in place.
+
+    x and y are shifted and scaled by the crop box. z uses the same scale as x, as MediaPipe
+    measures depth in units of the image width.
+
+    Args:
+        landmark_list (NormalizedLandmarkList): Landmarks returned for the crop.
+        roi (tuple): (x0, y0, x1, y1) box the crop was cut from.
+        img_w (int): Width of the full frame.
+        img_h (int): Height of the full frame.
+    """
+    x0, y0, x1, y1 = roi
+    scale_x = (x1 - x0) / img_w
+    scale_y = (y1 - y0) / img_h
+    offset_x = x0 / img_w
+    offset_y = y0 / img_h
+    for lm in landmark_list.landmark:
+        lm.x = lm.x * scale_x + offset_x
+        lm.y = lm.y * scale_y + offset_y
+        lm.z = lm.z * scale_x
+
+class RoiTracker:
+    """
+    Derives the face and hands crops of a frame from its pose landmarks.
+
+    The pose model already locates the face and the wrists, so the face mesh and hands models
+    can run on padded crops instead of the whole frame. Boxes are only replaced when the new
+    region leaves the current one or becomes much smaller, and a replaced box gets extra margin;
+    the crops stay put while the signer moves a little, which keeps the models' frame-to-frame
+    tracking valid.
+
+    A region falls back to the full frame when the pose is missing, when its keypoints are not
+    visible, when the crop would cover most of the frame anyway, and for one frame after its
+    model found nothing in the crop (`lost()`), so a detection that left the crop is picked up
+    again.
+
+    Args:
+        face_padding (float, optional): Face box size as a multiple of the extent of the pose face
+            keypoints, which only span the eyes, ears and mouth. Default is 2.0.
+        hand_padding (float, optional): Margin around the pose hand keypoints as a multiple of the
+            shoulder width. Default is 0.6.
+        hysteresis (float, optional): Extra margin of a new box, as a fraction of its size. Default is 0.15.
+        min_size (int, optional): Smallest crop side in pixels. Default is 96.
+        min_visibility (float, optional): Pose visibility a keypoint needs to be used. Default is 0.5.
+        max_area_fraction (float, optional): Crops larger than this part of the frame are replaced
+            by the full frame. Default is 0.7.
+
+    Attributes:
+        cropped (dict): Frames each region was cropped, keyed by FACE and HANDS.
+        full_frame (dict): Frames each region fell back to the full frame.
+
+    Example:
+        >>> tracker = RoiTracker()
+        >>> face_roi, hands_roi = tracker.update(pose_results.pose_landmarks, img_w, img_h)
+        >>> face_results = face_mesh.process(crop(frame_rgb, face_roi))
+    """
+
+    def __init__(self, face_padding=2.0, hand_padding=0.6, hysteresis=0.15, min_size=96, min_visibility=0.5, max_area_fraction=0.7):
+        self.face_padding = face_padding
+        self.hand_padding = hand_padding
+        self.hysteresis = hysteresis
+        self.min_size = min_size
+        self.min_visibility = min_visibility
+        self.max_area_fraction = max_area_fraction
+        self.cropped = {FACE: 0, HANDS: 0}
+        self.full_frame = {FACE: 0, HANDS: 0}
+        self._pose = np.zeros((NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+        self._boxes = {FACE: None, HANDS: None}
+        self._lost = {FACE: False, HANDS: False}
+
+    def reset(self):
+        self._boxes = {FACE: None, HANDS: None}
+        self._lost = {FACE: False, HANDS: False}
+
+    def lost(self, region):
+        """
+        Reports that the model of a region found nothing in its crop; the next frame uses the full frame.
+        """
+        self._lost[region] = True
+        self._boxes[region] = None
+
+    def update(self, pose_landmarks, img_w, img_h):
+        """
+        Computes the crops for the current frame.
+
+        Args:
+            pose_landmarks (NormalizedLandmarkList or None): Pose of the frame.
+            img_w (int): Width of the frame.
+            img_h (int): Height of the frame.
+
+        Returns:
+            tuple: The face box and the hands box, each (x0, y0, x1, y1) in pixels, or None for the full frame.
+        """
+        if pose_landmarks is None:
+            self.reset()
+            return self._choose(FACE, None, img_w, img_h), self._choose(HANDS, None, img_w, img_h)
+
+        pose = landmarks_to_array(pose_landmarks, self._pose, with_visibility=True)
+        points = pose[:, :2] * (img_w, img_h)
+        visible = pose[:, 3] >= self.min_visibility
+
+        face_box = None
+        face_points = points[FACE_POSE_INDICES[visible[FACE_POSE_INDICES]]]
+        if len(face_points) >= 2:
+            center = (face_points.min(axis=0) + face_points.max(axis=0)) / 2
+            half = max(np.ptp(face_points, axis=0).max() * self.face_padding, self.min_size) / 2
+            face_box = (center[0] - half, center[1] - half, center[0] + half, center[1] + half)
+
+        hands_box = None
+        hand_points = points[HAND_POSE_INDICES[visible[HAND_POSE_INDICES]]]
+        if len(hand_points):
+            shoulder_width = np.linalg.norm(points[ids.left_shoulder] - points[ids.right_shoulder])
+            margin = max(shoulder_width * self.hand_padding, self.min_size / 2)
+            low = hand_points.min(axis=0) - margin
+            high = hand_points.max(axis=0) + margin
+            hands_box = (low[0], low[1], high[0], high[1])
+
+        return self._choose(FACE, face_box, img_w, img_h), self._choose(HANDS, hands_box, img_w, img_h)
+
+    def _choose(self, region, box, img_w, img_h):
+        if self._lost[region]:
+            # One full-frame attempt after a miss
+            self._lost[region] = False
+            box = None
+        elif box is not None:
+            box = self._stabilize(region, box, img_w, img_h)
+
+        if box is None or (box[2] - box[0]) * (box[3] - box[1]) > self.max_area_fraction * img_w * img_h:
+            self._boxes[region] = None
+            self.full_frame[region] += 1
+            return None
+        self.cropped[region] += 1
+        return box
+
+    def _stabilize(self, region, box, img_w, img_h):
+        current = self._boxes[region]
+        x0, y0, x1, y1 = box
+        if current is not None:
+            cx0, cy0, cx1, cy1 = current
+            inside = cx0 <= max(x0, 0) and cy0 <= max(y0, 0) and min(x1, img_w) <= cx1 and min(y1, img_h) <= cy1
+            # Keep the current box unless the region left it or shrank well below it
+            shrunk = (x1 - x0) * (y1 - y0) < (1 - 2 * self.hysteresis) ** 2 * (cx1 - cx0) * (cy1 - cy0)
+            if inside and not shrunk:
+                return current
+
+        margin_x = (x1 - x0) * self.hysteresis / 2
+        margin_y = (y1 - y0) * self.hysteresis / 2
+        new_box = (max(0, int(x0 - margin_x)), max(0, int(y0 - margin_y)),
+                   min(img_w, int(np.ceil(x1 + margin_x))), min(img_h, int(np.ceil(y1 + margin_y))))
+        if new_box[2] - new_box[0] < 2 or new_box[3] - new_box[1] < 2:
+            return None
+        self._boxes[region] = new_box
+        return new_box
@@ -0,0 +1,125 @@
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FixtureServer:
+    """
+    Local stand-in HTTP server for the download tests.
+
+    Serves `files` (URL path -> bytes) with Range and conditional request support, and records
+    every request as (method, path, Range header) in `requests`.
+
+    Attributes:
+        files (dict): URL path -> body. Paths ending in '/' map to HTML pages as well.
+        requests (list of tuple): (method, path, Range header or None) of every request.
+        drop (dict): URL path -> number of body bytes sent before the connection is dropped, once.
+        replace_after_drop (dict): URL path -> new body served after its connection was dropped.
+        fail (dict): URL path -> list of statuses answered first, one per request.
+
+    Example:
+        >>> with FixtureServer({'/a.ts': b'...'}) as server:
+        ...     download_file(session, server.url('/a.ts'), 'a.ts')
+    """
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.requests = []
+        self.drop = {}
+        self.replace_after_drop = {}
+        self.fail = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def ranges(self, path):
+        """
+        Returns the Range headers of the GET requests for a path, in order.
+        """
+        return [header for method, request_path, header in self.requests if method == 'GET' and request_path == path]
+
+    def _handler_class(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body):
+                range_header = self.headers.get('Range')
+                with fixture._lock:
+                    fixture.requests.append((self.command, self.path, range_header))
+                    failures = fixture.fail.get(self.path)
+                    status = failures.pop(0) if failures else None
+                    body = fixture.files.get(self.path)
+                if status is not None:
+                    self.send_response(status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                start = 0
+                match = re.match(r'bytes=(\d+)-$', range_header or '')
+                if match:
+                    start = int(match.group(1))
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{len(body)}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Length', str(len(body) - start))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                if not send_body:
+                    return
+
+                with fixture._lock:
+                    drop_at = fixture.drop.pop(self.path, None) if self.command == 'GET' else None
+                if drop_at is None:
+                    self.wfile.write(body[start:])
+                    return
+                # Send part of the body, then cut the connection
+                self.wfile.write(body[start:start + drop_at])
+                self.wfile.flush()
+                with fixture._lock:
+                    if self.path in fixture.replace_after_drop:
+                        fixture.files[self.path] = fixture.replace_after_drop.pop(self.path)
+                self.close_connection = True
+                self.connection.shutdown(2)
+
+        return Handler
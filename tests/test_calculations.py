@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from calculations import (FaceState, HeadPoseSolver, analyze_face_landmarks, analyze_face_landmarks_batch, convert_normalized_landmarks,
+                          get_nodturn)
+
+IMG_W, IMG_H = 1280, 720
+# Batch keys of the FaceState values `analyze_face_landmarks` leaves out of its dict
+STATE_KEYS = {'eye_l_h': 'EYE_L_H', 'eye_r_h': 'EYE_R_H', 'eye_l_v': 'EYE_L_V', 'eye_r_v': 'EYE_R_V'}
+
+def random_faces(seed, frames=40):
+    rng = np.random.default_rng(seed)
+    faces = np.empty((frames, 478, 3))
+    faces[..., :2] = rng.uniform(0.1, 0.9, (frames, 478, 2))
+    faces[..., 2] = rng.uniform(-0.05, 0.05, (frames, 478))
+    return faces
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_batch_matches_scalar_path(seed):
+    faces = random_faces(seed)
+    batch = analyze_face_landmarks_batch(faces, IMG_W, IMG_H, head_pose_solver=HeadPoseSolver())
+    solver = HeadPoseSolver()
+    for i, face in enumerate(faces):
+        state = FaceState()
+        scalar = analyze_face_landmarks(face, IMG_W, IMG_H, head_pose_solver=solver, state=state)
+        for name, value in scalar.items():
+            if name in ('nod', 'turn'):
+                assert batch[name][i] == pytest.approx(value, rel=0, abs=1e-7), name
+            else:
+                assert batch[name][i] == value, name
+        for name, attribute in STATE_KEYS.items():
+            assert batch[name][i] == getattr(state, attribute), name
+
+def test_batch_nod_and_turn_match_cold_reference():
+    faces = random_faces(3)
+    batch = analyze_face_landmarks_batch(faces, IMG_W, IMG_H, head_pose_solver=HeadPoseSolver(warm_start=False))
+    reference = np.array([get_nodturn(convert_normalized_landmarks(face, IMG_W, IMG_H), IMG_W, IMG_H) for face in faces])
+    # cv2.RQDecomp3x3 and the closed-form conversion differ by about 1e-6 degrees near zero
+    np.testing.assert_allclose(batch['nod'], reference[:, 0], rtol=0, atol=1e-5)
+    np.testing.assert_allclose(batch['turn'], reference[:, 1], rtol=0, atol=1e-5)
+
+def test_batch_without_nod_and_turn():
+    metrics = analyze_face_landmarks_batch(random_faces(4, frames=3), IMG_W, IMG_H, with_nodturn=False)
+    assert np.isnan(metrics['nod']).all() and np.isnan(metrics['turn']).all()
+    assert np.isfinite(metrics['gap']).all()
+
+def head_sequence(frames=120, seed=0):
+    """
+    Normalized landmarks of a rigid head turning and nodding smoothly, at 30 fps.
+    """
+    rng = np.random.default_rng(seed)
+    # Points on the front of an ellipsoid stand in for the face mesh
+    theta = rng.uniform(-1.2, 1.2, 478)
+    phi = rng.uniform(-1.0, 1.0, 478)
+    model = np.column_stack([0.15 * np.sin(theta) * np.cos(phi), 0.2 * np.sin(phi), -0.1 * np.cos(theta) * np.cos(phi)])
+    t = np.arange(frames) / 30
+    yaw = np.radians(25 * np.sin(2 * np.pi * 0.3 * t))
+    pitch = np.radians(15 * np.sin(2 * np.pi * 0.2 * t))
+    faces = np.empty((frames, 478, 3))
+    for i in range(frames):
+        cy, sy, cp, sp = np.cos(yaw[i]), np.sin(yaw[i]), np.cos(pitch[i]), np.sin(pitch[i])
+        rotation = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]]) @ np.array([[1, 0, 0], [0, cp, -sp], [0, sp, cp]])
+        faces[i] = model @ rotation.T + (0.5, 0.5, 0)
+    return np.array([convert_normalized_landmarks(face, IMG_W, IMG_H) for face in faces])
+
+@pytest.mark.parametrize('reseed_interval', [30, 0])
+def test_warm_started_solver_matches_cold_solves(reseed_interval):
+    points = head_sequence()
+    reference = np.array([get_nodturn(frame, IMG_W, IMG_H) for frame in points])
+    solver = HeadPoseSolver(reseed_interval=reseed_interval)
+    np.testing.assert_allclose(solver.solve_batch(points, IMG_W, IMG_H), reference, rtol=0, atol=1e-5)
+    assert solver.warm_solves > 0
+
+def test_reseed_interval_forces_cold_solves():
+    solver = HeadPoseSolver(reseed_interval=30)
+    solver.solve_batch(head_sequence(frames=100), IMG_W, IMG_H)
+    # One cold solve, then 30 warm ones, over and over: frames 0, 31, 62 and 93
+    assert (solver.cold_solves, solver.warm_solves) == (4, 96)
+
+    solver = HeadPoseSolver(reseed_interval=0)
+    solver.solve_batch(head_sequence(frames=100), IMG_W, IMG_H)
+    assert (solver.cold_solves, solver.warm_solves) == (1, 99)
+
+def test_warm_results_beyond_max_jump_fall_back_to_cold_solves():
+    points = head_sequence(frames=20)
+    solver = HeadPoseSolver(max_jump=0.0)
+    angles = solver.solve_batch(points, IMG_W, IMG_H)
+    # The pose changes every frame, so no warm result stays within a jump of 0 degrees
+    assert (solver.cold_solves, solver.warm_solves) == (20, 0)
+    reference = np.array([get_nodturn(frame, IMG_W, IMG_H) for frame in points])
+    np.testing.assert_allclose(angles, reference, rtol=0, atol=1e-5)
+
+def test_reset_and_disabled_warm_start_solve_cold():
+    points = head_sequence(frames=10)
+    solver = HeadPoseSolver(warm_start=False)
+    solver.solve_batch(points, IMG_W, IMG_H)
+    assert (solver.cold_solves, solver.warm_solves) == (10, 0)
+
+    solver = HeadPoseSolver()
+    solver.solve(points[0], IMG_W, IMG_H)
+    solver.reset()
+    solver.solve(points[1], IMG_W, IMG_H)
+    assert (solver.cold_solves, solver.warm_solves) == (2, 0)
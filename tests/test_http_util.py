@@ -0,0 +1,98 @@
+import os
+import pytest
+from fixture_server import FixtureServer
+from http_util import DownloadError, download_file, download_many, make_session
+
+BODY = os.urandom(300000)
+NEW_BODY = os.urandom(250000)
+# Only whole chunks reach the part file, so connections are dropped on a chunk boundary
+CHUNK = 1024
+DROP_AT = 98 * CHUNK
+
+@pytest.fixture
+def session():
+    session = make_session(4)
+    yield session
+    session.close()
+
+def test_resumes_after_dropped_connection(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with FixtureServer({'/a.ts': BODY}) as server:
+        server.drop['/a.ts'] = DROP_AT
+        result = download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        assert server.ranges('/a.ts') == [None, f'bytes={DROP_AT}-']
+    assert result['status'] == 'resumed'
+    assert result['size'] == len(BODY)
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+    assert not os.path.exists(path + '.part')
+
+def test_skips_complete_file(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with FixtureServer({'/a.ts': BODY}) as server:
+        download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        result = download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        assert [method for method, _, _ in server.requests] == ['GET', 'HEAD']
+    assert result['status'] == 'skipped'
+
+def test_retries_server_errors(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with FixtureServer({'/a.ts': BODY}) as server:
+        server.fail['/a.ts'] = [503, 502]
+        result = download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        assert server.ranges('/a.ts') == [None, None, None]
+    assert result['status'] == 'downloaded'
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+
+def test_gives_up_after_retries(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with FixtureServer({'/a.ts': BODY}) as server:
+        server.fail['/a.ts'] = [503] * 3
+        with pytest.raises(DownloadError):
+            download_file(session, server.url('/a.ts'), path, retries=2, backoff=0)
+    assert not os.path.exists(path)
+
+def test_restarts_when_file_changes_between_attempts(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with FixtureServer({'/a.ts': BODY}) as server:
+        server.drop['/a.ts'] = DROP_AT
+        server.replace_after_drop['/a.ts'] = NEW_BODY
+        download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        # The resumed range reports another total size, so the part file is thrown away
+        assert server.ranges('/a.ts') == [None, f'bytes={DROP_AT}-', None]
+    with open(path, 'rb') as f:
+        assert f.read() == NEW_BODY
+
+def test_restarts_when_part_file_outgrew_the_remote_file(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with open(path + '.part', 'wb') as f:
+        f.write(BODY)
+    with FixtureServer({'/a.ts': NEW_BODY}) as server:
+        result = download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        assert server.ranges('/a.ts') == [f'bytes={len(BODY)}-', None]
+    assert result['size'] == len(NEW_BODY)
+    with open(path, 'rb') as f:
+        assert f.read() == NEW_BODY
+
+def test_complete_part_file_is_kept(session, tmp_path):
+    path = str(tmp_path / 'a.ts')
+    with open(path + '.part', 'wb') as f:
+        f.write(BODY)
+    with FixtureServer({'/a.ts': BODY}) as server:
+        download_file(session, server.url('/a.ts'), path, backoff=0, chunk_size=CHUNK)
+        assert server.ranges('/a.ts') == [f'bytes={len(BODY)}-']
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+
+def test_download_many_reports_failures(session, tmp_path):
+    files = {f'/seg_{i}.ts': os.urandom(5000 + i) for i in range(6)}
+    with FixtureServer(files) as server:
+        server.drop['/seg_2.ts'] = 2 * CHUNK
+        jobs = [(server.url(name), str(tmp_path / name.lstrip('/'))) for name in list(files) + ['/missing.ts']]
+        results = {os.path.basename(result['path']): result for result in download_many(session, jobs, workers=3, backoff=0, chunk_size=CHUNK)}
+    assert results['missing.ts']['status'] == 'failed'
+    assert results['seg_2.ts']['status'] == 'resumed'
+    for name, body in files.items():
+        with open(str(tmp_path / name.lstrip('/')), 'rb') as f:
+            assert f.read() == body
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from landmark_arrays import FrameLandmarks, LEFT, RIGHT
+from landmark_codec import (HEADER, HEADER_V1, MAGIC, METRIC_NAMES, QUANT_SCALE, LandmarkEncoder, decode_message,
+                            encode_schema, is_schema_message)
+
+def random_frame(seed, present=True):
+    rng = np.random.default_rng(seed)
+    frame_lms = FrameLandmarks()
+    frame_lms.hands[:] = rng.uniform(-1, 1, frame_lms.hands.shape)
+    frame_lms.pose[:] = rng.uniform(-1, 1, frame_lms.pose.shape)
+    frame_lms.face_present = present
+    frame_lms.pose_present = not present
+    frame_lms.hand_present[:] = (present, not present)
+    frame_lms.face_synthesized = present
+    frame_lms.hand_synthesized[:] = (False, not present)
+    frame_lms.pose_synthesized = not present
+    return frame_lms
+
+METRICS = {name: i + 0.25 for i, name in enumerate(METRIC_NAMES) if name != 'gap'}
+
+@pytest.mark.parametrize('encoding, tolerance', [('float32', 0), ('int16', 0.5 / QUANT_SCALE)])
+@pytest.mark.parametrize('present', [True, False])
+def test_frame_round_trip(encoding, tolerance, present):
+    frame_lms = random_frame(1, present)
+    encoder = LandmarkEncoder(encoding, stream=7)
+    encoder.encode(frame_lms, METRICS)
+    frame = decode_message(encoder.encode(frame_lms, METRICS, timestamp=12.5))
+    assert frame['kind'] == 'frame'
+    assert (frame['stream'], frame['seq'], frame['timestamp']) == (7, 1, 12.5)
+    np.testing.assert_allclose(frame['hands'], frame_lms.hands, rtol=0, atol=tolerance + 1e-7)
+    np.testing.assert_allclose(frame['pose'], frame_lms.pose, rtol=0, atol=tolerance + 1e-7)
+    assert np.isnan(frame['metrics']['gap'])
+    assert {name: value for name, value in frame['metrics'].items() if name != 'gap'} == METRICS
+    assert frame['face_present'] == present
+    assert frame['pose_present'] == (not present)
+    assert frame['hand_present'].tolist() == [present, not present]
+    assert frame['face_synthesized'] == present
+    assert frame['hand_synthesized'].tolist() == [False, not present]
+    assert frame['pose_synthesized'] == (not present)
+
+@pytest.mark.parametrize('encoding', ['float32', 'int16'])
+def test_version_1_frames_decode_as_stream_0(encoding):
+    frame_lms = random_frame(2)
+    message = LandmarkEncoder(encoding, stream=3).encode(frame_lms, METRICS)
+    _, _, kind, encoding_id, presence, seq, timestamp, _ = HEADER.unpack_from(message)
+    v1_message = HEADER_V1.pack(MAGIC, 1, kind, encoding_id, presence, seq, timestamp) + message[HEADER.size:]
+    v1, v2 = decode_message(v1_message), decode_message(message)
+    assert (v1['stream'], v2['stream']) == (0, 3)
+    np.testing.assert_array_equal(v1['hands'], v2['hands'])
+    np.testing.assert_array_equal(v1['pose'], v2['pose'])
+    assert v1['hand_present'].tolist() == [True, False]
+    assert v1['hand_present'][LEFT] and not v1['hand_present'][RIGHT]
+
+def test_schema_round_trip():
+    message = encode_schema('int16', stream=4)
+    assert is_schema_message(message)
+    schema = decode_message(message)['schema']
+    assert schema['encoding'] == 'int16'
+    assert schema['scale'] == QUANT_SCALE
+    assert schema['header']['size'] == HEADER.size
+    assert schema['header']['fields'][-1] == 'stream'
+    assert schema['metrics'] == list(METRIC_NAMES)
+
+def test_rejects_foreign_and_broken_messages():
+    message = LandmarkEncoder('float32').encode(random_frame(3), METRICS)
+    with pytest.raises(ValueError):
+        decode_message(b'XXXX' + message[4:])
+    with pytest.raises(ValueError):
+        decode_message(message[:4] + bytes([9]) + message[5:])
+    with pytest.raises(ValueError):
+        decode_message(message[:-1])
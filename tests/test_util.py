@@ -0,0 +1,23 @@
+import os
+import pytest
+from util import concat_list, group_segments
+
+def touch(folder, *names):
+    for name in names:
+        open(os.path.join(folder, name), 'wb').close()
+
+def test_groups_segments_by_playlist_in_index_order(tmp_path):
+    touch(tmp_path, 'SIYAH2_10.ts', 'SIYAH2_9.ts', 'SIYAH2_0.ts', 'BEYAZ.ts', 'notes.txt')
+    groups = group_segments(str(tmp_path))
+    assert {name: [os.path.basename(path) for path in paths] for name, paths in groups.items()} == {
+        'BEYAZ': ['BEYAZ.ts'],
+        'SIYAH2': ['SIYAH2_0.ts', 'SIYAH2_9.ts', 'SIYAH2_10.ts'],
+    }
+
+def test_refuses_file_named_like_a_playlist(tmp_path):
+    touch(tmp_path, 'SIYAH2.ts', 'SIYAH2_0.ts')
+    with pytest.raises(ValueError, match='SIYAH2.ts'):
+        group_segments(str(tmp_path))
+
+def test_concat_list_quotes_paths():
+    assert concat_list(['/ts/a|b_0.ts', "/ts/it's_1.ts"]) == "file '/ts/a|b_0.ts'\nfile '/ts/it'\\''s_1.ts'\n"
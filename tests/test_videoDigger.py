@@ -0,0 +1,29 @@
+import os
+from fixture_server import FixtureServer
+from http_util import make_session
+from videoDigger import download_ts_files_from_playlist
+
+SEGMENTS = {f'/media/SIYAH2_{i}.ts': os.urandom(20000 + 1000 * i) for i in range(4)}
+PLAYLIST = ("#EXTM3U\n#EXT-X-TARGETDURATION:2\n"
+            + "".join(f"#EXTINF:2.0,\nSIYAH2_{i}.ts\n" for i in range(4))
+            + "#EXT-X-ENDLIST\n").encode('ascii')
+
+def test_playlist_download_resumes_and_skips(tmp_path):
+    folder = str(tmp_path / 'ts')
+    session = make_session(4)
+    with FixtureServer(dict(SEGMENTS, **{'/media/SIYAH2.m3u8': PLAYLIST})) as server:
+        server.drop['/media/SIYAH2_1.ts'] = 0
+        counts = download_ts_files_from_playlist("SIYAH2", server.url('/media/'), folder, session, workers=2)
+        assert counts == {'downloaded': 4, 'resumed': 0, 'skipped': 0, 'failed': 0}
+        assert server.ranges('/media/SIYAH2_1.ts') == [None, None]
+
+        # A second run only asks for the sizes
+        requests_before = len(server.requests)
+        counts = download_ts_files_from_playlist("SIYAH2", server.url('/media/'), folder, session, workers=2)
+        assert counts == {'downloaded': 0, 'resumed': 0, 'skipped': 4, 'failed': 0}
+        assert {method for method, _, _ in server.requests[requests_before:]} == {'GET', 'HEAD'}
+        assert len(server.ranges('/media/SIYAH2_1.ts')) == 2
+    session.close()
+    for path, body in SEGMENTS.items():
+        with open(os.path.join(folder, os.path.basename(path)), 'rb') as f:
+            assert f.read() == body
@@ -0,0 +1,101 @@
+import hashlib
+import os
+from fixture_server import FixtureServer
+from videoFetcher import CrawlManifest, crawl
+
+def page(label):
+    word = f'<span style="color:#2D5AC3">{label}</span>' if label else ''
+    return f'<html><body><h1>TID</h1>{word}</body></html>'.encode('utf-8')
+
+VIDEOS = {page_id: os.urandom(30000 + page_id) for page_id in (3, 4, 6)}
+
+def fixture_files():
+    files = {
+        '/tid/?v=3': page('Anne'),
+        '/tid/?v=4': page('Baba'),
+        '/tid/?v=5': page(None),
+        '/tid/?v=6': page('Anne'),
+        '/tid/?v=7': page('Dede'),
+    }
+    files.update({f'/videos/{page_id}.mp4': body for page_id, body in VIDEOS.items()})
+    return files
+
+def run(server, root, recheck=False):
+    return crawl(range(3, 8), root, workers=3, page_url=server.url('/tid/?v='), video_url=server.url('/videos/'), recheck=recheck)
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_crawl_is_incremental(tmp_path):
+    root = str(tmp_path / 'videos')
+    with FixtureServer(fixture_files()) as server:
+        # Page 7 has a label but no video
+        assert run(server, root) == {'kept': 0, 'downloaded': 3, 'no_label': 1, 'failed': 1}
+        entries = CrawlManifest(root).entries
+        # Two pages share a label; the later claim gets the page id as a suffix
+        assert sorted(os.path.basename(entries[key]['path']) for key in ('3', '6')) == ['Anne.mp4', 'Anne_6.mp4']
+        for key in ('3', '4', '6'):
+            assert read(entries[key]['path']) == VIDEOS[int(key)]
+            assert entries[key]['sha256'] == hashlib.sha256(VIDEOS[int(key)]).hexdigest()
+        assert entries['5']['status'] == 'no_label'
+        assert entries['7']['status'] == 'failed'
+
+        # A re-run only retries the failed page
+        before = len(server.requests)
+        assert run(server, root) == {'kept': 4, 'downloaded': 0, 'no_label': 0, 'failed': 1}
+        assert sorted(path for _, path, _ in server.requests[before:]) == ['/tid/?v=7', '/videos/7.mp4']
+
+        # --recheck fetches only the video that changed on the server
+        new_video = os.urandom(41000)
+        server.files['/videos/4.mp4'] = new_video
+        before = len(server.requests)
+        assert run(server, root, recheck=True) == {'kept': 2, 'downloaded': 1, 'no_label': 1, 'failed': 1}
+        video_gets = [path for method, path, _ in server.requests[before:] if method == 'GET' and path.startswith('/videos/')]
+        assert sorted(video_gets) == ['/videos/4.mp4', '/videos/7.mp4']
+        entry = CrawlManifest(root).entries['4']
+        assert read(entry['path']) == new_video
+        assert entry['size'] == len(new_video)
+
+def test_failed_recheck_keeps_the_old_video_and_its_path(tmp_path):
+    root = str(tmp_path / 'videos')
+    with FixtureServer(fixture_files()) as server:
+        run(server, root)
+        old_path = CrawlManifest(root).entries['3']['path']
+
+        server.files['/videos/3.mp4'] = os.urandom(50000)
+        # The HEAD of the change check goes through, the download itself fails
+        server.fail['/videos/3.mp4'] = [None, 404]
+        counts = run(server, root, recheck=True)
+        assert counts['failed'] == 2
+        entry = CrawlManifest(root).entries['3']
+        assert entry['status'] == 'failed'
+        assert entry['path'] == old_path
+        assert read(old_path) == VIDEOS[3]
+        assert not os.path.exists(old_path + '.part')
+
+        # The failed page keeps its file name; the other 'Anne' page does not take it over
+        run(server, root)
+        entries = CrawlManifest(root).entries
+        assert entries['3']['path'] == old_path
+        assert os.path.basename(entries['6']['path']) == 'Anne_6.mp4'
+
+def test_interrupted_download_resumes_on_the_next_run(tmp_path):
+    root = str(tmp_path / 'videos')
+    video = os.urandom(300000)
+    # The crawler writes 64 KiB chunks, so the connection is dropped on a chunk boundary
+    drop_at = 2 * 65536
+    with FixtureServer({'/tid/?v=3': page('Anne'), '/videos/3.mp4': video}) as server:
+        server.drop['/videos/3.mp4'] = drop_at
+        # The retry after the drop fails for good, leaving the part file behind
+        server.fail['/videos/3.mp4'] = [None, 404]
+        crawl([3], root, workers=1, page_url=server.url('/tid/?v='), video_url=server.url('/videos/'))
+        entry = CrawlManifest(root).entries['3']
+        assert entry['status'] == 'failed'
+        assert os.path.getsize(entry['path'] + '.part') == drop_at
+
+        before = len(server.requests)
+        assert crawl([3], root, workers=1, page_url=server.url('/tid/?v='), video_url=server.url('/videos/')) == {'kept': 0, 'downloaded': 1, 'no_label': 0, 'failed': 0}
+        assert server.ranges('/videos/3.mp4')[-1] == f'bytes={drop_at}-'
+        assert len([request for request in server.requests[before:] if request[1] == '/videos/3.mp4']) == 1
+        assert read(CrawlManifest(root).entries['3']['path']) == video
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import struct
+import pytest
+from landmark_arrays import FrameLandmarks
+from landmark_codec import HEADER, HEADER_V1, LandmarkEncoder, encode_schema
+from WebSocketServer import websoc
+
+class FakeWebSocket:
+    """
+    Stand-in connection: records what is sent to it, and can hold sends until released.
+    """
+
+    def __init__(self, path='/', incoming=()):
+        self.remote_address = ('127.0.0.1', id(self) % 65536)
+        self.request = type('Request', (), {'path': path})()
+        self.sent = []
+        self.released = asyncio.Event()
+        self.released.set()
+        self._incoming = asyncio.Queue()
+        for message in incoming:
+            self._incoming.put_nowait(message)
+
+    async def send(self, message):
+        await self.released.wait()
+        self.sent.append(message)
+
+    def receive(self, message):
+        self._incoming.put_nowait(message)
+
+    def close(self):
+        self._incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self._incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+@pytest.fixture(autouse=True)
+def clean_server_state():
+    yield
+    websoc.PRODUCERS.clear()
+    websoc.CONSUMERS.clear()
+    websoc.SCHEMAS.clear()
+
+def frame(stream, encoding='float32'):
+    return LandmarkEncoder(encoding, stream).encode(FrameLandmarks(), {})
+
+def json_frame(stream_id, value):
+    return json.dumps({'stream_id': stream_id, 'value': value})
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def stalled_consumer():
+    # The first offer goes straight into a send that hangs until the socket is released
+    websocket = FakeWebSocket()
+    websocket.released.clear()
+    consumer = websoc.Consumer(websocket)
+    websoc.CONSUMERS.add(consumer)
+    sender = asyncio.ensure_future(consumer.run())
+    return websocket, consumer, sender
+
+def test_stream_key():
+    v2 = frame(5)
+    _, _, kind, encoding, presence, seq, timestamp, _ = HEADER.unpack_from(v2)
+    v1 = HEADER_V1.pack(b"MPLM", 1, kind, encoding, presence, seq, timestamp) + v2[HEADER.size:]
+    assert websoc.stream_key(v2) == 5
+    assert websoc.stream_key(encode_schema('int16', stream=7)) == 7
+    assert websoc.stream_key(v1) is None
+    assert websoc.stream_key(json_frame('cam1', 1)) == 'cam1'
+    assert websoc.stream_key(json.dumps({'value': 1})) is None
+    assert websoc.stream_key(json.dumps([1, 2])) is None
+    assert websoc.stream_key('not json') is None
+    assert websoc.STREAM_OFFSET == HEADER.size - struct.calcsize('<H')
+
+def test_newest_frame_per_producer_and_stream():
+    async def scenario():
+        websocket, consumer, sender = await stalled_consumer()
+        producer, other = object(), object()
+        websoc.publish(producer, json_frame('a', 1))
+        await settle()
+        for message in (json_frame('b', 1), json_frame('a', 2), json_frame('a', 3), json_frame('b', 2)):
+            websoc.publish(producer, message)
+        websoc.publish(other, json_frame('a', 1))
+        websocket.released.set()
+        await settle()
+        sender.cancel()
+        return websocket, consumer
+
+    websocket, consumer = asyncio.run(scenario())
+    delivered = [(data['stream_id'], data['value']) for data in map(json.loads, websocket.sent)]
+    # Replaced frames keep the place of the first one of their stream
+    assert delivered == [('a', 1), ('b', 2), ('a', 3), ('a', 1)]
+    assert (consumer.sent, consumer.dropped) == (4, 2)
+    assert consumer.lag_ms() == 0.0
+
+def test_schema_drops_pending_frames_of_its_stream_only():
+    async def scenario():
+        websocket, consumer, sender = await stalled_consumer()
+        producer = object()
+        websoc.publish(producer, frame(0))
+        await settle()
+        websoc.publish(producer, frame(0))
+        websoc.publish(producer, frame(1))
+        schema = encode_schema('int16', stream=0)
+        websoc.publish(producer, schema)
+        websocket.released.set()
+        await settle()
+        sender.cancel()
+        return websocket, consumer, schema
+
+    websocket, consumer, schema = asyncio.run(scenario())
+    assert [websoc.stream_key(message) for message in websocket.sent] == [0, 0, 1]
+    # The schema overtakes the frames still waiting
+    assert websocket.sent[1] == schema
+    assert (consumer.sent, consumer.dropped) == (2, 1)
+
+def test_lag_grows_while_the_client_stalls():
+    async def scenario():
+        websocket, consumer, sender = await stalled_consumer()
+        websoc.publish(object(), json_frame('a', 1))
+        await asyncio.sleep(0.05)
+        lag_ms = consumer.lag_ms()
+        websocket.released.set()
+        await settle()
+        sender.cancel()
+        return lag_ms, consumer
+
+    lag_ms, consumer = asyncio.run(scenario())
+    assert lag_ms >= 50
+    assert consumer.max_lag_ms >= 50
+    assert consumer.lag_ms() == 0.0
+
+def test_late_consumers_get_every_stream_schema():
+    async def scenario():
+        schemas = [encode_schema('float32', stream=0), encode_schema('int16', stream=1)]
+        producer = FakeWebSocket(websoc.PRODUCER_PATH, incoming=schemas + [frame(1, 'int16')])
+        producer_task = asyncio.ensure_future(websoc.msg_handler(producer))
+        await settle()
+        stored = dict(websoc.SCHEMAS)
+
+        late = FakeWebSocket('/view')
+        consumer_task = asyncio.ensure_future(websoc.msg_handler(late))
+        await settle()
+        received = list(late.sent)
+        late.close()
+        producer.close()
+        await asyncio.gather(producer_task, consumer_task)
+        return schemas, stored, received, producer
+
+    schemas, stored, received, producer = asyncio.run(scenario())
+    assert stored == {(producer, 0): schemas[0], (producer, 1): schemas[1]}
+    assert received == schemas
+    # A producer that disconnects takes its schemas along
+    assert websoc.SCHEMAS == {}
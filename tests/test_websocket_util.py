@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+import websockets
+from websocket_util import WebSocketPublisher
+
+class Receiver:
+    """
+    Local WebSocket server that records every message it receives.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+
+    async def _serve(self):
+        async def handler(websocket):
+            async for message in websocket:
+                self.messages.append(message)
+        self._stop = asyncio.get_running_loop().create_future()
+        async with websockets.serve(handler, '127.0.0.1', 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._loop = asyncio.get_running_loop()
+            self._started.set()
+            await self._stop
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.messages
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._stop.set_result, None)
+        self._thread.join(5)
+
+def test_hellos_go_first_on_every_connection():
+    receiver = Receiver()
+    publisher = WebSocketPublisher(f"ws://127.0.0.1:{receiver.port}", hello='H')
+    publisher.set_hello('S0', key=0)
+    publisher.set_hello('S1', key=1)
+    publisher.publish('a')
+    publisher.start()
+    try:
+        assert receiver.wait_for(4) == ['H', 'S0', 'S1', 'a']
+    finally:
+        publisher.close()
+        receiver.close()
+
+def test_changed_hello_follows_the_messages_queued_before_it():
+    receiver = Receiver()
+    publisher = WebSocketPublisher(f"ws://127.0.0.1:{receiver.port}").start()
+    try:
+        publisher.set_hello('S0', key=0)
+        publisher.publish('a')
+        assert receiver.wait_for(2) == ['S0', 'a']
+        # Hold the sender so the next messages queue up behind each other
+        publisher._loop.call_soon_threadsafe(time.sleep, 0.3)
+        time.sleep(0.05)
+        publisher.publish('b')
+        publisher.publish('c')
+        publisher.set_hello('T0', key=0)
+        publisher.set_hello('S1', key=1)
+        publisher.publish('d')
+        # An unchanged hello is not sent again
+        publisher.set_hello('S1', key=1)
+        assert receiver.wait_for(7) == ['S0', 'a', 'b', 'c', 'T0', 'S1', 'd']
+        time.sleep(0.1)
+        assert len(receiver.messages) == 7
+    finally:
+        publisher.close()
+        receiver.close()
@@ -1,11 +1,14 @@
 import os
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import cv2
 import re
+import numpy as np
 import lm_indices as ids
 
 # Function to resize image while maintaining aspect ratio
-def resize_to_fullscreen(image, screen_width, screen_height):
+def resize_to_fullscreen(image, screen_width, screen_height, out=None):
     """
     Resizes an image to fit within the dimensions of a screen, preserving the aspect ratio.
 
@@ -21,6 +24,9 @@ def resize_to_fullscreen(image, screen_width, screen_height):
             The width of the screen.
         screen_height (int): 
             The height of the screen.
+        out (numpy.ndarray, optional):
+            Preallocated display buffer to resize into, reused when it has the right shape and
+            type. Default is None (a new array).
 
     Returns:
         numpy.ndarray: The resized image that fits within the screen dimensions.
@@ -40,9 +46,47 @@ def resize_to_fullscreen(image, screen_width, screen_height):
         new_width = screen_width
         new_height = int(screen_width / aspect_ratio)
 
+    if out is not None and out.shape == (new_height, new_width) + image.shape[2:] and out.dtype == image.dtype:
+        return cv2.resize(image, (new_width, new_height), dst=out)
     resized_image = cv2.resize(image, (new_width, new_height))
     return resized_image
 
+def resize_to_inference(image, inference_size=None):
+    """
+    Shrinks a frame to the resolution the models should run at, preserving the aspect ratio.
+
+    The models see normalized coordinates, so landmarks found on the smaller frame can be drawn
+    on a frame of any size. Frames are never upscaled: the models shrink their input internally,
+    so enlarging it only costs time.
+
+    Args:
+        image (numpy.ndarray):
+            The input frame.
+        inference_size (int or tuple, optional):
+            Longest side in pixels, or a (width, height) box to fit in. None keeps the native
+            resolution. Default is None.
+
+    Returns:
+        numpy.ndarray: The resized frame, or the input frame itself when it already fits.
+
+    Example:
+        >>> small = resize_to_inference(frame_1080p, 640)
+        >>> small.shape
+        (360, 640, 3)
+    """
+    if inference_size is None:
+        return image
+    img_height, img_width = image.shape[:2]
+    if isinstance(inference_size, int):
+        max_width = max_height = inference_size
+    else:
+        max_width, max_height = inference_size
+    scale = min(max_width / img_width, max_height / img_height)
+    if scale >= 1:
+        return image
+    new_size = (max(1, round(img_width * scale)), max(1, round(img_height * scale)))
+    return cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+
 # Function to get video name without extension
 def get_video_name(video_path):
     """
@@ -66,6 +110,9 @@ def get_video_name(video_path):
     video_name, _ = os.path.splitext(base_name)
     return video_name
 
+# HLS segments of one playlist: <NAME>_<index>.ts
+SEGMENT_PATTERN = re.compile(r'^(?P<name>.+)_(?P<index>\d+)\.ts$')
+
 def convert_ts_to_mp4(input_ts_file, output_mp4_file):
     """
     Converts a .ts file to .mp4 format using ffmpeg.
@@ -80,57 +127,179 @@ def convert_ts_to_mp4(input_ts_file, output_mp4_file):
             The path where the output .mp4 file will be saved.
 
     Returns:
-        None
+        bool: True if the conversion succeeded.
 
     Example:
         >>> convert_ts_to_mp4('/path/to/input.ts', '/path/to/output.mp4')
     """
-    # Command to convert .ts to .mp4 using ffmpeg
-    command = [
-        'ffmpeg',
-        '-i', input_ts_file,  # Input file
-        '-c:v', 'copy',  # Copy video codec (no re-encoding)
-        '-c:a', 'copy',  # Copy audio codec (no re-encoding)
-        output_mp4_file  # Output file
-    ]
+    return concat_ts_to_mp4([input_ts_file], output_mp4_file)
 
+def concat_ts_to_mp4(input_ts_files, output_mp4_file):
+    """
+    Joins .ts segments into one .mp4 file with ffmpeg, without re-encoding.
+
+    The segments are listed in a temporary file for ffmpeg's concat demuxer, which reads them
+    back to back, and the streams are copied into the MP4 container. Unlike the `concat:`
+    protocol URL the list file takes any path, including ones with '|' in them. The output is
+    written under a temporary name and renamed when complete, so an interrupted run never
+    leaves a truncated file that looks up to date.
+
+    Args:
+        input_ts_files (list of str):
+            The segments, in playback order.
+        output_mp4_file (str):
+            The path where the output .mp4 file will be saved.
+
+    Returns:
+        bool: True if the conversion succeeded.
+
+    Example:
+        >>> concat_ts_to_mp4(['ts/SIYAH2_0.ts', 'ts/SIYAH2_1.ts'], 'mp4/SIYAH2.mp4')
+    """
+    tmp_file = output_mp4_file + '.tmp'
+    list_file = None
     try:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            list_file = f.name
+            f.write(concat_list(input_ts_files))
+        # Command to join and remux the segments using ffmpeg
+        command = [
+            'ffmpeg', '-nostdin', '-y', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0', '-i', list_file,  # Segments read back to back; -safe 0 allows absolute paths
+            '-c', 'copy',  # Copy every stream (no re-encoding)
+            '-f', 'mp4', tmp_file  # Output file
+        ]
         # Execute the ffmpeg command
         subprocess.run(command, check=True)
-        print(f"Conversion successful: {input_ts_file} to {output_mp4_file}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error during conversion: {e}")
+        os.replace(tmp_file, output_mp4_file)
+        print(f"Conversion successful: {len(input_ts_files)} segment(s) to {output_mp4_file}")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Error during conversion of {output_mp4_file}: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return False
+    finally:
+        if list_file is not None:
+            os.remove(list_file)
+
+def concat_list(paths):
+    """
+    Returns the input list of ffmpeg's concat demuxer for a list of files.
 
-def batch_convert_ts_to_mp4(input_folder, output_folder):
+    The paths are made absolute, since the demuxer resolves relative ones against the list
+    file, and quoted; a quote inside a path is written as '\\''.
+
+    Example:
+        >>> print(concat_list(['/ts/SIYAH2_0.ts', "/ts/it's_1.ts"]))
+        file '/ts/SIYAH2_0.ts'
+        file '/ts/it'\\''s_1.ts'
+    """
+    lines = []
+    for path in paths:
+        quoted = os.path.abspath(path).replace("'", "'\\''")
+        lines.append(f"file '{quoted}'\n")
+    return ''.join(lines)
+
+def group_segments(input_folder):
+    """
+    Groups the .ts files of a folder by playlist.
+
+    Segments named `<NAME>_<index>.ts` belong to playlist NAME and are ordered by their
+    numeric index, so `SIYAH2_10.ts` comes after `SIYAH2_9.ts`. Other .ts files form a group
+    of their own, named after the file. A file `NAME.ts` next to segments of playlist NAME
+    would need the same output name, so the clash is refused rather than joining them.
+
+    Args:
+        input_folder (str):
+            The folder containing the .ts files.
+
+    Returns:
+        dict: Playlist name mapped to the list of its segment paths, in playback order.
+
+    Raises:
+        ValueError: If a file without an index has the name of a playlist.
+
+    Example:
+        >>> group_segments('ts')
+        {'SIYAH2': ['ts/SIYAH2_0.ts', 'ts/SIYAH2_1.ts', 'ts/SIYAH2_2.ts'], ...}
+    """
+    groups = {}
+    singles = {}
+    for filename in os.listdir(input_folder):
+        if not filename.endswith('.ts'):
+            continue
+        path = os.path.join(input_folder, filename)
+        match = SEGMENT_PATTERN.match(filename)
+        if match:
+            groups.setdefault(match.group('name'), []).append((int(match.group('index')), path))
+        else:
+            singles[filename[:-3]] = path
+    clashes = sorted(set(groups) & set(singles))
+    if clashes:
+        raise ValueError(f"Files without a segment index share the name of a playlist in {input_folder}: "
+                         + ', '.join(name + '.ts' for name in clashes))
+    groups.update((name, [(0, path)]) for name, path in singles.items())
+    return {name: [path for _, path in sorted(segments)] for name, segments in sorted(groups.items())}
+
+def is_up_to_date(output_file, input_files):
+    """
+    Tells whether an output file exists and is newer than all of its inputs.
+    """
+    if not os.path.exists(output_file):
+        return False
+    output_mtime = os.path.getmtime(output_file)
+    return all(os.path.getmtime(path) <= output_mtime for path in input_files)
+
+def batch_convert_ts_to_mp4(input_folder, output_folder, workers=None, group_playlists=True):
     """
     Converts all .ts files in the input folder to .mp4 format and saves them to the output folder.
 
-    This function iterates over all the files in the specified input folder. For each file with a .ts extension,
-    it calls the convert_ts_to_mp4 function to convert it to .mp4 format and saves the converted file
-    in the specified output folder.
+    By default the segments of each playlist are joined into one `<NAME>.mp4`, so a sign
+    word is one whole video downstream instead of several fragments. Conversions run as
+    parallel ffmpeg processes, at most `workers` at a time; outputs newer than all of their
+    segments are skipped.
 
     Args:
         input_folder (str): 
             The path to the folder containing the .ts files to be converted.
         output_folder (str): 
             The path to the folder where the converted .mp4 files will be saved.
+        workers (int, optional):
+            ffmpeg processes running at once. Default is the CPU count.
+        group_playlists (bool, optional):
+            Join the segments of each playlist. False converts every .ts file on its own. Default is True.
 
     Returns:
-        None
+        dict: Output path mapped to 'converted', 'skipped' or 'failed'.
 
     Example:
-        >>> batch_convert_ts_to_mp4('/path/to/ts_files', '/path/to/mp4_files')
+        >>> batch_convert_ts_to_mp4('/path/to/ts_files', '/path/to/mp4_files', workers=4)
     """
     # Ensure output directory exists
     os.makedirs(output_folder, exist_ok=True)
 
-    # Iterate over all files in the input folder
-    for filename in os.listdir(input_folder):
-        if filename.endswith('.ts'):
-            input_ts_file = os.path.join(input_folder, filename)
-            output_mp4_file = os.path.join(output_folder, os.path.splitext(filename)[0] + '.mp4')
-            convert_ts_to_mp4(input_ts_file, output_mp4_file)
-            
+    if group_playlists:
+        groups = group_segments(input_folder)
+    else:
+        groups = {filename[:-3]: [os.path.join(input_folder, filename)] for filename in sorted(os.listdir(input_folder)) if filename.endswith('.ts')}
+
+    results = {}
+    jobs = {}
+    for name, segments in groups.items():
+        output_mp4_file = os.path.join(output_folder, name + '.mp4')
+        if is_up_to_date(output_mp4_file, segments):
+            results[output_mp4_file] = 'skipped'
+        else:
+            jobs[output_mp4_file] = segments
+
+    # Each job is an ffmpeg process; the threads only wait for them
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = {executor.submit(concat_ts_to_mp4, segments, output_mp4_file): output_mp4_file for output_mp4_file, segments in jobs.items()}
+        for future in as_completed(futures):
+            results[futures[future]] = 'converted' if future.result() else 'failed'
+    return results
+
 def repeated_container_to_list(container):
     """
     Converts a RepeatedCompositeContainer to a list of dictionaries.
@@ -233,17 +402,29 @@ def extract_coordinates_with_max_possible(landmark):
     return landmark_coordinates
 
 def draw_circle_on_coord(input_frame,landmark_coordinates,COLOR_DOTS):
-    output_frame = input_frame.copy()
-    num_landmarks = len(landmark_coordinates)
-    for constant in ids.hand_constants:
-        if constant < num_landmarks:
-            # Get the coordinates of the current constant
-            coordinates = landmark_coordinates[constant]
-            if coordinates is not None:
-                x = coordinates[ids.X]
-                y = coordinates[ids.Y]
-                # Check if both x and y coordinates are not None
-                if x is not None and y is not None:
-                    # Draw a circle
-                    cv2.circle(output_frame, (int(x*input_frame.shape[ids.W]), int(y*input_frame.shape[ids.H])), 10, COLOR_DOTS, 1)
-    return output_frame
\ No newline at end of file
+    """
+    Draws a circle on every hand landmark of a frame, in place.
+
+    Args:
+        input_frame (numpy.ndarray):
+            The frame to draw on. Copy it first to keep the original.
+        landmark_coordinates (numpy.ndarray or list):
+            (21, 3) array of normalized hand landmarks, or a list of (x, y, z) tuples.
+            None or an empty sequence draws nothing.
+        COLOR_DOTS (tuple):
+            BGR color of the circles.
+
+    Returns:
+        numpy.ndarray: `input_frame` with the circles drawn on it.
+
+    Example:
+        >>> output_frame = draw_circle_on_coord(frame, frame_lms.hands[LEFT], COLOR_DOTS=(255, 0, 0))
+    """
+    if landmark_coordinates is None or len(landmark_coordinates) == 0:
+        return input_frame
+    points = np.asarray(landmark_coordinates, dtype=np.float32)[ids.hand_constants[:len(landmark_coordinates)], :2]
+    # Scale normalized x, y to pixels in one pass
+    points = (points * (input_frame.shape[ids.W], input_frame.shape[ids.H])).astype(np.int32)
+    for x, y in points.tolist():
+        cv2.circle(input_frame, (x, y), 10, COLOR_DOTS, 1)
+    return input_frame
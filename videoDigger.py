@@ -1,18 +1,26 @@
 import os
-import requests
+from urllib.parse import urljoin
 import m3u8
-    
-def download_ts_files_from_playlist(ts_file, base_url="https://turkisaretdili.net/media/", download_folder="ts"):
+from http_util import download_many, make_session, request_with_retries
+
+def download_ts_files_from_playlist(ts_file, base_url="https://turkisaretdili.net/media/", download_folder="ts", session=None, workers=8):
     """
     Downloads .ts files from an .m3u8 playlist.
 
+    The segments are downloaded concurrently over one pooled session and streamed to disk.
+    Segments already on disk with the remote size are skipped and interrupted ones are resumed,
+    so running it again only fetches what is missing.
+
     Args:
         ts_file (str): The name of the .m3u8 playlist file.
         base_url (str): The base URL where the .m3u8 playlist and .ts files are located. Default is "https://turkisaretdili.net/media/".
         download_folder (str): The folder where the downloaded .ts files will be saved. Default is "ts".
+        session (requests.Session, optional): Session shared across playlists. Default is a new one from `http_util.make_session`.
+        workers (int, optional): Segments downloaded at the same time. Default is 8.
 
     Returns:
-        None
+        dict: Number of segments per status ('downloaded', 'resumed', 'skipped', 'failed'),
+        or None if the playlist could not be fetched.
 
     Raises:
         None
@@ -21,35 +29,39 @@ def download_ts_files_from_playlist(ts_file, base_url="https://turkisaretdili.ne
         >>> download_ts_files_from_playlist("SIYAH2")
         Downloaded SIYAH2_0.ts to ts
         Downloaded SIYAH2_1.ts to ts
-        Downloaded SIYAH2_2.ts to ts
+        Skipped SIYAH2_2.ts, already in ts
         ...
     """
+    if session is None:
+        session = make_session(workers)
+
     # Send an HTTP GET request to download the .m3u8 playlist
     m3u8_url = base_url + ts_file + ".m3u8"
     print(m3u8_url)
-    response = requests.get(m3u8_url)
+    try:
+        response = request_with_retries(session, 'GET', m3u8_url)
+    except OSError as e:
+        print(f"Failed to download the .m3u8 playlist from {m3u8_url}: {e}")
+        return None
     if response.status_code != 200:
         print(f"Failed to download the .m3u8 playlist from {m3u8_url}")
-        return
+        return None
 
     # Parse the .m3u8 playlist
     playlist = m3u8.loads(response.text)
-    # Iterate over the segments in the playlist
+    jobs = []
     for segment in playlist.segments:
-        print(segment.uri)
-        ts_url = base_url + segment.uri
-        ts_filename = os.path.basename(ts_url)
+        ts_url = urljoin(m3u8_url, segment.uri)
+        jobs.append((ts_url, os.path.join(download_folder, os.path.basename(ts_url))))
 
-        # Send an HTTP GET request to download the .ts file
-        response_ts = requests.get(ts_url)
-        if response_ts.status_code == 200:
-            # Construct the path to save the file in the download folder
-            file_path = os.path.join(download_folder, ts_filename)
-
-            # Save the content of the response to the file
-            with open(file_path, "wb") as f:
-                f.write(response_ts.content)
-
-            print(f"Downloaded {ts_filename} to {download_folder}")
+    counts = dict.fromkeys(('downloaded', 'resumed', 'skipped', 'failed'), 0)
+    for result in download_many(session, jobs, workers):
+        ts_filename = os.path.basename(result['path'])
+        counts[result['status']] += 1
+        if result['status'] == 'skipped':
+            print(f"Skipped {ts_filename}, already in {download_folder}")
+        elif result['status'] == 'failed':
+            print(f"Failed to download {ts_filename}: {result['error']}")
         else:
-            print(f"Failed to download {ts_filename}")
\ No newline at end of file
+            print(f"Downloaded {ts_filename} to {download_folder}")
+    return counts
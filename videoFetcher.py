@@ -1,21 +1,31 @@
+import argparse
+import json
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 from bs4 import BeautifulSoup
-import re
+from http_util import DownloadError, download_file, file_hash, make_session, request_with_retries
 
 # Base URL for video pages and video files
 base_page_url = "https://www.cmpe.boun.edu.tr/tid/?v="
 base_video_url = "https://www.cmpe.boun.edu.tr/tid/videos/mp4/"
 
-# Directory to save videos
-os.makedirs('videos', exist_ok=True)
+# Page ids of the dictionary
+FIRST_PAGE = 3
+LAST_PAGE = 1354
+
+MANIFEST_FILE = 'manifest.json'
+# Manifest entries are written to disk after every this many finished pages
+SAVE_EVERY = 20
 
 def sanitize_filename(name):
     """
     Sanitizes a string to make it suitable for use as a file name.
 
     This function removes characters that are not allowed in file names according to
-    common file system conventions. It replaces characters such as '<', '>', ':', '"', 
+    common file system conventions. It replaces characters such as '<', '>', ':', '"',
     '/', '\\', '|', '?', and '*' with an empty string.
 
     Args:
@@ -33,34 +43,227 @@ def sanitize_filename(name):
     # Remove invalid characters for file names
     return re.sub(r'[<>:"/\\|?*]', '', name)
 
-for i in range(3, 1355):
-    page_url = base_page_url + str(i)
-    video_url = base_video_url + str(i) + ".mp4"
-
-    response = requests.get(page_url)
-    
-    if response.status_code != 200:
-        print(f"Failed to retrieve page {i}")
-        continue
-
-    soup = BeautifulSoup(response.content, 'html.parser')
+def parse_label(html):
+    """
+    Finds the word label on a video page, or None when the page has none.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
 
     # Find the tag with the required style
     tag = soup.find('span', style="color:#2D5AC3")
     if not tag:
-        print(f"No tag found on page {i}")
-        continue
-
-    # Download the video
-    video_response = requests.get(video_url)
-    if video_response.status_code == 200:
-        tag_text = tag.text.strip().replace(' ', '_')
-        sanitized_tag_text = sanitize_filename(tag_text)
-        video_path = os.path.join('videos', f"{sanitized_tag_text}.mp4")
-        with open(video_path, 'wb') as video_file:
-            video_file.write(video_response.content)
-        print(f"Downloaded video {i} as {video_path}")
-    else:
-        print(f"Failed to download video from {video_url}")
-
-print("Download completed.")
\ No newline at end of file
+        return None
+    return sanitize_filename(tag.text.strip().replace(' ', '_'))
+
+class CrawlManifest:
+    """
+    Persistent record of the crawl: page id -> label, URL, file, size, hash, status and validators.
+
+    Entries are updated from the crawler threads under a lock and written atomically, so an
+    interrupted crawl keeps everything finished before it and the next run continues from there.
+
+    Statuses:
+        'done': The video is on disk; 'etag' and 'last_modified' are kept for the change check.
+        'no_label': The page has no word label, so there is nothing to download.
+        'failed': The page or the video could not be fetched; 'error' says why. Retried on every run.
+
+    Args:
+        root (str): Download folder; the manifest is `<root>/manifest.json`.
+
+    Example:
+        >>> manifest = CrawlManifest('videos')
+        >>> manifest.entries['42']
+        {'label': 'Anne', 'url': '.../42.mp4', 'path': 'videos/Anne.mp4', 'size': 412331, 'sha256': '...', 'status': 'done', ...}
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)['entries']
+        else:
+            self.entries = {}
+        # File path -> owning page id, including pages still downloading
+        self._owners = {entry['path']: key for key, entry in self.entries.items() if entry.get('path')}
+
+    def get(self, page_id):
+        with self._lock:
+            entry = self.entries.get(str(page_id))
+            return dict(entry) if entry is not None else None
+
+    def update(self, page_id, entry):
+        with self._lock:
+            self.entries[str(page_id)] = entry
+
+    def claim_path(self, page_id, label):
+        """
+        Returns the file path for a label, suffixed with the page id when another page already owns it.
+        """
+        path = os.path.join(self.root, f"{label}.mp4")
+        with self._lock:
+            if self._owners.setdefault(path, str(page_id)) != str(page_id):
+                path = os.path.join(self.root, f"{label}_{page_id}.mp4")
+                self._owners[path] = str(page_id)
+            return path
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'entries': self.entries}, indent=1, ensure_ascii=False, sort_keys=True)
+        # Write next to the target and rename, so an interrupted save never corrupts the manifest
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+def _unchanged(session, entry, timeout=30):
+    # Conditional HEAD: 304, or the same validators and size, means the stored file is current
+    if not os.path.exists(entry['path']) or os.path.getsize(entry['path']) != entry['size']:
+        return False
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    response = request_with_retries(session, 'HEAD', entry['url'], timeout=timeout, headers=headers, allow_redirects=True)
+    if response.status_code == 304:
+        return True
+    if response.status_code != 200:
+        return False
+    etag = response.headers.get('ETag')
+    if etag is not None and entry.get('etag') is not None:
+        return etag == entry['etag']
+    length = response.headers.get('Content-Length')
+    return length is not None and int(length) == entry['size']
+
+def crawl_page(session, manifest, page_id, page_url=base_page_url, video_url=base_video_url, recheck=False):
+    """
+    Brings one page up to date: skips it when its manifest entry is current, else fetches its
+    label and video.
+
+    Args:
+        session (requests.Session): Shared pooled session.
+        manifest (CrawlManifest): The crawl manifest; the page's entry is replaced.
+        page_id (int): Page id.
+        page_url (str, optional): Page URL prefix. Default is `base_page_url`.
+        video_url (str, optional): Video URL prefix. Default is `base_video_url`.
+        recheck (bool, optional): Also ask the server whether 'done' videos changed, and re-read
+            'no_label' pages. Default is False (both are trusted).
+
+    Returns:
+        str: What happened: 'kept', 'downloaded', 'no_label' or 'failed'.
+    """
+    entry = manifest.get(page_id)
+    if entry is not None and entry['status'] == 'no_label' and not recheck:
+        return 'kept'
+    url = video_url + str(page_id) + ".mp4"
+    path = entry.get('path') if entry is not None else None
+    # Only a finished video that changed on the server is downloaded over; anything else resumes its part file
+    changed = False
+    try:
+        if entry is not None and entry['status'] == 'done':
+            if not recheck and os.path.exists(entry['path']) and os.path.getsize(entry['path']) == entry['size']:
+                return 'kept'
+            if recheck:
+                if _unchanged(session, entry):
+                    return 'kept'
+                changed = True
+
+        label = entry['label'] if entry is not None and entry.get('label') else None
+        if label is None:
+            response = request_with_retries(session, 'GET', page_url + str(page_id))
+            if response.status_code != 200:
+                raise DownloadError(f"page {page_id}: HTTP {response.status_code}")
+            label = parse_label(response.content)
+        if label is None:
+            manifest.update(page_id, {'label': None, 'url': url, 'status': 'no_label'})
+            return 'no_label'
+
+        path = manifest.claim_path(page_id, label)
+        # A changed file is replaced once the new download is complete
+        result = download_file(session, url, path, overwrite=changed and entry.get('path') == path)
+    except (DownloadError, requests.RequestException, OSError) as e:
+        # The path stays claimed, so no other page takes over its file on the next run
+        failed = {'label': entry.get('label') if entry else None, 'url': url, 'status': 'failed', 'error': str(e)}
+        if path is not None:
+            failed['path'] = path
+        manifest.update(page_id, failed)
+        return 'failed'
+
+    manifest.update(page_id, {
+        'label': label,
+        'url': url,
+        'path': path,
+        'size': result['size'],
+        'sha256': file_hash(path),
+        'etag': result['etag'],
+        'last_modified': result['last_modified'],
+        'status': 'done',
+    })
+    return 'downloaded'
+
+def crawl(pages, output_dir='videos', workers=8, page_url=base_page_url, video_url=base_video_url, recheck=False):
+    """
+    Crawls many pages concurrently over one pooled session, keeping the manifest up to date.
+
+    Only pages that are missing, failed before or, with `recheck`, changed on the server are
+    fetched; a re-run of a finished crawl sends no requests at all without `recheck`.
+
+    Args:
+        pages (iterable of int): Page ids.
+        output_dir (str, optional): Folder of the videos and the manifest. Default is 'videos'.
+        workers (int, optional): Pages processed at the same time. Default is 8.
+        page_url (str, optional): Page URL prefix. Default is `base_page_url`.
+        video_url (str, optional): Video URL prefix. Default is `base_video_url`.
+        recheck (bool, optional): See `crawl_page`. Default is False.
+
+    Returns:
+        dict: Number of pages per outcome ('kept', 'downloaded', 'no_label', 'failed').
+
+    Example:
+        >>> crawl(range(3, 1355), 'videos', workers=16)
+        {'kept': 1240, 'downloaded': 12, 'no_label': 100, 'failed': 0}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = CrawlManifest(output_dir)
+    session = make_session(workers)
+    counts = dict.fromkeys(('kept', 'downloaded', 'no_label', 'failed'), 0)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Crawler") as executor:
+            futures = {executor.submit(crawl_page, session, manifest, page_id, page_url, video_url, recheck): page_id for page_id in pages}
+            for finished, future in enumerate(as_completed(futures), 1):
+                page_id = futures[future]
+                outcome = future.result()
+                counts[outcome] += 1
+                if outcome == 'downloaded':
+                    print(f"Downloaded video {page_id} as {manifest.get(page_id)['path']}")
+                elif outcome == 'no_label':
+                    print(f"No tag found on page {page_id}")
+                elif outcome == 'failed':
+                    print(f"Failed page {page_id}: {manifest.get(page_id)['error']}")
+                if finished % SAVE_EVERY == 0:
+                    manifest.save()
+    finally:
+        manifest.save()
+        session.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental, concurrent download of the TID dictionary videos.")
+    parser.add_argument('-o', '--output', default='videos', help="Download folder, also holding manifest.json (default: videos)")
+    parser.add_argument('--first', type=int, default=FIRST_PAGE, help=f"First page id (default: {FIRST_PAGE})")
+    parser.add_argument('--last', type=int, default=LAST_PAGE, help=f"Last page id (default: {LAST_PAGE})")
+    parser.add_argument('-j', '--workers', type=int, default=8, help="Concurrent pages (default: 8)")
+    parser.add_argument('--recheck', action='store_true', help="Ask the server whether downloaded videos changed, and re-read pages without a label")
+    parser.add_argument('--page-url', default=base_page_url, help="Page URL prefix, e.g. of a local mirror")
+    parser.add_argument('--video-url', default=base_video_url, help="Video URL prefix, e.g. of a local mirror")
+    args = parser.parse_args()
+    counts = crawl(range(args.first, args.last + 1), args.output, args.workers, args.page_url, args.video_url, args.recheck)
+    print(f"Download completed: {counts['downloaded']} downloaded, {counts['kept']} up to date, "
+          f"{counts['no_label']} without a label, {counts['failed']} failed.")
+    if counts['failed']:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
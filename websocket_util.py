@@ -1,27 +1,280 @@
 # WebSocket Client
+import asyncio
+import collections
+import threading
 import websockets
+from instrumentation import now, registry as metrics
 
 ws_address = "ws://localhost:8765"
+# The server forwards messages sent to this path to its consumers (see WebSocketServer/websoc.py)
+producer_address = ws_address + "/producer"
 
 # Send message
 async def send(message):
     """
-    Sends a message to a WebSocket server and waits for a response.
+    Sends a message to the WebSocket server as a producer.
+
+    Opens a new connection for every call. For per-frame streaming use `get_publisher()` instead.
+    The server does not echo producer messages, so nothing is waited for after the send.
 
     Args:
         message: The message to send to the WebSocket server.
 
     Returns:
-        str: The response received from the WebSocket server.
+        None
 
     Raises:
         websockets.exceptions.WebSocketException: If an error occurs during the WebSocket communication.
 
     Example:
-        >>> response = await send("Hello, WebSocket!")
-        >>> print(response)
-        "Received: Hello, WebSocket!"
+        >>> await send("Hello, WebSocket!")
     """
-    async with websockets.connect(ws_address) as websocket:
+    async with websockets.connect(producer_address) as websocket:
         await websocket.send(str(message))
-        await websocket.recv()
\ No newline at end of file
+
+class WebSocketPublisher:
+    """
+    Long-lived, non-blocking WebSocket sender.
+
+    A background thread runs its own event loop that keeps one connection open and reconnects
+    with exponential backoff. `publish()` only appends to a bounded queue; when the queue is
+    full the oldest message is dropped, so the caller never waits on the network.
+
+    Hello messages, such as the schema of a binary stream, are kept per key (see `set_hello`)
+    and sent first on every connection. One that changes while connected is sent right after
+    the messages queued before the change, so frames are never read with the wrong schema.
+
+    Args:
+        address (str, optional): WebSocket server URL. Default is `producer_address`.
+        max_queue (int, optional): Number of messages kept while the connection is slow or down. Default is 8.
+        min_backoff (float, optional): First reconnect delay in seconds. Default is 0.5.
+        max_backoff (float, optional): Upper bound of the reconnect delay in seconds. Default is 10.0.
+        hello (str or bytes, optional): Hello message under the key None. Default is None.
+
+    Attributes:
+        sent (int): Messages written to the socket.
+        dropped (int): Messages discarded because the queue was full.
+        reconnects (int): Connection attempts after the first one.
+
+    Example:
+        >>> publisher = WebSocketPublisher()
+        >>> publisher.start()
+        >>> publisher.publish(json.dumps(session.data))
+        >>> publisher.close()
+    """
+
+    def __init__(self, address=producer_address, max_queue=8, min_backoff=0.5, max_backoff=10.0, hello=None):
+        self.address = address
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._queue = collections.deque(maxlen=max_queue)
+        self._lock = threading.Lock()
+        # key -> hello message; key -> [message, queued messages still ahead of it] for changes not sent yet
+        self._hellos = {} if hello is None else {None: hello}
+        self._hellos_due = {}
+        self._loop = None
+        self._wakeup = None
+        self._closing = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the background thread. Calling it again while running does nothing.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._closing = False
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="WebSocketPublisher", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def publish(self, message):
+        """
+        Queues a message for sending without blocking.
+
+        Args:
+            message (str or bytes): The message to send.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            was_empty = not self._queue
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+                metrics.count('ws_dropped')
+                self._advance_hellos()
+            self._queue.append(message)
+            metrics.gauge('ws_queue_depth', len(self._queue))
+        # The sender drains the queue until it is empty, so it only needs waking on the first message
+        if was_empty:
+            self._wake()
+
+    def set_hello(self, message, key=None):
+        """
+        Sets the hello message of a key, e.g. the schema of one stream.
+
+        Every hello is sent first on each connection. A new or changed one is also sent on the
+        open connection, after the messages queued so far and ahead of any published later.
+
+        Args:
+            message (str or bytes): The hello message; None removes the key's hello.
+            key (optional): What the message belongs to, e.g. a stream number. Default is None.
+        """
+        with self._lock:
+            if message is None:
+                self._hellos.pop(key, None)
+                self._hellos_due.pop(key, None)
+                return
+            if self._hellos.get(key) == message:
+                return
+            self._hellos[key] = message
+            self._hellos_due[key] = [message, len(self._queue)]
+        self._wake()
+
+    def _advance_hellos(self):
+        # Called with the lock held whenever the oldest queued message leaves the queue
+        for due in self._hellos_due.values():
+            if due[1]:
+                due[1] -= 1
+
+    def close(self, timeout=2.0):
+        """
+        Stops the background thread and closes the connection. Queued messages are discarded.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the thread to finish. Default is 2.0.
+        """
+        if self._thread is None:
+            return
+        self._closing = True
+        self._wake()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _wake(self):
+        # The loop thread clears `_loop` when it exits; a loop closing meanwhile raises RuntimeError
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass
+
+    def _run_loop(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        ready.set()
+        try:
+            self._loop.run_until_complete(self._connect_forever())
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _connect_forever(self):
+        backoff = self.min_backoff
+        first_attempt = True
+        while not self._closing:
+            if not first_attempt:
+                self.reconnects += 1
+            first_attempt = False
+            try:
+                async with websockets.connect(self.address) as websocket:
+                    backoff = self.min_backoff
+                    # Servers that echo to producers fill our receive buffer; read and discard
+                    discard = asyncio.ensure_future(self._discard_incoming(websocket))
+                    try:
+                        with self._lock:
+                            hellos = list(self._hellos.values())
+                            self._hellos_due.clear()
+                        for hello in hellos:
+                            await websocket.send(hello)
+                        await self._pump(websocket)
+                    finally:
+                        discard.cancel()
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+                if backoff == self.min_backoff:
+                    print('WS Server is down')
+            if self._closing:
+                break
+            try:
+                # Sleep for the backoff, but wake up early on close()
+                await asyncio.wait_for(self._wait_closing(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _wait_closing(self):
+        while not self._closing:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _pump(self, websocket):
+        while not self._closing:
+            self._wakeup.clear()
+            if not self._queue and not self._hellos_due:
+                await self._wakeup.wait()
+            while (self._queue or self._hellos_due) and not self._closing:
+                with self._lock:
+                    key = next((key for key, (_, ahead) in self._hellos_due.items() if not ahead), None)
+                    if key is not None:
+                        hello = self._hellos_due.pop(key)[0]
+                    else:
+                        hello = None
+                        message = self._queue.popleft()
+                        self._advance_hellos()
+                if hello is not None:
+                    # A lost hello is sent again with all the others on the next connection
+                    await websocket.send(hello)
+                    continue
+                try:
+                    t0 = now()
+                    await websocket.send(message)
+                    metrics.record('ws_send', t0)
+                except websockets.exceptions.WebSocketException:
+                    # Keep the message for the next connection unless newer ones already filled the queue
+                    with self._lock:
+                        if len(self._queue) < self._queue.maxlen:
+                            self._queue.appendleft(message)
+                        else:
+                            self.dropped += 1
+                            metrics.count('ws_dropped')
+                    raise
+                self.sent += 1
+
+    async def _discard_incoming(self, websocket):
+        try:
+            async for _ in websocket:
+                pass
+        except websockets.exceptions.WebSocketException:
+            pass
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+def get_publisher(hello=None):
+    """
+    Returns the process-wide WebSocketPublisher, starting it on first use.
+
+    Args:
+        hello (str or bytes, optional):
+            If given, replaces the hello under the key None (see `WebSocketPublisher.set_hello`).
+
+    Example:
+        >>> get_publisher().publish(msg)
+    """
+    global _publisher
+    # Worker threads may ask at the same time; only one of them starts the publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = WebSocketPublisher(hello=hello).start()
+        elif hello is not None:
+            _publisher.set_hello(hello)
+        return _publisher